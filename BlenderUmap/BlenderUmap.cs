@@ -6,6 +6,8 @@ using System.Diagnostics.CodeAnalysis;
 using System.Diagnostics.Tracing;
 using System.IO;
 using System.Linq;
+using System.Security.Cryptography;
+using System.Text;
 using System.Threading;
 using System.Threading.Tasks;
 using BlenderUmap;
@@ -42,13 +44,14 @@ namespace BlenderUmap {
     public static class Program {
         public static Config config;
         public static MyFileProvider provider;
+        public static ExportManifest manifest;
         private static readonly long start = DateTimeOffset.Now.ToUnixTimeMilliseconds();
 #if DEBUG
         private static readonly bool NoExport = false;
 #else
         private static readonly bool NoExport = false;
 #endif
-        public static uint ThreadWorkCount = 0;
+        public static ExportScheduler scheduler;
         private static readonly object TextureLock = new object();
         private static readonly object MeshLock = new object();
 
@@ -78,7 +81,7 @@ namespace BlenderUmap {
                     throw new MainException("Directory " + Path.GetFullPath(paksDir) + " not found.");
                 }
 
-                if (string.IsNullOrEmpty(config.ExportPackage)) {
+                if (string.IsNullOrEmpty(config.ExportPackage) && config.ExportPackages.Count == 0) {
                     throw new MainException("Please specify ExportPackage.");
                 }
 
@@ -89,7 +92,7 @@ namespace BlenderUmap {
                     customVersions.Add(new FCustomVersion(){ Key = new FGuid(t.Key), Version = t.Value });
                 }
 
-                provider = new MyFileProvider(paksDir, new VersionContainer(config.Game, optionOverrides: config.OptionsOverrides, customVersions: customVersions), config.EncryptionKeys, config.bDumpAssets, config.ObjectCacheSize);
+                provider = new MyFileProvider(paksDir, new VersionContainer(config.Game, optionOverrides: config.OptionsOverrides, customVersions: customVersions), config.EncryptionKeys, config.bDumpAssets, config.ObjectCacheSize, config.ObjectCacheSizeMB);
                 provider.LoadVirtualPaths();
                 
                 var newestUsmap = GetNewestUsmap(new DirectoryInfo("mappings"));
@@ -100,20 +103,31 @@ namespace BlenderUmap {
                     Log.Information("Loaded mappings from {0}", newestUsmap.FullName);
                 }
                 
-                var pkg = ExportAndProduceProcessed(config.ExportPackage, new List<string>());
-                if (pkg == null) Environment.Exit(1); // prevent addon from importing previously exported maps
-
-                while (ThreadWorkCount > 0) {
-                    Console.Write($"\rWaiting for {ThreadWorkCount} threads to exit...");
-                    Thread.Sleep(1000);
+                manifest = ExportManifest.Load();
+                scheduler = new ExportScheduler(config.MaxExportTasks, config.MaxExportMemoryMB * 1024L * 1024L);
+                // batch: every map is exported by this one run, sharing the provider, mappings and caches
+                var batch = config.ExportPackages.Count > 0;
+                var packages = batch ? config.ExportPackages : new List<string> { config.ExportPackage };
+                var exported = new List<string>();
+                foreach (var package in packages) {
+                    var pkg = ExportAndProduceProcessed(package, new List<string>());
+                    if (pkg == null && !batch) Environment.Exit(1); // prevent addon from importing previously exported maps
+                    exported.Add(pkg != null ? provider.CompactFilePath(pkg.Name) : null);
                 }
-                Console.WriteLine();
 
-                var file = new FileInfo("processed.json");
+                scheduler.WaitAll();
+                scheduler.LogTimings();
+                manifest.Save();
+                Log.Information("Package cache: {0}", provider.CacheStats());
+
+                var file = new FileInfo(batch ? "batch.processed.json" : "processed.json");
                 Log.Information("Writing to {0}", file.FullName);
                 using (var writer = file.CreateText()) {
-                    var pkgName = provider.CompactFilePath(pkg.Name);
-                    new JsonSerializer().Serialize(writer, pkgName);
+                    if (batch) {
+                        new JsonSerializer().Serialize(writer, exported);
+                    } else {
+                        new JsonSerializer().Serialize(writer, exported[0]);
+                    }
                 }
 
                 Log.Information("All done in {0:F1} sec. In the Python script, replace the line with data_dir with this line below:\n\ndata_dir = r\"{1}\"", (DateTimeOffset.Now.ToUnixTimeMilliseconds() - start) / 1000.0F, Directory.GetCurrentDirectory());
@@ -154,7 +168,17 @@ namespace BlenderUmap {
             return lightcomps.Count > 0;
         }
 
-        public static IPackage ExportAndProduceProcessed(string path, List<string> loadedLevels) {
+        /// <summary>Marks the level as exported, false if another caller already did</summary>
+        private static bool ClaimLevel(List<string> loadedLevels, string level) {
+            lock (loadedLevels) {
+                if (loadedLevels.Contains(level)) return false;
+                loadedLevels.Add(level);
+                return true;
+            }
+        }
+
+        /// <param name="claimed">the caller has already claimed the level with <see cref="ClaimLevel"/></param>
+        public static IPackage ExportAndProduceProcessed(string path, List<string> loadedLevels, bool claimed = false) {
             UObject obj = null;
             if (path.EndsWith(".replay")) {
                 // throw new NotSupportedException("replays are not supported by this version of BlenderUmap.");
@@ -189,22 +213,31 @@ namespace BlenderUmap {
                 Log.Information("{0} is not a World, won't try to export", obj.GetPathName());
                 return null;
             }
-            loadedLevels.Add(provider.CompactFilePath(world.GetPathName()));
+            // claimed before anything is written, a world referenced twice is exported once and only referenced after that
+            if (!ClaimLevel(loadedLevels, provider.CompactFilePath(world.GetPathName())) && !claimed) {
+                Log.Information("{0} is already exported", world.GetPathName());
+                return obj.Owner;
+            }
             var persistentLevel = world.PersistentLevel.Load<ULevel>();
             var comps = new JArray();
             var lights = new List<LightInfo2>();
-            for (var index = 0; index < persistentLevel.Actors.Length; index++) {
+
+            // actors are processed in parallel into their own arrays, then merged in actor order
+            var actorComps = new JArray[persistentLevel.Actors.Length];
+            var actorLights = new List<LightInfo2>[persistentLevel.Actors.Length];
+            ForEachParallel(persistentLevel.Actors.Length, index => {
                 var actorLazy = persistentLevel.Actors[index];
-                if (actorLazy == null || actorLazy.IsNull) continue;
+                if (actorLazy == null || actorLazy.IsNull) return;
                 var actor = actorLazy.Load();
-                if (actor.ExportType == "LODActor") continue;
+                if (actor.ExportType == "LODActor") return;
                 Log.Information("Loading {0}: {1}/{2} {3}", world.Name, index, persistentLevel.Actors.Length,
                     actorLazy);
-                ProcessActor(actor, lights, comps, loadedLevels);
-
-                if (index % 100 == 0) { // every 100th actor
-                    GC.Collect();
-                }
+                actorComps[index] = new JArray();
+                actorLights[index] = new List<LightInfo2>();
+                ProcessActor(actor, actorLights[index], actorComps[index], loadedLevels);
+            });
+            for (var index = 0; index < persistentLevel.Actors.Length; index++) {
+                MergeActorOutput(comps, lights, actorComps[index], actorLights[index]);
             }
 
             if (config.bExportBuildingFoundations) {
@@ -214,15 +247,15 @@ namespace BlenderUmap {
 
                     var children = new JArray();
                     string text = streamingLevel.GetOrDefault<FSoftObjectPath>("WorldAsset").AssetPathName.Text;
-                    if (loadedLevels.Contains(text))
+                    if (!ClaimLevel(loadedLevels, text))
                         continue;
-                    var cpkg = ExportAndProduceProcessed(text.SubstringBeforeLast('.'), loadedLevels);
+                    var cpkg = ExportAndProduceProcessed(text.SubstringBeforeLast('.'), loadedLevels, true);
                     children.Add(cpkg != null ? provider.CompactFilePath(cpkg.Name) : null);
 
                     var transform = streamingLevel.GetOrDefault<FTransform>("LevelTransform", FTransform.Identity);
 
                     var comp = new JArray {
-                        JValue.CreateNull(), // GUID
+                        StableGuid(streamingLevel), // GUID
                         streamingLevel.Name,
                         JValue.CreateNull(), // mesh path
                         JValue.CreateNull(), // materials
@@ -262,6 +295,7 @@ namespace BlenderUmap {
         }
 
         public static void ProcessStreamingGrid(FStructFallback grid, JArray children, List<string> loadedLevels) {
+            var cellWorlds = new List<string>();
             if (grid.TryGetValue(out FStructFallback[] gridLevels, "GridLevels")) {
                 foreach (var level in gridLevels) {
                     if (level.TryGetValue<FStructFallback[]>(out var levelCells, "LayerCells")) {
@@ -272,13 +306,7 @@ namespace BlenderUmap {
                                         var text = worldAsset.ToString();
                                         if (text.SubstringAfterLast("/").StartsWith("HLOD"))
                                             continue;
-                                        // GC.Collect();
-                                        var childPackage = ExportAndProduceProcessed(text, loadedLevels);
-                                        children.Add(childPackage != null ? provider.CompactFilePath(childPackage.Name) : null);
-                                        // tasks.Add(Task.Run(() => {
-                                        //     var childPackage = ExportAndProduceProcessed(text);
-                                        //     // bagged.Add(childPackage != null ? provider.CompactFilePath(childPackage.Name) : null);
-                                        // }));
+                                        cellWorlds.Add(text);
                                     }
                                 }
                             }
@@ -286,10 +314,59 @@ namespace BlenderUmap {
                     }
                 }
             }
-            // Task.WaitAll(tasks.ToArray());
-            // foreach (var child in bagged) {
-            //     children.Add(child != null ? provider.CompactFilePath(child) : null);
-            // }
+
+            // cells are exported in parallel, children keep the grid order
+            var childPaths = new string[cellWorlds.Count];
+            ForEachParallel(cellWorlds.Count, i => {
+                var childPackage = ExportAndProduceProcessed(cellWorlds[i], loadedLevels);
+                childPaths[i] = childPackage != null ? provider.CompactFilePath(childPackage.Name) : null;
+            });
+            foreach (var child in childPaths) {
+                children.Add(child);
+            }
+        }
+
+        // one pool of slots for every nesting level (actors, their additional worlds, grid cells and their actors),
+        // the calling thread counts as one worker so the pool has one slot less than the configured parallelism
+        private static SemaphoreSlim _exportSlots;
+        private static SemaphoreSlim ExportSlots => LazyInitializer.EnsureInitialized(ref _exportSlots,
+            () => new SemaphoreSlim(Math.Max((config.MaxParallelism > 0 ? config.MaxParallelism : Environment.ProcessorCount) - 1, 0)));
+
+        // runs body for 0..count-1 on free slots of the shared pool and on the calling thread when none is free,
+        // so nested loops never wait for a slot held by their own caller and the total stays bounded
+        private static void ForEachParallel(int count, Action<int> body) {
+            var tasks = new List<Task>();
+            for (var i = 0; i < count; i++) {
+                var index = i;
+                if (ExportSlots.Wait(0)) {
+                    tasks.Add(Task.Run(() => {
+                        try {
+                            body(index);
+                        } finally {
+                            ExportSlots.Release();
+                        }
+                    }));
+                } else {
+                    body(index);
+                }
+            }
+            Task.WaitAll(tasks.ToArray());
+        }
+
+        // appends the output of one actor, its light indices are relative to its own light list
+        private static void MergeActorOutput(JArray comps, List<LightInfo2> lights, JArray actorComps, List<LightInfo2> actorLights) {
+            if (actorComps == null) return;
+            var lightOffset = lights.Count;
+            var items = actorComps.Children().ToList();
+            actorComps.RemoveAll(); // detach, so adding them below does not copy them
+            foreach (var item in items) {
+                if (item is JArray comp && comp.Count > 9 && comp[9].Type == JTokenType.Integer) {
+                    var lightIndex = comp[9].Value<int>();
+                    if (lightIndex != 0) comp[9] = lightIndex + Math.Sign(lightIndex) * lightOffset;
+                }
+                comps.Add(item);
+            }
+            lights.AddRange(actorLights);
         }
 
         public static void ProcessActor(UObject actor, List<LightInfo2> lights, JArray comps, List<string> loadedLevels, FTransform parentTransform = default) {
@@ -326,7 +403,7 @@ namespace BlenderUmap {
                     lights.Add(lightInfo2);
 
                     var lcomp = new JArray {
-                        JValue.CreateNull(), // GUID
+                        StableGuid(actor), // GUID
                         actor.Name,
                         JValue.CreateNull(), // mesh path
                         JValue.CreateNull(), // materials
@@ -363,7 +440,7 @@ namespace BlenderUmap {
                 // identifiers
                 var streamComp = new JArray();
                 comps.Add(streamComp);
-                streamComp.Add(Guid.NewGuid().ToString().Replace("-", ""));
+                streamComp.Add(StableGuid(actor));
                 streamComp.Add(actor.Name);
                 streamComp.Add(null);
                 streamComp.Add(null);
@@ -530,7 +607,6 @@ namespace BlenderUmap {
             if (config.bExportBuildingFoundations && additionalWorlds != null) {
                 foreach (var additionalWorld in additionalWorlds) {
                     var text = additionalWorld.AssetPathName.Text;
-                    GC.Collect();
                     var childPackage = ExportAndProduceProcessed(text, loadedLevels);
                     children.Add(childPackage != null ? provider.CompactFilePath(childPackage.Name) : null);
                 }
@@ -554,7 +630,7 @@ namespace BlenderUmap {
             comps.Add(comp);
             comp.Add(actor.TryGetValue<FGuid>(out var guid, "MyGuid") // /Script/FortniteGame.BuildingActor:MyGuid
                 ? guid.ToString(EGuidFormats.Digits).ToLowerInvariant()
-                : Guid.NewGuid().ToString().Replace("-", ""));
+                : StableGuid(actor));
             comp.Add(actor.Name);
             comp.Add(PackageIndexToDirPath(mesh));
             comp.Add(matsObj);
@@ -603,99 +679,177 @@ namespace BlenderUmap {
             }
         }
 
+        private static readonly string[] TextureExtensions = {".png", ".tga", ".dds"};
+
         private static void ExportTexture(FPackageIndex index) {
             if (NoExport) return;
             if (index.IsNull) return;
             var resolved = index.ResolvedObject;
+            var assetPath = PackageIndexToDirPath(resolved);
+            var basePath = Path.Combine(GetExportDir(resolved.Package).ToString(), resolved.Name.Text);
+            var output = new FileInfo(basePath + TextureExtension(config.TextureFormat));
+
+            lock (TextureLock) {
+                var settings = $"{config.TextureFormat}:{config.bExportToDDSWhenPossible}";
+                if (!manifest.ShouldExport(assetPath, resolved.Package, settings, output)) {
+                    Log.Debug("Texture is up to date, skipping: {0}", output.FullName);
+                    return;
+                }
+            }
 
-            var output = new FileInfo(Path.Combine(GetExportDir(resolved.Package).ToString(), resolved.Name + ".png"));
+            scheduler.Schedule(assetPath, provider.PackageSize(resolved.Package.Name), () => {
+                var obj = index.Load();
+                if (obj is not UTexture2D texture) return;
+                var firstMip = texture.GetFirstMip(); // Modify this if you want lower res textures
 
-            if (config.bExportToDDSWhenPossible) {
-                    throw new NotImplementedException("DDS export is not implemented");
-            }
+                // Blender only reads DXT1/3/5 from DDS files, everything else is decoded
+                var fourCC = config.bExportToDDSWhenPossible && texture.Format is PF_DXT1 or PF_DXT3 or PF_DXT5 ? GetDDSFourCC(texture) : null;
+                var file = fourCC != null ? new FileInfo(basePath + ".dds") : output;
+                Log.Information("Saving texture to {0}", file.FullName);
 
-            // char[] fourCC = config.bExportToDDSWhenPossible ? GetDDSFourCC(texture) : null;
-            ThreadPool.QueueUserWorkItem(_ => {
-                FileStream stream;
-                lock (TextureLock) {
-                    if (output.Exists) {
-                        Log.Debug("Texture already exists, skipping: {0}", output.FullName);
-                        return;
-                    }
-                    stream = output.OpenWrite();
-                    Interlocked.Increment(ref ThreadWorkCount);
+                byte[] data;
+                if (fourCC != null) {
+                    data = EncodeDDS(firstMip, fourCC);
+                } else {
+                    using var image = texture.Decode(firstMip);
+                    data = EncodeTexture(image, config.TextureFormat);
                 }
+                File.WriteAllBytes(file.FullName, data);
 
-                try {
-                    var obj = index.Load();
-                    if (obj is not UTexture2D texture) {
-                        stream.Close();
-                        output.Delete();
-                        Interlocked.Decrement(ref ThreadWorkCount);
-                        return;
-                    }
-                    Log.Information("Saving texture to {0}", output.FullName);
-                    var firstMip = texture.GetFirstMip(); // Modify this if you want lower res textures
-                    using var image = texture.Decode(firstMip);
-                    using var data = image.Encode(SKEncodedImageFormat.Png, 100);
-                    stream.Write(data.AsSpan());
-                    stream.Close();
-                    Interlocked.Decrement(ref ThreadWorkCount);
+                // the importer takes the first extension it finds, drop exports in other formats
+                foreach (var ext in TextureExtensions) {
+                    if (ext != file.Extension) File.Delete(basePath + ext);
                 }
-                catch (Exception e) { stream.Close(); Log.Warning(e, "Failed to save texture"); Interlocked.Decrement(ref ThreadWorkCount); }
+                manifest.Complete(assetPath, file);
             });
         }
 
+        private static string TextureExtension(ETextureFormat format) => format == ETextureFormat.TGA ? ".tga" : ".png";
+
+        private static byte[] EncodeTexture(SKBitmap image, ETextureFormat format) {
+            switch (format) {
+                case ETextureFormat.TGA:
+                    return EncodeTGA(image);
+                case ETextureFormat.PNG_FAST: {
+                    using var pixmap = image.PeekPixels();
+                    using var data = pixmap.Encode(new SKPngEncoderOptions(SKPngEncoderFilterFlags.NoFilters, 1));
+                    return data.ToArray();
+                }
+                default: {
+                    using var data = image.Encode(SKEncodedImageFormat.Png, 100);
+                    return data.ToArray();
+                }
+            }
+        }
+
+        // uncompressed 32 bit, top-left origin
+        private static byte[] EncodeTGA(SKBitmap image) {
+            using var converted = image.ColorType == SKColorType.Bgra8888 ? null : image.Copy(SKColorType.Bgra8888);
+            var bgra = converted ?? image;
+            var rowSize = bgra.Width * 4;
+            var tga = new byte[18 + rowSize * bgra.Height];
+            tga[2] = 2; // uncompressed true color
+            BitConverter.TryWriteBytes(tga.AsSpan(12), (ushort) bgra.Width);
+            BitConverter.TryWriteBytes(tga.AsSpan(14), (ushort) bgra.Height);
+            tga[16] = 32;
+            tga[17] = 0x28; // 8 alpha bits, top-left origin
+
+            var pixels = bgra.GetPixelSpan();
+            for (var y = 0; y < bgra.Height; y++) {
+                pixels.Slice(y * bgra.RowBytes, rowSize).CopyTo(tga.AsSpan(18 + y * rowSize));
+            }
+            return tga;
+        }
+
+        // the compressed mip as is, behind a DDS header
+        private static byte[] EncodeDDS(FTexture2DMipMap mip, char[] fourCC) {
+            var data = mip.BulkData.Data;
+            using var stream = new MemoryStream(128 + data.Length);
+            using var writer = new BinaryWriter(stream);
+            writer.Write(0x20534444); // "DDS "
+            writer.Write(124); // header size
+            writer.Write(0x1 | 0x2 | 0x4 | 0x1000 | 0x80000); // caps, height, width, pixel format, linear size
+            writer.Write(mip.SizeY);
+            writer.Write(mip.SizeX);
+            writer.Write(data.Length);
+            writer.Write(0); // depth
+            writer.Write(1); // mip count
+            for (var i = 0; i < 11; i++) writer.Write(0);
+            writer.Write(32); // pixel format size
+            writer.Write(0x4); // four cc
+            writer.Write(fourCC);
+            for (var i = 0; i < 5; i++) writer.Write(0); // bit count and masks
+            writer.Write(0x1000); // texture
+            for (var i = 0; i < 4; i++) writer.Write(0);
+            writer.Write(data);
+            writer.Flush();
+            return stream.ToArray();
+        }
+
         public static void ExportMesh(FPackageIndex mesh, List<Mat> materials) {
             if (NoExport || mesh == null || mesh.IsNull) return;
+            var resolved = mesh.ResolvedObject;
+            if (resolved == null) return;
+            var assetPath = PackageIndexToDirPath(resolved);
+            var output = new FileInfo(Path.Combine(GetExportDir(resolved.Package).ToString(), resolved.Name.Text + ".pskx"));
+
+            bool shouldExport;
+            lock (MeshLock) {
+                // without a manifest entry, the lower LODs asked for have to be there too
+                var expected = new List<FileInfo> { output };
+                for (var i = 1; i <= config.ExtraLods; i++) {
+                    expected.Add(new FileInfo(Path.Combine(output.DirectoryName!, $"{resolved.Name.Text}_LOD{i}.pskx")));
+                }
+                shouldExport = manifest.ShouldExport(assetPath, resolved.Package, $"lods:{config.ExtraLods}", expected.ToArray());
+            }
+            if (!shouldExport && !config.bReadMaterials) return; // up to date and nothing else needs it loaded
+
+            // up to date, the materials recorded with it spare loading the mesh
+            var materialPaths = shouldExport ? null : manifest.GetMaterials(assetPath);
+            if (materialPaths != null) {
+                foreach (var materialPath in materialPaths) {
+                    materials.Add(new Mat(materialPath != null && provider.TryLoadObject(materialPath, out UObject materialObj) ? new ResolvedLoadedObject(materialObj) : null));
+                }
+                return;
+            }
+
             var exportObj = mesh.Load<UObject>();
             if (!(exportObj is IMesh meshExport) || meshExport == null) return;
-            var output = new FileInfo(Path.Combine(GetExportDir(exportObj).ToString(), exportObj.Name + ".pskx"));
-
-            ThreadPool.QueueUserWorkItem(delegate {
-                FileStream stream;
-                lock (MeshLock) {
-                    if (output.Exists) return;
-                    Interlocked.Increment(ref ThreadWorkCount);
-                    stream = output.OpenWrite();
+            manifest.SetMaterials(assetPath, meshExport.Materials?.Select(it => it?.GetPathName()).ToList() ?? new List<string>());
+
+            if (shouldExport) scheduler.Schedule(assetPath, provider.PackageSize(resolved.Package.Name), () => {
+                MeshExporter exporter;
+                var exporterOptions = new ExporterOptions() {
+                    SocketFormat = ESocketFormat.None,
+                    LodFormat = config.ExtraLods > 0 ? ELodFormat.AllLods : ELodFormat.FirstLod
+                };
+                if (meshExport is UStaticMesh staticMesh) {
+                    exporter = new MeshExporter(staticMesh, exporterOptions, false);
+                }
+                else if (meshExport is USkeletalMesh skeletalMesh) {
+                    exporter = new MeshExporter(skeletalMesh, exporterOptions, false);
+                }
+                else {
+                    Log.Warning("Unknown mesh type: {0}", exportObj.ExportType);
+                    return;
                 }
 
-                try {
-                    MeshExporter exporter;
-                    if (meshExport is UStaticMesh staticMesh) {
-                        exporter = new MeshExporter(staticMesh,
-                            new ExporterOptions() { SocketFormat = ESocketFormat.None }, false);
-                    }
-                    else if (meshExport is USkeletalMesh skeletalMesh) {
-                        exporter = new MeshExporter(skeletalMesh,
-                            new ExporterOptions() { SocketFormat = ESocketFormat.None }, false);
-                    }
-                    else {
-                        Log.Warning("Unknown mesh type: {0}", exportObj.ExportType);
-                        stream.Close();
-                        output.Delete();
-                        Interlocked.Decrement(ref ThreadWorkCount);
-                        return;
-                    }
+                Log.Information("Saving {0} to {1}", exportObj.ExportType, output.FullName);
+                if (exporter.MeshLods.Count == 0) {
+                    Log.Warning("Mesh '{0}' has no LODs", exportObj.Name);
+                    return;
+                }
 
-                    Log.Information("Saving {0} to {1}", exportObj.ExportType, output.FullName);
-                    if (exporter.MeshLods.Count == 0) {
-                        Log.Warning("Mesh '{0}' has no LODs", exportObj.Name);
-                        stream.Close();
-                        output.Delete();
-                        Interlocked.Decrement(ref ThreadWorkCount);
-                        return;
-                    }
+                File.WriteAllBytes(output.FullName, exporter.MeshLods.First().FileData);
+                var files = new List<FileInfo> { output };
 
-                    stream.Write(exporter.MeshLods.First().FileData);
-                    stream.Close();
-                    Interlocked.Decrement(ref ThreadWorkCount);
-                }
-                catch (Exception e) {
-                    stream.Close();
-                    Log.Warning(e, "Failed to save mesh");
-                    Interlocked.Decrement(ref ThreadWorkCount);
+                // lower LODs go next to LOD0 as Name_LOD1.pskx, Name_LOD2.pskx, ...
+                for (var i = 1; i <= config.ExtraLods && i < exporter.MeshLods.Count; i++) {
+                    var lodOutput = new FileInfo(Path.Combine(output.DirectoryName!, $"{exportObj.Name}_LOD{i}.pskx"));
+                    File.WriteAllBytes(lodOutput.FullName, exporter.MeshLods[i].FileData);
+                    files.Add(lodOutput);
                 }
+                manifest.Complete(assetPath, files.ToArray());
             });
             
             if (config.bReadMaterials) {
@@ -749,6 +903,12 @@ namespace BlenderUmap {
 
         public static string PackageIndexToDirPath(FPackageIndex obj) => PackageIndexToDirPath(obj?.ResolvedObject);
 
+        // same actor -> same id across exports, the importer uses it to diff re-imports
+        public static string StableGuid(UObject obj) {
+            var hash = MD5.HashData(Encoding.UTF8.GetBytes(obj.GetPathName()));
+            return new Guid(hash).ToString("N");
+        }
+
         public static JArray Vector(FVector vector) => new() {vector.X, vector.Y, vector.Z};
         public static JArray Rotator(FRotator rotator) => new() {rotator.Pitch, rotator.Yaw, rotator.Roll};
         public static JArray Quat(FQuat quat) => new() {quat.X, quat.Y, quat.Z, quat.W};
@@ -988,14 +1148,27 @@ namespace BlenderUmap {
         public List<EncryptionKey> EncryptionKeys = new();
         public bool bDumpAssets = false;
         public int ObjectCacheSize = 100;
+        public int ObjectCacheSizeMB = 0; // 0 = only limited by ObjectCacheSize
         public bool bReadMaterials = true;
         public bool bExportToDDSWhenPossible = true;
+        public ETextureFormat TextureFormat = ETextureFormat.PNG;
         public bool bExportBuildingFoundations = true;
         public bool bExportHiddenObjects = false;
+        public int ExtraLods = 0;
+        public int MaxParallelism = 0; // actors and World Partition cells exported at once across all nested levels, 0 = one per core
+        public int MaxExportTasks = 0; // meshes and textures written at once, 0 = one per core
+        public int MaxExportMemoryMB = 0; // package size of the meshes and textures written at once, 0 = no limit
         public string ExportPackage;
+        public List<string> ExportPackages = new(); // batch export, written to batch.processed.json in this order
         public TextureMapping Textures = new();
     }
 
+    public enum ETextureFormat {
+        PNG,
+        PNG_FAST, // no filtering, zlib level 1
+        TGA
+    }
+
     public class TextureMapping {
         public TextureMap UV1 = new() {
             Diffuse = new[] {"Trunk_BaseColor", "Diffuse", "DiffuseTexture", "Base_Color_Tex", "Tex_Color"},
@@ -0,0 +1,112 @@
+﻿using System;
+using System.Collections.Concurrent;
+using System.Collections.Generic;
+using System.IO;
+using System.Linq;
+using System.Threading;
+using CUE4Parse.UE4.Assets;
+using CUE4Parse.UE4.VirtualFileSystem;
+using Newtonsoft.Json;
+using Serilog;
+
+namespace BlenderUmap {
+    /// <summary>
+    /// Remembers which pak/IoStore entry every exported asset came from, which files it produced and
+    /// which materials a mesh uses, so assets that did not change since the last export are skipped
+    /// without loading them. An asset is only recorded once all of its files were written.
+    /// </summary>
+    public class ExportManifest {
+        public static readonly FileInfo MANIFEST_FILE = new("manifest.json");
+        private readonly ConcurrentDictionary<string, ManifestEntry> _entries;
+        private readonly ConcurrentDictionary<string, ManifestEntry> _pending = new(StringComparer.OrdinalIgnoreCase); // exports of this run
+        private int _skipped;
+        private int _exported;
+
+        private ExportManifest(ConcurrentDictionary<string, ManifestEntry> entries) {
+            _entries = entries;
+        }
+
+        public static ExportManifest Load() {
+            var entries = new ConcurrentDictionary<string, ManifestEntry>(StringComparer.OrdinalIgnoreCase);
+            if (MANIFEST_FILE.Exists) {
+                try {
+                    using var reader = MANIFEST_FILE.OpenText();
+                    var saved = new JsonSerializer().Deserialize<Dictionary<string, ManifestEntry>>(new JsonTextReader(reader));
+                    foreach (var (key, entry) in saved ?? new()) {
+                        entries[key] = entry;
+                    }
+                } catch (Exception e) {
+                    Log.Warning(e, "Failed to read {0}, exporting everything again", MANIFEST_FILE.FullName);
+                }
+            }
+            return new ExportManifest(entries);
+        }
+
+        public void Save() {
+            using var writer = MANIFEST_FILE.CreateText();
+            new JsonSerializer { Formatting = Formatting.Indented }.Serialize(writer, new SortedDictionary<string, ManifestEntry>(_entries));
+            Log.Information("Export manifest: {0} assets up to date, {1} exported", _skipped, _exported);
+        }
+
+        // archive, offset and size of the package in it, changes whenever a game update touches the package
+        public static string SourceStamp(IPackage package) {
+            if (!Program.provider.TryFindGameFile(package.Name, out var file)) return null;
+            return file is VfsEntry entry ? $"{entry.Vfs.Name}:{entry.Offset}:{entry.Size}" : file.Size.ToString();
+        }
+
+        /// <summary>
+        /// False if the asset was exported from the same source with the same settings before and all of its
+        /// files are still there. Files exported before the manifest existed are trusted when all the expected
+        /// ones are there. Otherwise the asset is claimed for this run, so only one caller exports it, and
+        /// recorded by <see cref="Complete"/> once its files are written. Callers synchronize on their own export lock.
+        /// </summary>
+        public bool ShouldExport(string assetPath, IPackage package, string settings, params FileInfo[] expected) {
+            if (_pending.ContainsKey(assetPath)) return false;
+            var source = SourceStamp(package);
+            if (_entries.TryGetValue(assetPath, out var entry)) {
+                if (entry.Source == source && entry.Settings == settings && entry.Files.All(File.Exists)) {
+                    Interlocked.Increment(ref _skipped);
+                    return false;
+                }
+            } else if (expected.All(it => it.Exists)) {
+                _entries[assetPath] = new ManifestEntry { Source = source, Settings = settings, Files = expected.Select(Relative).ToList() };
+                Interlocked.Increment(ref _skipped);
+                return false;
+            }
+
+            // a crash during the export must not leave the old entry pointing at a partially written file
+            _entries.TryRemove(assetPath, out _);
+            _pending[assetPath] = new ManifestEntry { Source = source, Settings = settings };
+            Interlocked.Increment(ref _exported);
+            return true;
+        }
+
+        /// <summary>Records the asset claimed by ShouldExport, once all of its files are written</summary>
+        public void Complete(string assetPath, params FileInfo[] files) {
+            if (_pending.TryGetValue(assetPath, out var entry)) {
+                entry.Files = files.Select(Relative).ToList();
+                _entries[assetPath] = entry;
+            }
+        }
+
+        /// <summary>Object paths of the materials of a mesh, null if they were not recorded</summary>
+        public List<string> GetMaterials(string assetPath) {
+            return _entries.TryGetValue(assetPath, out var entry) ? entry.Materials : null;
+        }
+
+        public void SetMaterials(string assetPath, List<string> materials) {
+            if (_pending.TryGetValue(assetPath, out var entry) || _entries.TryGetValue(assetPath, out entry)) {
+                entry.Materials = materials;
+            }
+        }
+
+        private static string Relative(FileInfo file) => Path.GetRelativePath(Directory.GetCurrentDirectory(), file.FullName);
+    }
+
+    public class ManifestEntry {
+        public string Source;
+        public string Settings; // export options that change the produced files
+        public List<string> Files = new();
+        public List<string> Materials; // meshes only
+    }
+}
@@ -0,0 +1,87 @@
+﻿using System;
+using System.Collections.Concurrent;
+using System.Collections.Generic;
+using System.Diagnostics;
+using System.Linq;
+using System.Threading;
+using System.Threading.Tasks;
+using Serilog;
+
+namespace BlenderUmap {
+    /// <summary>
+    /// Runs mesh and texture exports in the background with a limit on how many run at once and on the
+    /// estimated size of the assets being exported at once. A failing export is logged and never blocks WaitAll.
+    /// </summary>
+    public class ExportScheduler {
+        private readonly SemaphoreSlim _slots;
+        private readonly long _maxInFlightBytes;
+        private readonly object _memoryLock = new();
+        private long _inFlightBytes;
+        private readonly ConcurrentQueue<Task> _tasks = new();
+        private readonly ConcurrentBag<(string Name, double Seconds)> _timings = new();
+        private int _failed;
+
+        public ExportScheduler(int maxConcurrency, long maxInFlightBytes) {
+            _slots = new SemaphoreSlim(maxConcurrency > 0 ? maxConcurrency : Environment.ProcessorCount);
+            _maxInFlightBytes = maxInFlightBytes;
+        }
+
+        public int Pending => _tasks.Count(it => !it.IsCompleted);
+
+        public void Schedule(string name, long cost, Action work) {
+            _tasks.Enqueue(Task.Run(async () => {
+                await _slots.WaitAsync().ConfigureAwait(false);
+                AcquireMemory(cost);
+                var stopwatch = Stopwatch.StartNew();
+                try {
+                    work();
+                } catch (Exception e) {
+                    Interlocked.Increment(ref _failed);
+                    Log.Warning(e, "Failed to export {0}", name);
+                } finally {
+                    _timings.Add((name, stopwatch.Elapsed.TotalSeconds));
+                    ReleaseMemory(cost);
+                    _slots.Release();
+                }
+            }));
+        }
+
+        // waits while other exports hold the memory budget, an export bigger than the budget runs alone
+        private void AcquireMemory(long cost) {
+            if (_maxInFlightBytes <= 0) return;
+            lock (_memoryLock) {
+                while (_inFlightBytes > 0 && _inFlightBytes + cost > _maxInFlightBytes) {
+                    Monitor.Wait(_memoryLock);
+                }
+                _inFlightBytes += cost;
+            }
+        }
+
+        private void ReleaseMemory(long cost) {
+            if (_maxInFlightBytes <= 0) return;
+            lock (_memoryLock) {
+                _inFlightBytes -= cost;
+                Monitor.PulseAll(_memoryLock);
+            }
+        }
+
+        /// <summary>Waits for every scheduled export, including ones scheduled while waiting</summary>
+        public void WaitAll() {
+            while (_tasks.TryDequeue(out var task)) {
+                while (!task.Wait(1000)) {
+                    Console.Write($"\rWaiting for {Pending + 1} exports to finish...");
+                }
+            }
+            Console.WriteLine();
+        }
+
+        public void LogTimings(int slowest = 10) {
+            var timings = _timings.ToList();
+            if (timings.Count == 0) return;
+            Log.Information("Exported {0} assets in {1:F1} sec of work, {2} failed", timings.Count, timings.Sum(it => it.Seconds), _failed);
+            foreach (var (name, seconds) in timings.OrderByDescending(it => it.Seconds).Take(slowest)) {
+                Log.Information("  {0:F2} sec {1}", seconds, name);
+            }
+        }
+    }
+}
@@ -26,8 +26,8 @@ namespace BlenderUmap {
         private readonly Cache _cache;
         private readonly bool _bDumpAssets;
 
-        public MyFileProvider(string folder, VersionContainer version, List<EncryptionKey> encryptionKeys, bool bDumpAssets, int cacheSize) : base(folder, SearchOption.AllDirectories, true, version) {
-            _cache = new Cache(cacheSize);
+        public MyFileProvider(string folder, VersionContainer version, List<EncryptionKey> encryptionKeys, bool bDumpAssets, int cacheSize, int cacheSizeMB = 0) : base(folder, SearchOption.AllDirectories, true, version) {
+            _cache = new Cache(cacheSize, cacheSizeMB * 1024L * 1024L);
             _bDumpAssets = bDumpAssets;
 
             Initialize();
@@ -56,7 +56,7 @@ namespace BlenderUmap {
             else {
                 if (base.TryLoadPackage(path, out package)) {
                     if (_cache.Size != 0)
-                        _cache.Add(path, package);
+                        _cache.Add(path, package, PackageSize(path));
                     if (_bDumpAssets)
                         DumpJson(package);
                     return true;
@@ -86,6 +86,19 @@ namespace BlenderUmap {
             return await TryLoadPackageAsync(file).ConfigureAwait(false);
         }
 
+        // size of the package in the archives, uexp and ubulk included
+        public long PackageSize(string path) {
+            if (!TryFindGameFile(path, out var file)) return 0;
+            var size = file.Size;
+            var basePath = file.Path.SubstringBeforeLast('.');
+            foreach (var ext in new[] {".uexp", ".ubulk"}) {
+                if (TryFindGameFile(basePath + ext, out var part)) size += part.Size;
+            }
+            return size;
+        }
+
+        public string CacheStats() => _cache.Stats();
+
         public void DumpJson(IPackage package) {
             var output = new FileInfo(Path.Combine(Program.GetExportDir(package).ToString(), package.Name.SubstringAfterLast("/") + ".json"));
             // if (output.Exists && output.Length > 0)
@@ -118,26 +131,87 @@ namespace BlenderUmap {
         }
     }
 
+    /// <summary>
+    /// LRU cache of loaded packages, limited by entry count and by the size of the packages in the archives.
+    /// Packages that were never hit again are evicted before shared ones like master materials.
+    /// </summary>
     public class Cache {
+        private const int EvictionScan = 16; // entries looked at from the LRU end for a one-off package
+
         public readonly int Size = 100;
-        private readonly ConcurrentDictionary<string, IPackage> _cache;
+        public readonly long MaxBytes;
+        private readonly Dictionary<string, LinkedListNode<CacheEntry>> _entries;
+        private readonly LinkedList<CacheEntry> _lru = new(); // most recently used first
+        private long _bytes;
+        private long _hits, _misses, _evictions;
 
-        public Cache(int size) {
+        public Cache(int size, long maxBytes = 0) {
             Size = size;
-            _cache = new ConcurrentDictionary<string, IPackage>(StringComparer.OrdinalIgnoreCase);
+            MaxBytes = maxBytes;
+            _entries = new Dictionary<string, LinkedListNode<CacheEntry>>(StringComparer.OrdinalIgnoreCase);
         }
 
         public bool TryGet(string path, out IPackage package) {
-            return _cache.TryGetValue(path, out package);
+            lock (_lru) {
+                if (_entries.TryGetValue(path, out var node)) {
+                    node.Value.Hits++;
+                    _lru.Remove(node);
+                    _lru.AddFirst(node);
+                    _hits++;
+                    package = node.Value.Package;
+                    return true;
+                }
+                _misses++;
+                package = null;
+                return false;
+            }
+        }
+
+        public void Add(string path, IPackage package, long bytes) {
+            lock (_lru) {
+                if (_entries.ContainsKey(path))
+                    return;
+                if (MaxBytes > 0 && bytes > MaxBytes)
+                    return; // would evict everything else
+
+                while (_entries.Count > 0 && (_entries.Count >= Size || (MaxBytes > 0 && _bytes + bytes > MaxBytes))) {
+                    Evict();
+                }
+                _entries[path] = _lru.AddFirst(new CacheEntry { Path = path, Package = package, Bytes = bytes });
+                _bytes += bytes;
+            }
+        }
+
+        // the biggest package never hit again near the LRU end, the LRU tail when all of them were hit
+        private void Evict() {
+            LinkedListNode<CacheEntry> oneOff = null;
+            var node = _lru.Last;
+            for (var i = 0; i < EvictionScan && node != null; i++, node = node.Previous) {
+                if (node.Value.Hits == 0 && (oneOff == null || node.Value.Bytes > oneOff.Value.Bytes)) {
+                    oneOff = node;
+                }
+            }
+            var victim = oneOff ?? _lru.Last!;
+
+            _lru.Remove(victim);
+            _entries.Remove(victim.Value.Path);
+            _bytes -= victim.Value.Bytes;
+            _evictions++;
         }
 
-        public void Add(string path, IPackage package) {
-            if (_cache.ContainsKey(path))
-                return;
-            if (_cache.Count == Size) {
-                _cache.Remove(_cache.Keys.First(), out var _);
+        public string Stats() {
+            lock (_lru) {
+                var total = _hits + _misses;
+                return $"{_hits} hits, {_misses} misses ({(total > 0 ? 100.0 * _hits / total : 0):F1}% hit rate), {_evictions} evictions, " +
+                       $"{_entries.Count} packages / {_bytes / (1024.0 * 1024.0):F1} MB resident";
             }
-            _cache.TryAdd(path, package);
+        }
+
+        private class CacheEntry {
+            public string Path;
+            public IPackage Package;
+            public long Bytes;
+            public int Hits;
         }
     }
 
@@ -24,16 +24,31 @@ bl_info = {
 }
 
 
+import time
+
+# enabling the addon (module import + register) should stay below this, reported when Blender runs with --debug
+STARTUP_TARGET_MS = 50
+
+_import_start = time.perf_counter()
+
 # auto_load.init()
 from . import main
 from . import settings
 
 modules = [main, settings]
 
+_import_ms = (time.perf_counter() - _import_start) * 1000
+
 def register():
+    start = time.perf_counter()
     for m in modules:
         m.register()
 
+    import bpy
+    startup_ms = _import_ms + (time.perf_counter() - start) * 1000
+    if bpy.app.debug and startup_ms > STARTUP_TARGET_MS:
+        print(f"BlenderUmap: enabling took {startup_ms:.1f} ms (import {_import_ms:.1f} ms), target is {STARTUP_TARGET_MS} ms")
+
 def unregister():
     for m in modules:
         m.unregister()
@@ -0,0 +1,294 @@
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import bpy
+import numpy as np
+
+from .images import atomic_path
+
+Rect = Tuple[int, int, int, int, int]  # page, x, y, width, height of the texture inside its padding
+ATLAS_UV_LAYER = "umap_atlas"
+ATLAS_SUFFIX = ".atlas"
+
+
+class AtlasReport:
+    def __init__(self) -> None:
+        self.num_materials = 0
+        self.num_images = 0
+        self.num_pages = 0
+        self.num_meshes = 0
+        self.cached = False
+
+    def __str__(self) -> str:
+        return (f"{self.num_images} images of {self.num_materials} materials packed into {self.num_pages} atlas pages"
+                f"{' (cached)' if self.cached else ''}, UVs of {self.num_meshes} meshes rewritten")
+
+
+def atlas_textures(m: bpy.types.Material, max_size: int) -> Optional[Dict[str, bpy.types.ShaderNodeTexImage]]:
+    """
+    Image nodes of the material by the input they feed, if the material can use the atlas: every image is
+    at most max_size, all have the same size, use the default UV map and each input is fed only once
+    """
+    if not m.use_nodes or m.node_tree is None or m.library:
+        return None
+    nodes = {}
+    size = None
+    for node in m.node_tree.nodes:
+        if node.bl_idname != "ShaderNodeTexImage" or node.image is None:
+            continue
+        if node.inputs["Vector"].is_linked or not node.outputs[0].is_linked or node.image.source != "FILE":
+            return None
+        role = node.outputs[0].links[0].to_socket.name
+        node_size = tuple(node.image.size)
+        if role in nodes or max(node_size) > max_size or min(node_size) == 0 or (size and node_size != size):
+            return None
+        nodes[role] = node
+        size = node_size
+    return nodes or None
+
+
+def material_loops(mesh: bpy.types.Mesh, material_index: int) -> np.ndarray:
+    """Loop mask of the polygons using the material slot"""
+    num_polygons = len(mesh.polygons)
+    loop_totals = np.empty(num_polygons, dtype=np.int32)
+    mesh.polygons.foreach_get("loop_total", loop_totals)
+    material_indices = np.empty(num_polygons, dtype=np.int32)
+    mesh.polygons.foreach_get("material_index", material_indices)
+    return np.repeat(material_indices == material_index, loop_totals)
+
+
+def render_uvs(mesh: bpy.types.Mesh) -> Optional[bpy.types.MeshUVLoopLayer]:
+    return next((layer for layer in mesh.uv_layers if layer.active_render), None)
+
+
+def atlas_uvs(mesh: bpy.types.Mesh) -> bpy.types.MeshUVLoopLayer:
+    """
+    UV layer the atlas rects are written to, a copy of the render UVs that becomes the render layer,
+    so the original UVs stay untouched for remove_atlas
+    """
+    layer = mesh.uv_layers.get(ATLAS_UV_LAYER)
+    if layer is None:
+        source = render_uvs(mesh)
+        mesh["umap_atlas_uv_source"] = source.name
+        layer = mesh.uv_layers.new(name=ATLAS_UV_LAYER)
+        layer.data.foreach_set("uv", read_uvs(source).ravel())
+        layer.active_render = True
+    return layer
+
+
+def atlas_material(m: bpy.types.Material) -> bpy.types.Material:
+    """
+    Copy of the material that samples the atlas pages. The original is kept (with a fake user) as it
+    is, imports reuse materials by name and would otherwise give new meshes the atlas without its UVs.
+    """
+    copy = m.copy()
+    copy.name = m.name + ATLAS_SUFFIX
+    copy["umap_atlas_source"] = m.name
+    m.use_fake_user = True
+    return copy
+
+
+def read_uvs(layer: bpy.types.MeshUVLoopLayer) -> np.ndarray:
+    uvs = np.empty(len(layer.data) * 2, dtype=np.float32)
+    layer.data.foreach_get("uv", uvs)
+    return uvs.reshape(-1, 2)
+
+
+def find_users(materials) -> Dict[bpy.types.Material, List[Tuple[bpy.types.Mesh, int]]]:
+    """
+    Mesh and slot index of every use of the materials, only for materials whose UVs stay in 0-1 and
+    that no proxy uses: the full mesh swapped in for a proxy keeps its own UVs. Meshes without room
+    for the atlas UV layer exclude their materials as well.
+    """
+    users = {m: [] for m in materials}
+    excluded = set()
+    for mesh in bpy.data.meshes:
+        for material_index, m in enumerate(mesh.materials):
+            if m not in users or m in excluded:
+                continue
+            layer = render_uvs(mesh)
+            no_room = len(mesh.uv_layers) >= 8 and ATLAS_UV_LAYER not in mesh.uv_layers
+            if mesh.library or layer is None or "umap_full_mesh" in mesh or no_room:
+                excluded.add(m)
+                continue
+            uvs = read_uvs(layer)[material_loops(mesh, material_index)]
+            if len(uvs) and (uvs.min() < -0.001 or uvs.max() > 1.001):  # tiling, the atlas would show neighbours
+                excluded.add(m)
+                continue
+            users[m].append((mesh, material_index))
+    return {m: u for m, u in users.items() if u and m not in excluded}
+
+
+def pack(sizes: List[Tuple[int, int]], atlas_size: int, padding: int) -> List[Rect]:
+    """Shelf packing, tallest first, opening a new page when one is full"""
+    rects: List[Optional[Rect]] = [None] * len(sizes)
+    page = x = y = shelf_height = 0
+    for i in sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0])):
+        w, h = sizes[i][0] + 2 * padding, sizes[i][1] + 2 * padding
+        if x + w > atlas_size:
+            x, y, shelf_height = 0, y + shelf_height, 0
+        if y + h > atlas_size:
+            page, x, y, shelf_height = page + 1, 0, 0, 0
+        rects[i] = (page, x + padding, y + padding, sizes[i][0], sizes[i][1])
+        x += w
+        shelf_height = max(shelf_height, h)
+    return rects
+
+
+def image_pixels(img: bpy.types.Image) -> np.ndarray:
+    pixels = np.empty(len(img.pixels), dtype=np.float32)
+    img.pixels.foreach_get(pixels)
+    return pixels.reshape(img.size[1], img.size[0], 4)
+
+
+def layout_key(entries: List[Tuple[Tuple[str, str], ...]], atlas_size: int, padding: int) -> str:
+    """Changes with the packed images, their files and the atlas settings"""
+    sha1 = hashlib.sha1(f"{atlas_size}:{padding}".encode())
+    for entry in entries:
+        for role, name in entry:
+            img = bpy.data.images[name]
+            path = bpy.path.abspath(img.filepath)
+            sha1.update(f"{role}={path}:{os.path.getmtime(path) if os.path.exists(path) else 0}".encode())
+    return sha1.hexdigest()[:16]
+
+
+def build_pages(entries, rects: List[Rect], roles: List[str], atlas_size: int, padding: int,
+                directory: str, key: str) -> Dict[Tuple[int, str], str]:
+    """Writes one atlas image per page and input, returns their paths"""
+    paths = {}
+    num_pages = max(rect[0] for rect in rects) + 1
+    for page in range(num_pages):
+        for role in roles:
+            pixels = np.zeros((atlas_size, atlas_size, 4), dtype=np.float32)
+            pixels[..., 3] = 1.0
+            colorspace = "sRGB"
+            for entry, (entry_page, x, y, w, h) in zip(entries, rects):
+                name = dict(entry).get(role)
+                if entry_page != page or name is None:
+                    continue
+                img = bpy.data.images[name]
+                colorspace = img.colorspace_settings.name
+                # the padding repeats the edge pixels so filtering does not bleed neighbours in
+                tile = np.pad(image_pixels(img), ((padding, padding), (padding, padding), (0, 0)), mode="edge")
+                pixels[y - padding:y + h + padding, x - padding:x + w + padding] = tile
+
+            path = os.path.join(directory, f"{key}_{page}_{role}.png")
+            atlas = bpy.data.images.new(os.path.basename(path), atlas_size, atlas_size, alpha=True)
+            atlas.colorspace_settings.name = colorspace
+            atlas.pixels.foreach_set(pixels.ravel())
+            atlas.filepath_raw = path
+            atlas.file_format = "PNG"
+            atlas.save()
+            bpy.data.images.remove(atlas)
+            paths[(page, role)] = path
+    return paths
+
+
+def build_atlas(data_dir: str, max_size: int = 256, atlas_size: int = 2048, padding: int = 4) -> AtlasReport:
+    """
+    Packs the small textures of materials into shared atlas images and moves the UVs of the meshes
+    using those materials into their rect. The meshes get copies of the materials (<name>.atlas) and a
+    separate UV layer, remove_atlas puts the originals back. Materials whose UVs tile are left alone.
+    The layout and the atlas pages are kept in <data_dir>/atlas and reused while the packed textures
+    stay the same.
+    """
+    report = AtlasReport()
+    max_size = min(max_size, atlas_size - 2 * padding)  # a texture has to fit a page with its padding
+    candidates = {}
+    for m in bpy.data.materials:
+        nodes = atlas_textures(m, max_size)
+        if nodes:
+            candidates[m] = nodes
+    users = find_users(candidates.keys())
+    candidates = {m: nodes for m, nodes in candidates.items() if m in users}
+    if not candidates:
+        return report
+
+    # materials with the same images share one rect
+    entry_of = {m: tuple(sorted((role, node.image.name) for role, node in nodes.items())) for m, nodes in candidates.items()}
+    entries = sorted(set(entry_of.values()))
+    roles = sorted({role for entry in entries for role, _ in entry})
+
+    directory = os.path.join(data_dir, "atlas")
+    os.makedirs(directory, exist_ok=True)
+    key = layout_key(entries, atlas_size, padding)
+    layout_path = os.path.join(directory, key + ".json")
+
+    layout = None
+    if os.path.exists(layout_path):
+        with open(layout_path) as f:
+            layout = json.load(f)
+        if not all(os.path.exists(path) for path in layout["pages"].values()):
+            layout = None
+
+    if layout:
+        report.cached = True
+        rects = [tuple(rect) for rect in layout["rects"]]
+        pages = {}
+        for page_role, path in layout["pages"].items():
+            page, role = page_role.split(":", 1)
+            pages[(int(page), role)] = path
+    else:
+        sizes = [tuple(bpy.data.images[entry[0][1]].size) for entry in entries]
+        rects = pack(sizes, atlas_size, padding)
+        pages = build_pages(entries, rects, roles, atlas_size, padding, directory, key)
+        with atomic_path(layout_path) as tmp_path, open(tmp_path, "w") as f:
+            json.dump({"rects": rects, "pages": {f"{page}:{role}": path for (page, role), path in pages.items()}}, f)
+
+    rect_of = dict(zip(entries, rects))
+    loaded = {}
+    rewritten_meshes = set()
+    for m in candidates:
+        page, x, y, w, h = rect_of[entry_of[m]]
+        atlased = atlas_material(m)
+        for role, node in atlas_textures(atlased, max_size).items():
+            path = pages[(page, role)]
+            if path not in loaded:
+                loaded[path] = bpy.data.images.load(path, check_existing=True)
+                loaded[path].colorspace_settings.name = node.image.colorspace_settings.name
+            node.image = loaded[path]
+            node.extension = "EXTEND"
+
+        for mesh, material_index in users[m]:
+            layer = atlas_uvs(mesh)
+            uvs = read_uvs(layer)
+            mask = material_loops(mesh, material_index)
+            uvs[mask] = (np.clip(uvs[mask], 0.0, 1.0) * (w, h) + (x, y)) / atlas_size
+            layer.data.foreach_set("uv", uvs.ravel())
+            mesh.materials[material_index] = atlased
+            rewritten_meshes.add(mesh)
+
+    report.num_materials = len(candidates)
+    report.num_images = len({name for entry in entries for _, name in entry})
+    report.num_pages = max(rect[0] for rect in rects) + 1
+    report.num_meshes = len(rewritten_meshes)
+    return report
+
+
+def remove_atlas() -> int:
+    """Gives the atlased meshes their original materials and render UVs back, returns how many"""
+    num_meshes = 0
+    for mesh in bpy.data.meshes:
+        layer = mesh.uv_layers.get(ATLAS_UV_LAYER)
+        if mesh.library or layer is None:
+            continue
+        source = mesh.uv_layers.get(mesh.get("umap_atlas_uv_source", ""))
+        if source:
+            source.active_render = True
+        mesh.uv_layers.remove(layer)
+        for i, m in enumerate(mesh.materials):
+            original = bpy.data.materials.get(m["umap_atlas_source"]) if m and "umap_atlas_source" in m else None
+            if original:
+                mesh.materials[i] = original
+        mesh.pop("umap_atlas_uv_source", None)
+        num_meshes += 1
+
+    for m in [m for m in bpy.data.materials if "umap_atlas_source" in m and m.users == 0]:
+        bpy.data.materials.remove(m)
+    return num_meshes
+
+
+def build_atlas_from_scene(sc: bpy.types.Scene) -> AtlasReport:
+    return build_atlas(sc.exportPath, sc.atlas_max_size, int(sc.atlas_size))
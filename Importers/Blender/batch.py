@@ -0,0 +1,138 @@
+"""
+Exports and imports many maps in one go, each map into its own .blend file:
+
+    blender -b --python-expr "from BlenderUmap import batch; batch.main()" -- job.json
+
+The job file:
+
+    {
+        "DataDir": "<export folder with the config.json written by the addon>",
+        "Maps": ["/Game/Maps/MapA", "/Game/Maps/MapB"],
+        "OutputDir": "<folder for the .blend files>",
+        "Workers": 4,
+        "Exporter": "<optional path to a custom exporter>",
+        "Settings": {"use_generic_shader": true}
+    }
+
+All maps are exported by a single exporter run, then every map is imported by its own background
+Blender process, Workers of them at a time. The .blend files mirror the package paths of the maps,
+/Game/Maps/MapA is saved as <OutputDir>/Game/Maps/MapA.blend.
+"""
+import inspect
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import bpy
+
+from .exporter import default_exporter_path, run_exporter
+from .options import ImportOptions
+
+# ImportOptions a job's Settings may override, with the defaults of the ImportOptions constructor
+DEFAULT_SETTINGS = {name: param.default for name, param in inspect.signature(ImportOptions).parameters.items()
+                    if isinstance(param.default, (bool, int, float, str))}
+
+
+def export_maps(data_dir: str, maps: List[str], exporter: str) -> List[Optional[str]]:
+    """Processed map paths in the order of maps, None for the maps that failed to export"""
+    config_path = os.path.join(data_dir, "config.json")
+    with open(config_path) as f:
+        config = json.load(f)
+    config["ExportPackages"] = maps
+    with open(config_path, "w") as f:
+        json.dump(config, f, indent=4)
+
+    try:
+        run_exporter(exporter, data_dir)
+    finally:
+        # the panel's single map export must not pick the batch up
+        config.pop("ExportPackages")
+        with open(config_path, "w") as f:
+            json.dump(config, f, indent=4)
+
+    with open(os.path.join(data_dir, "batch.processed.json")) as f:
+        return json.load(f)
+
+
+def import_map(data_dir: str, processed_map_path: str, blend_path: str, settings: dict):
+    """Imports one exported map into the current (background) Blender and saves it as blend_path"""
+    from .cli import load_texture_mappings, run_import
+
+    bpy.ops.wm.read_homefile(use_empty=True)  # no startup file objects in the saved map
+    bpy.context.scene.name = "Scene"
+
+    texture_mappings = load_texture_mappings(os.path.join(data_dir, "config.json"))
+    options = ImportOptions.from_dict({**DEFAULT_SETTINGS, **settings}, texture_mappings)
+    run_import(data_dir, options, processed_map_path, blend_path)
+
+
+def import_in_worker(data_dir: str, processed_map_path: str, blend_path: str, settings: dict) -> bool:
+    args = json.dumps({"data_dir": data_dir, "processed_map_path": processed_map_path,
+                       "blend_path": blend_path, "settings": settings})
+    result = subprocess.run([
+        bpy.app.binary_path, "-b",
+        "--python-expr", f"from {__package__} import batch; batch.worker_main()",
+        "--", args
+    ])
+    return result.returncode == 0
+
+
+def blend_path_of(output_dir: str, processed_map_path: str) -> str:
+    """Maps with the same name in different folders get their own .blend"""
+    return os.path.join(output_dir, *processed_map_path.strip("/").split("/")) + ".blend"
+
+
+def run_job(job: dict) -> int:
+    """Returns the number of maps that failed"""
+    data_dir = job["DataDir"]
+    maps = job["Maps"]
+    output_dir = job.get("OutputDir", os.path.join(data_dir, "blends"))
+    workers = job.get("Workers", max(1, (os.cpu_count() or 2) // 2))
+    settings = job.get("Settings", {})
+    os.makedirs(output_dir, exist_ok=True)
+
+    start = time.time()
+    processed = export_maps(data_dir, maps, job.get("Exporter") or default_exporter_path(bpy.context))
+    print(f"[Batch] Exported {sum(1 for it in processed if it)}/{len(maps)} maps in {time.time() - start:.1f} seconds")
+
+    def import_one(processed_map_path: str) -> bool:
+        blend_path = blend_path_of(output_dir, processed_map_path)
+        os.makedirs(os.path.dirname(blend_path), exist_ok=True)
+        ok = import_in_worker(data_dir, processed_map_path, blend_path, settings)
+        print(f"[Batch] {'Imported' if ok else 'FAILED to import'} {processed_map_path}")
+        return ok
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(import_one, [it for it in processed if it]))
+
+    failed = len(maps) - sum(results)
+    print(f"[Batch] Done in {time.time() - start:.1f} seconds, {failed} of {len(maps)} maps failed")
+    return failed
+
+
+def script_args() -> List[str]:
+    return sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+
+
+def main():
+    args = script_args()
+    if len(args) != 1:
+        print("usage: blender -b --python-expr \"from BlenderUmap import batch; batch.main()\" -- job.json")
+        sys.exit(2)
+    with open(args[0]) as f:
+        job = json.load(f)
+    sys.exit(1 if run_job(job) > 0 else 0)
+
+
+def worker_main():
+    try:
+        import_map(**json.loads(script_args()[0]))
+    except Exception:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+    sys.exit(0)
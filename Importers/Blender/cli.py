@@ -0,0 +1,114 @@
+"""
+Imports an exported map without the addon's UI, e.g. on render farm nodes or in CI:
+
+    blender -b --python-expr "from BlenderUmap import cli; cli.main()" -- --data-dir <export folder> [options]
+
+Nothing is read from the scene properties of the panel, the import options come from --options
+(a JSON file with the ImportOptions arguments) and the texture mappings from the exporter config.
+Exits with 0 on success, 1 if the export or import failed and 2 on invalid arguments.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from typing import List, Optional
+
+import bpy
+
+from .options import ImportOptions
+from .texture import TextureMapping
+
+
+def load_texture_mappings(config_path: str) -> Optional[TextureMapping]:
+    if not os.path.exists(config_path):
+        return None
+    with open(config_path) as f:
+        return TextureMapping.from_dict(json.load(f)["Textures"])
+
+
+def load_options(options_path: Optional[str], config_path: str) -> ImportOptions:
+    texture_mappings = load_texture_mappings(config_path)
+    settings = {}
+    if options_path:
+        with open(options_path) as f:
+            settings = json.load(f)
+    return ImportOptions.from_dict(settings, texture_mappings)
+
+
+def run_import(data_dir: str, options: ImportOptions, processed_map_path: Optional[str] = None,
+               blend_path: Optional[str] = None) -> Optional[bpy.types.Object]:
+    """
+    Imports the map into the "Imported" collection of the current scene, the last exported map
+    (processed.json) when no processed map path is given, and saves the file when blend_path is set
+    """
+    from .main import create_node_groups
+    from .umap import import_umap, cleanup, append_shader_node_groups, prepare_import_collection, ensure_fallback_meshes
+    from . import memory
+
+    if processed_map_path is None:
+        with open(os.path.join(data_dir, "processed.json")) as f:
+            processed_map_path = json.load(f)
+
+    if not all(bpy.data.node_groups.get(it) for it in ("UV Shader Mix", "Texture Shader", "Texture Shader Split")):
+        create_node_groups()
+    append_shader_node_groups(data_dir)
+
+    import_collection = prepare_import_collection(bpy.context.scene)
+    cleanup()
+    ensure_fallback_meshes()
+
+    start = time.time()
+    inst = import_umap(processed_map_path, import_collection, data_dir, options)
+    print(f"Imported {processed_map_path} in {time.time() - start:.1f} seconds")
+    if memory.memory_budget:
+        print("Memory:", memory.memory_budget.report())
+    cleanup()
+
+    if blend_path:
+        bpy.ops.wm.save_as_mainfile(filepath=blend_path)
+    return inst
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="blender -b --python-expr \"from BlenderUmap import cli; cli.main()\" --")
+    parser.add_argument("--data-dir", required=True, help="export folder of the exporter")
+    parser.add_argument("--config", help="exporter config, defaults to config.json in the data dir")
+    parser.add_argument("--options", help="JSON file with the import options")
+    parser.add_argument("--map", help="processed map path to import, defaults to the last exported map")
+    parser.add_argument("--export", action="store_true", help="run the exporter before importing")
+    parser.add_argument("--exporter", help="path to the exporter, defaults to the one bundled with the addon")
+    parser.add_argument("--output", help="save the result to this .blend")
+    parser.add_argument("--memory-ceiling", type=int, default=0,
+                        help="MB of meshes and images after which the rest of the import is degraded (0 for no limit)")
+    parser.add_argument("--degrade-to", choices=("PROXY", "FALLBACK"), default="PROXY",
+                        help="what meshes imported over the memory ceiling become")
+    parser.add_argument("--degrade-image-size", type=int, default=256,
+                        help="images loaded over the memory ceiling are halved until they fit this size")
+    return parser.parse_args(argv)
+
+
+def main():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    args = parse_args(argv)  # exits with 2 on invalid arguments
+
+    data_dir = os.path.abspath(args.data_dir)
+    config_path = os.path.abspath(args.config) if args.config else os.path.join(data_dir, "config.json")
+    try:
+        if args.export:
+            from .exporter import default_exporter_path, run_exporter
+            if config_path != os.path.join(data_dir, "config.json"):
+                shutil.copyfile(config_path, os.path.join(data_dir, "config.json"))
+            run_exporter(args.exporter or default_exporter_path(bpy.context), data_dir)
+
+        if args.memory_ceiling > 0:
+            from .memory import MemoryBudget, set_memory_budget
+            set_memory_budget(MemoryBudget(args.memory_ceiling, args.degrade_to, image_size=args.degrade_image_size))
+
+        run_import(data_dir, load_options(args.options, config_path), args.map, args.output)
+    except Exception:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+    sys.exit(0)
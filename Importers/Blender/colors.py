@@ -0,0 +1,42 @@
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+RGBA = Tuple[float, float, float, float]
+
+
+def srgb2lin(s):
+    if s <= 0.0404482362771082:
+        lin = s / 12.92
+    else:
+        lin = pow(((s + 0.055) / 1.055), 2.4)
+    return lin
+
+
+# linear value of every 8 bit sRGB channel value
+SRGB_TO_LINEAR = tuple(srgb2lin(i / 255) for i in range(256))
+
+
+def get_rgb_255(pv: dict) -> RGBA:
+    """FColor (0-255 sRGB channels) to linear RGBA"""
+    return (
+        SRGB_TO_LINEAR[int(pv["R"])],
+        SRGB_TO_LINEAR[int(pv["G"])],
+        SRGB_TO_LINEAR[int(pv["B"])],
+        SRGB_TO_LINEAR[int(pv["A"])]
+    )
+
+
+@lru_cache(maxsize=4096)
+def hex_to_rgb(hex_: str) -> RGBA:  # ARGB
+    hex_ = "ff" + hex_ if len(hex_) == 6 else hex_
+    return tuple(int(hex_[i:i+2], 16)/255 for i in (2, 4, 6, 0))
+
+
+def get_rgb_255_batch(pvs: Iterable[Optional[dict]]) -> List[Optional[RGBA]]:
+    """All colors of a map's lights at once, missing colors stay None"""
+    return [get_rgb_255(pv) if pv else None for pv in pvs]
+
+
+def vector_params_to_rgba(vector_params: Dict[str, str]) -> Dict[str, RGBA]:
+    """All VectorParams of a material at once"""
+    return {name: hex_to_rgb(value) for name, value in vector_params.items()}
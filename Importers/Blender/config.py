@@ -46,8 +46,11 @@ class Config:
     EncryptionKeys: List[Any]
     bDumpAssets: bool
     ObjectCacheSize: int
+    ObjectCacheSizeMB: int
+    ExtraLods: int
     bReadMaterials: bool
     bExportToDDSWhenPossible: bool
+    TextureFormat: str
     bExportBuildingFoundations: bool
     ExportPackage: str
     Textures: TextureMapping
@@ -63,8 +66,11 @@ class Config:
         self.EncryptionKeys = sc.dpklist
         self.bDumpAssets = sc.bdumpassets
         self.ObjectCacheSize = sc.ObjectCacheSize
+        self.ObjectCacheSizeMB = sc.ObjectCacheSizeMB
+        self.ExtraLods = sc.export_lods
         self.bReadMaterials = sc.readmats
         self.bExportToDDSWhenPossible = sc.bExportToDDSWhenPossible
+        self.TextureFormat = sc.texture_format
         self.bExportBuildingFoundations = sc.bExportBuildingFoundations
         self.bExportHiddenObjects = sc.bExportHiddenObjects
         self.ExportPackage = sc.package
@@ -76,8 +82,11 @@ class Config:
                         "ExportPath": self.ExportPath,
                         "UEVersion": self.CustomVersion if self.bUseCustomEngineVer else self.UEVersion,
                         "bDumpAssets": self.bDumpAssets, "ObjectCacheSize": self.ObjectCacheSize,
+                        "ObjectCacheSizeMB": self.ObjectCacheSizeMB,
+                        "ExtraLods": self.ExtraLods,
                         "bReadMaterials": self.bReadMaterials,
                         "bExportToDDSWhenPossible": self.bExportToDDSWhenPossible,
+                        "TextureFormat": self.TextureFormat,
                         "bExportBuildingFoundations": self.bExportBuildingFoundations,
                         "bExportHiddenObjects": self.bExportHiddenObjects,
                         "ExportPackage": self.ExportPackage,
@@ -110,8 +119,11 @@ class Config:
 
         sc.bdumpassets = data["bDumpAssets"]
         sc.ObjectCacheSize = data["ObjectCacheSize"]
+        sc.ObjectCacheSizeMB = data.get("ObjectCacheSizeMB", 0)
+        sc.export_lods = data.get("ExtraLods", 0)
         sc.readmats = data["bReadMaterials"]
         sc.bExportToDDSWhenPossible = data["bExportToDDSWhenPossible"]
+        sc.texture_format = data.get("TextureFormat", "PNG")
         sc.bExportHiddenObjects = data.get("bExportHiddenObjects", False)
         sc.bExportBuildingFoundations = data["bExportBuildingFoundations"]
         sc.package = data["ExportPackage"]
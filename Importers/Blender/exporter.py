@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+
+import bpy
+
+
+def default_exporter_path(context: bpy.types.Context) -> str:
+    """The exporter shipped with the addon, unless a custom one is set in the preferences"""
+    exporter = os.path.join(os.path.dirname(os.path.abspath(__file__)), "BlenderUmap")
+    addon = context.preferences.addons.get(__package__)
+    if addon and addon.preferences.filepath != "":
+        exporter = addon.preferences.filepath
+    return exporter
+
+
+def run_exporter(exporter: str, data_dir: str):
+    """Runs the exporter in data_dir, where it reads config.json from"""
+    if sys.platform == "win32" and not exporter.endswith(".exe"):
+        executable = exporter.replace(r"\\", "/") + ".exe"
+        cmd = []
+    else:
+        executable = exporter.replace(r"\\", "/")
+        cmd = []
+
+    env_vars = os.environ.copy()
+    env_vars["PATH"] = f"{data_dir};" + env_vars["PATH"]
+
+    subprocess.run(
+        cmd,
+        executable=executable,
+        capture_output=False,
+        shell=False,
+        check=True,
+        cwd=data_dir.replace(r"\\", "/"),
+        env=env_vars
+    )
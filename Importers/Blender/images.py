@@ -0,0 +1,250 @@
+import hashlib
+import os
+import struct
+import zlib
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import bpy
+
+SLOTS = ("Diffuse", "Normal", "Specular", "Emission", "Mask")
+TEXTURE_EXTENSIONS = (".tga", ".png", ".dds")  # probing order of exported textures
+
+
+def read_image_size(path: str) -> Optional[Tuple[int, int]]:
+    """Width and height from the file header, without decoding the image"""
+    with open(path, "rb") as f:
+        header = f.read(24)
+    if header[:8] == b"\x89PNG\r\n\x1a\n":
+        return struct.unpack(">II", header[16:24])
+    if header[:4] == b"DDS ":
+        height, width = struct.unpack("<II", header[12:20])
+        return width, height
+    if path.lower().endswith(".tga") and len(header) >= 16:
+        return struct.unpack("<HH", header[12:16])
+    return None
+
+
+def load_downscaled(img_path: str, size: Tuple[int, int]) -> bpy.types.Image:
+    """The image scaled to size, cached next to the source as <name>.<width>x<height>.png"""
+    cache_path = f"{os.path.splitext(img_path)[0]}.{size[0]}x{size[1]}.png"
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(img_path):
+        return bpy.data.images.load(filepath=cache_path)
+
+    img = bpy.data.images.load(filepath=img_path)
+    img.scale(*size)
+    img.file_format = "PNG"
+    with atomic_path(cache_path) as tmp_path:
+        img.filepath_raw = tmp_path
+        img.save()
+    img.filepath_raw = cache_path
+    return img
+
+
+def write_gray_png(path: str, rows: List[bytes]):
+    """8 bit grayscale PNG from its rows of bytes, top row first"""
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    header = struct.pack(">IIBBBBB", len(rows[0]), len(rows), 8, 0, 0, 0, 0)
+    data = zlib.compress(b"".join(b"\x00" + row for row in rows))  # filter type 0 on every row
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", data) + chunk(b"IEND", b""))
+
+
+class TextureBudget:
+    """
+    Caps the resolution of loaded images per texture slot and their total memory. Oversized
+    images are downscaled once and saved next to the source as <name>.<width>x<height>.png,
+    later imports load that copy directly.
+    """
+
+    def __init__(self, max_sizes: Dict[str, int], memory_cap_mb: int = 0) -> None:
+        self.max_sizes = max_sizes
+        self.memory_cap = memory_cap_mb * 1024 * 1024
+        self.used_bytes = 0
+        self.num_loaded = 0
+        self.num_downscaled = 0
+
+    def target_size(self, slot: str, width: int, height: int) -> Tuple[int, int]:
+        max_size = self.max_sizes.get(slot, 0)
+        while max_size and max(width, height) > max_size and min(width, height) > 1:
+            width, height = width // 2, height // 2
+
+        # over the cap, keep halving until it fits what is left (but not below 64px)
+        if self.memory_cap:
+            while self.used_bytes + width * height * 4 > self.memory_cap and min(width, height) > 64:
+                width, height = width // 2, height // 2
+        return width, height
+
+    def load(self, img_path: str, slot: str) -> bpy.types.Image:
+        size = read_image_size(img_path)
+        if size is None:
+            img = bpy.data.images.load(filepath=img_path)
+            size = tuple(img.size)
+            target = self.target_size(slot, *size)
+            if target != size:
+                img.scale(*target)
+                self.num_downscaled += 1
+        else:
+            target = self.target_size(slot, *size)
+            if target == size:
+                img = bpy.data.images.load(filepath=img_path)
+            else:
+                img = load_downscaled(img_path, target)
+                self.num_downscaled += 1
+
+        self.used_bytes += target[0] * target[1] * 4
+        self.num_loaded += 1
+        return img
+
+    def report(self) -> str:
+        return f"{self.num_loaded} textures loaded ({self.num_downscaled} downscaled), {self.used_bytes / (1024 * 1024):.1f} MB"
+
+
+@contextmanager
+def atomic_path(path: str) -> Iterator[str]:
+    """
+    Temporary path next to path to write to, moved over path once the block finishes, so a cache file
+    is never seen half written by a parallel import or left broken by a crash
+    """
+    root, ext = os.path.splitext(path)
+    tmp_path = f"{root}.{os.getpid()}.tmp{ext}"
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def file_digest(path: str) -> str:
+    """sha1 of the file, kept in a <path>.sha1 sidecar that is reused while it is newer than the file"""
+    sidecar = path + ".sha1"
+    if os.path.exists(sidecar) and os.path.getmtime(sidecar) >= os.path.getmtime(path):
+        with open(sidecar, "r") as f:
+            return f.read().strip()
+
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha1.update(chunk)
+    digest = sha1.hexdigest()
+    with atomic_path(sidecar) as tmp_path, open(tmp_path, "w") as f:
+        f.write(digest)
+    return digest
+
+
+class ImageRegistry:
+    """
+    Loaded images by asset path and by content digest, so identical files share one image. Both keys
+    include the colorspace the image was loaded for, if it was given one.
+    """
+
+    def __init__(self) -> None:
+        self.by_asset: Dict[str, bpy.types.Image] = {}
+        self.by_digest: Dict[str, bpy.types.Image] = {}
+        self.num_shared = 0
+        for img in bpy.data.images:
+            if "umap_asset_path" in img:
+                self.by_asset[img["umap_asset_path"]] = img
+            if "umap_digest" in img:
+                self.by_digest[img["umap_digest"]] = img
+
+    def find(self, asset_path: str, digest: str) -> Optional[bpy.types.Image]:
+        img = self.by_digest.get(digest)
+        if img:
+            self.by_asset[asset_path] = img
+            self.num_shared += 1
+        return img
+
+    def add(self, img: bpy.types.Image, asset_path: str, digest: str):
+        img["umap_asset_path"] = asset_path
+        img["umap_digest"] = digest
+        self.by_asset[asset_path] = img
+        self.by_digest[digest] = img
+
+    def remove(self, img: bpy.types.Image):
+        """Forgets the image, before it is removed from the file"""
+        for index in (self.by_asset, self.by_digest):
+            for key in [key for key, it in index.items() if it == img]:
+                del index[key]
+
+
+texture_budget: Optional[TextureBudget] = None
+image_registry: Optional[ImageRegistry] = None
+
+
+def set_texture_budget(budget: Optional[TextureBudget]):
+    global texture_budget
+    texture_budget = budget
+
+
+def get_image_registry() -> ImageRegistry:
+    global image_registry
+    if image_registry is None:
+        image_registry = ImageRegistry()
+    return image_registry
+
+
+def reset_image_registry():
+    """Must be called after images were removed, the registry would still point to them"""
+    global image_registry
+    image_registry = None
+
+
+def split_channels(img: bpy.types.Image, channels: str) -> List[bpy.types.Image]:
+    """
+    One non-color image per channel of a channel packed texture (e.g. SpecularMasks), split once
+    with NumPy and cached next to the source as 8 bit grayscale <name>.<channel>.png. The packed
+    image is removed afterwards unless something else uses it.
+    """
+    import numpy as np
+
+    registry = get_image_registry()
+    asset_path = img.get("umap_asset_path", img.name)
+    src_path = bpy.path.abspath(img.filepath)
+    result = []
+    pixels = None
+
+    for k, channel in enumerate("RGBA"):
+        if channel not in channels:
+            continue
+        channel_asset = f"{asset_path}.{channel}"
+        channel_img = registry.by_asset.get(channel_asset)
+
+        if channel_img is None:
+            cache_path = f"{os.path.splitext(src_path)[0]}.{channel}.png"
+            if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(src_path):
+                channel_img = bpy.data.images.load(filepath=cache_path)
+            else:
+                if pixels is None:
+                    pixels = np.empty(len(img.pixels), dtype=np.float32)
+                    img.pixels.foreach_get(pixels)
+                    pixels = pixels.reshape(-1, 4)
+
+                width, height = img.size
+                # Blender's rows start at the bottom, PNG rows at the top
+                channel_bytes = np.round(np.clip(pixels[:, k], 0.0, 1.0) * 255).astype(np.uint8).reshape(height, width)
+                with atomic_path(cache_path) as tmp_path:
+                    write_gray_png(tmp_path, [row.tobytes() for row in channel_bytes[::-1]])
+                channel_img = bpy.data.images.load(filepath=cache_path)
+
+            channel_img.name = f"{img.name}.{channel}"
+            channel_img.colorspace_settings.name = "Non-Color"
+            channel_img["umap_asset_path"] = channel_asset
+            registry.by_asset[channel_asset] = channel_img
+        result.append(channel_img)
+
+    if img.users == 0:
+        registry.remove(img)
+        bpy.data.images.remove(img)
+    else:
+        img.buffers_free()
+    return result
+
+
+def texture_budget_from_scene(sc: bpy.types.Scene) -> Optional[TextureBudget]:
+    if not sc.use_texture_budget:
+        return None
+    return TextureBudget({slot: getattr(sc, f"max_size_{slot.lower()}") for slot in SLOTS}, sc.texture_memory_cap)
@@ -0,0 +1,66 @@
+import os
+from typing import Optional
+
+import bpy
+
+from .images import atomic_path
+
+
+class MeshLibrary:
+    """
+    Imported meshes with their materials, saved as one .blend per mesh key in <export dir>/mesh_library.
+    Meshes found there are linked (or appended) instead of imported from the psk again. The key is kept
+    on the mesh as umap_mesh_key, Blender may shorten or suffix the mesh name itself.
+    """
+
+    def __init__(self, directory: str, link: bool = True) -> None:
+        self.directory = directory
+        self.link = link
+        self.num_loaded = 0
+        self.num_written = 0
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".blend")
+
+    def get(self, key: str, source_path: str) -> Optional[bpy.types.Mesh]:
+        """The library mesh for the key, unless the psk was exported again after it was saved"""
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        if os.path.exists(source_path) and os.path.getmtime(source_path) > os.path.getmtime(path):
+            return None
+
+        # every library file holds a single mesh, its key property tells it apart from stale files
+        with bpy.data.libraries.load(path, link=self.link) as (data_from, data_to):
+            data_to.meshes = list(data_from.meshes)
+        mesh = next((it for it in data_to.meshes if it is not None and it.get("umap_mesh_key") == key), None)
+        if mesh is None:
+            return None
+
+        self.num_loaded += 1
+        return mesh
+
+    def add(self, key: str, mesh: bpy.types.Mesh):
+        """Writes the mesh and everything it uses (materials, node groups, image references)"""
+        os.makedirs(self.directory, exist_ok=True)
+        mesh["umap_mesh_key"] = key
+        with atomic_path(self.path(key)) as tmp_path:
+            bpy.data.libraries.write(tmp_path, {mesh}, path_remap="ABSOLUTE", fake_user=True)
+        self.num_written += 1
+
+    def report(self) -> str:
+        return f"{self.num_loaded} meshes {'linked' if self.link else 'appended'} from the library, {self.num_written} added"
+
+
+mesh_library: Optional[MeshLibrary] = None
+
+
+def set_mesh_library(library: Optional[MeshLibrary]):
+    global mesh_library
+    mesh_library = library
+
+
+def mesh_library_from_scene(sc: bpy.types.Scene, data_dir: str) -> Optional[MeshLibrary]:
+    if sc.mesh_library_mode == "NONE":
+        return None
+    return MeshLibrary(os.path.join(data_dir, "mesh_library"), link=sc.mesh_library_mode == "LINK")
@@ -0,0 +1,110 @@
+from typing import Dict, Iterable, List, Tuple
+
+import bpy
+from mathutils import Matrix, Vector
+from mathutils.kdtree import KDTree
+
+
+class LightReport:
+    def __init__(self) -> None:
+        self.num_lights = 0
+        self.num_culled = 0
+        self.num_merged = 0
+        self.num_clusters = 0
+
+    def __str__(self) -> str:
+        return (f"{self.num_lights} lights: {self.num_culled} culled, "
+                f"{self.num_merged} merged into {self.num_clusters}, "
+                f"{self.num_lights - self.num_culled - self.num_merged + self.num_clusters} left")
+
+
+def local_to_scene(ob: bpy.types.Object) -> Matrix:
+    """Object matrix in its scene, computed from the parent chain so it is valid before a depsgraph update"""
+    matrix = ob.matrix_basis
+    while ob.parent:
+        matrix = ob.parent.matrix_basis @ ob.matrix_parent_inverse @ matrix
+        ob = ob.parent
+    return matrix
+
+
+def imported_lights() -> List[bpy.types.Object]:
+    return [ob for ob in bpy.data.objects if ob.type == "LIGHT" and "umap_light_key" in ob.data]
+
+
+def should_cull(light: bpy.types.Light, min_energy: float, min_radius: float) -> bool:
+    if light.energy < min_energy:
+        return True
+    return light.use_custom_distance and light.cutoff_distance < min_radius
+
+
+def merge_cluster(obs: List[bpy.types.Object], positions: List[Vector]):
+    """Keeps the first light at the energy weighted center of the cluster with the summed energy"""
+    total_energy = sum(ob.data.energy for ob in obs)
+    if total_energy > 0:
+        center = sum((p * ob.data.energy for ob, p in zip(obs, positions)), Vector()) / total_energy
+    else:
+        center = sum(positions, Vector()) / len(positions)
+
+    keep = obs[0]
+    merged = keep.data.copy()
+    del merged["umap_light_key"]
+    merged.energy = total_energy
+    merged.shadow_soft_size = max(ob.data.shadow_soft_size for ob in obs)
+    if merged.use_custom_distance:
+        merged.cutoff_distance = max(ob.data.cutoff_distance + (p - center).length for ob, p in zip(obs, positions))
+    keep.data = merged
+
+    parent_matrix = local_to_scene(keep) @ keep.matrix_basis.inverted_safe()
+    keep.matrix_basis = parent_matrix.inverted_safe() @ Matrix.Translation(center)
+
+    for ob in obs[1:]:
+        bpy.data.objects.remove(ob)
+
+
+def optimize_lights(lights: Iterable[bpy.types.Object], min_energy: float = 0, min_radius: float = 0,
+                    merge_distance: float = 0) -> LightReport:
+    """
+    Removes lights too weak or too small to matter and merges point lights of the same color that are
+    closer than merge_distance to each other. Lights are only merged with lights of the same collection,
+    positions of lights in different map scenes are not comparable.
+    """
+    report = LightReport()
+    groups: Dict[Tuple, List[bpy.types.Object]] = {}
+
+    for ob in list(lights):
+        report.num_lights += 1
+        if should_cull(ob.data, min_energy, min_radius):
+            bpy.data.objects.remove(ob)
+            report.num_culled += 1
+            continue
+        if merge_distance > 0 and ob.data.type == "POINT" and len(ob.users_collection) > 0:
+            color = tuple(round(c, 2) for c in ob.data.color)
+            groups.setdefault((ob.users_collection[0].name, color), []).append(ob)
+
+    for obs in groups.values():
+        if len(obs) < 2:
+            continue
+        positions = [local_to_scene(ob).translation.copy() for ob in obs]
+        tree = KDTree(len(obs))
+        for i, p in enumerate(positions):
+            tree.insert(p, i)
+        tree.balance()
+
+        visited = set()
+        for i, p in enumerate(positions):
+            if i in visited:
+                continue
+            cluster = [j for _, j, _ in tree.find_range(p, merge_distance) if j not in visited]
+            visited.update(cluster)
+            if len(cluster) < 2:
+                continue
+            cluster.sort()
+            merge_cluster([obs[j] for j in cluster], [positions[j] for j in cluster])
+            report.num_merged += len(cluster)
+            report.num_clusters += 1
+
+    return report
+
+
+def optimize_lights_from_scene(sc: bpy.types.Scene) -> LightReport:
+    return optimize_lights(imported_lights(), sc.light_min_energy, sc.light_min_radius, sc.light_merge_distance)
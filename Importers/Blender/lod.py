@@ -0,0 +1,51 @@
+import os
+from typing import Iterable, Optional
+
+import bpy
+from mathutils import Matrix, Vector
+
+from .region import to_blender_location
+
+
+def lod_mesh_path(full_mesh_path: str, lod: int) -> Optional[str]:
+    """Path of the exported psk for the given LOD, LOD0 has no suffix"""
+    base = full_mesh_path if lod == 0 else f"{full_mesh_path}_LOD{lod}"
+    for ext in (".psk", ".pskx"):
+        if os.path.exists(base + ext):
+            return base + ext
+    return None
+
+
+class LodSelector:
+    """Picks a LOD from the distance to the focus point, one LOD step every `distance` Blender units"""
+
+    def __init__(self, focus, distance: float, max_lod: int) -> None:
+        self.focus = Vector(focus)
+        self.distance = distance
+        self.max_lod = max_lod
+
+    def __repr__(self) -> str:
+        return f"LodSelector(focus={tuple(self.focus)}, distance={self.distance}, max_lod={self.max_lod})"
+
+    def to_local(self, matrix: Matrix) -> "LodSelector":
+        inv = matrix.inverted_safe()
+        return LodSelector(inv @ self.focus, self.distance * max(abs(s) for s in inv.to_scale()), self.max_lod)
+
+    def select(self, locations: Iterable) -> int:
+        """LOD for the closest of the given Unreal locations"""
+        dist = min(((to_blender_location(loc) - self.focus).length for loc in locations), default=0)
+        if self.distance <= 0:
+            return 0
+        return min(int(dist // self.distance), self.max_lod)
+
+    def resolve(self, full_mesh_path: str, lod: int) -> int:
+        """Highest exported LOD not above the wanted one"""
+        while lod > 0 and lod_mesh_path(full_mesh_path, lod) is None:
+            lod -= 1
+        return lod
+
+
+def lod_selector_from_scene(sc: bpy.types.Scene) -> Optional[LodSelector]:
+    if not sc.use_lods:
+        return None
+    return LodSelector(sc.lod_focus, sc.lod_distance, sc.export_lods)
@@ -1,20 +1,16 @@
 import typing
 import bpy
-from bpy.props import StringProperty, IntProperty, CollectionProperty, BoolProperty
+from bpy.props import StringProperty, IntProperty, CollectionProperty, BoolProperty, EnumProperty, FloatProperty, FloatVectorProperty
 import json
 import os
-from urllib.request import urlopen, Request
-import subprocess
-import sys
 
 from bpy.types import Context
+from bpy.app.handlers import persistent
 from .config import Config
-from .texture import textures_to_mapping
+from .images import SLOTS
 
-try:
-    from .umap import import_umap, cleanup
-except ImportError:
-    from ..umap import import_umap, cleanup
+# the importer, exporter launcher and network code are imported where they are first used,
+# enabling the addon only registers the UI
 
 classes = []
 
@@ -26,107 +22,69 @@ def config_file_exists():
     return os.path.isfile(os.path.join(bpy.context.scene.exportPath, "config.json"))
 
 def main(context, onlyimport=False):
+    from .umap import import_umap, cleanup, append_shader_node_groups, prepare_import_collection, ensure_fallback_meshes
+    from .options import ImportOptions
+    from .exporter import default_exporter_path, run_exporter
+    from .library import set_mesh_library, mesh_library_from_scene
+    from .lights import optimize_lights_from_scene
+    from .images import set_texture_budget, texture_budget_from_scene, get_image_registry
+    from .meshes import get_mesh_registry
+    from .memory import set_memory_budget, memory_budget_from_scene
+
     sc = bpy.context.scene
-    reuse_maps = sc.reuse_maps
-    reuse_meshes = sc.reuse_mesh
-    use_cube_as_fallback = sc.use_cube_as_fallback
-    use_generic_shader = sc.use_generic_shader
-    use_generic_shader_as_fallback = sc.use_generic_shader_as_fallback
     data_dir = sc.exportPath
-    addon_dir = os.path.dirname(os.path.splitext(__file__)[0])
+    options = ImportOptions.from_scene(sc)
 
     if not onlyimport:
         Config().dump(sc.exportPath)
-        exporter = os.path.join(addon_dir, "BlenderUmap")
-        addon_prefs = context.preferences.addons[__package__].preferences
-        if addon_prefs.filepath != "":
-            exporter = addon_prefs.filepath
-        if sys.platform == "win32" and not exporter.endswith(".exe"):
-            executable = exporter.replace(r"\\", "/") + ".exe"
-            cmd = []
-        else:
-            executable = exporter.replace(r"\\", "/")
-            cmd = []
-
-        env_vars = os.environ.copy()
-        env_vars["PATH"] = f"{sc.exportPath};" + env_vars["PATH"]
-
-        subprocess.run(
-            cmd,
-            executable=executable,
-            capture_output=False,
-            shell=False,
-            check=True,
-            cwd=data_dir.replace(r"\\", "/"),
-            env=env_vars
-        )
-
-    tex_shader = None
-    if use_generic_shader or use_generic_shader_as_fallback:
-        uvm = bpy.data.node_groups.get("UV Shader Mix")
-        tex_shader = bpy.data.node_groups.get("Texture Shader")
+        run_exporter(default_exporter_path(context), data_dir)
 
-        if not uvm or not tex_shader: # do we need this anymore?
+    if options.use_generic_shader or options.use_generic_shader_as_fallback:
+        if not all(bpy.data.node_groups.get(it) for it in ("UV Shader Mix", "Texture Shader", "Texture Shader Split")): # do we need this anymore?
             create_node_groups()
-            uvm = bpy.data.node_groups.get("UV Shader Mix")
-            tex_shader = bpy.data.node_groups.get("Texture Shader")
 
     # append all the node groups from blend files in the deps folder
-    shader_folder = os.path.join(data_dir, "shader")
-    if os.path.exists(shader_folder):
-        for shaderfile in os.listdir(shader_folder):
-            if shaderfile.endswith(".blend"):
-                print("Appending node groups from " + shaderfile)
-                with bpy.data.libraries.load(os.path.join(data_dir, "shader", shaderfile)) as (data_from, data_to):
-                    data_to.node_groups = data_from.node_groups
+    append_shader_node_groups(data_dir)
 
     # make sure we're on main scene to deal with the fallback objects
     main_scene = bpy.data.scenes.get("Scene") or bpy.data.scenes.new("Scene")
     bpy.context.window.scene = main_scene
 
     # prepare collection for imports
-    import_collection = bpy.data.collections.get("Imported")
-
-    if import_collection:
-        bpy.ops.object.select_all(action="DESELECT")
-
-        for obj in import_collection.objects:
-            obj.select_set(True)
-
-        bpy.ops.object.delete()
-    else:
-        import_collection = bpy.data.collections.new("Imported")
-        main_scene.collection.children.link(import_collection)
-
+    import_collection = prepare_import_collection(main_scene)
     cleanup()
+    ensure_fallback_meshes()
 
-    # setup fallback cube mesh
-    bpy.ops.mesh.primitive_cube_add(size=2)
-    fallback_cube = bpy.context.active_object
-    fallback_cube_mesh = fallback_cube.data
-    fallback_cube_mesh.name = "__fallback"
-    bpy.data.objects.remove(fallback_cube)
-
-    # 2. empty mesh
-    empty_mesh = bpy.data.meshes.get("__empty", bpy.data.meshes.new("__empty"))
+    texture_budget = texture_budget_from_scene(sc)
+    set_texture_budget(texture_budget)
+    mesh_library = mesh_library_from_scene(sc, data_dir)
+    set_mesh_library(mesh_library)
+    memory_budget = memory_budget_from_scene(sc)
+    set_memory_budget(memory_budget)
 
     # do it!
     with open(os.path.join(data_dir, "processed.json")) as file:
         import time
         stime = time.time()
-        import_umap(
-            json.loads(file.read()),
-            import_collection,
-            data_dir,
-            reuse_maps,
-            reuse_meshes,
-            use_cube_as_fallback,
-            use_generic_shader,
-            use_generic_shader_as_fallback,
-            tex_shader,
-            textures_to_mapping(bpy.context)
-        )
+        import_umap(json.loads(file.read()), import_collection, data_dir, options)
         print(f"Imported in {time.time() - stime} seconds")
+        if texture_budget:
+            print("Texture budget:", texture_budget.report())
+        if mesh_library:
+            print("Mesh library:", mesh_library.report())
+        if memory_budget:
+            print("Memory:", memory_budget.report())
+        print(f"Images shared by content: {get_image_registry().num_shared}")
+        print("Mesh reuse:", get_mesh_registry().report())
+
+    if sc.optimize_lights:
+        print("Light optimization:", optimize_lights_from_scene(sc))
+    if sc.use_texture_atlas:
+        from .atlas import build_atlas_from_scene
+        print("Texture atlas:", build_atlas_from_scene(sc))
+    if sc.merge_static:
+        from .merge import merge_static_from_scene
+        print("Batch merge:", merge_static_from_scene(sc))
 
     # go back to main scene
     bpy.context.window.scene = main_scene
@@ -250,20 +208,33 @@ class VIEW3D_PT_BlenderUmapMain(BlenderUmapPanel):
             col.prop(context.scene, "customEngineVer")
 
         col.prop(context.scene, "readmats")
+        col.prop(context.scene, "texture_format")
         col.prop(context.scene, "bExportToDDSWhenPossible")
         col.prop(context.scene, "bExportBuildingFoundations")
         col.prop(context.scene, "bExportHiddenObjects")
         col.prop(context.scene, "bdumpassets")
         col.prop(context.scene, "ObjectCacheSize")
+        col.prop(context.scene, "ObjectCacheSizeMB")
+        col.prop(context.scene, "export_lods")
         col.separator()
 
         col = col.column(align=True, heading="Importer Settings:")
-        col.prop(context.scene, "reuse_maps", text="Reuse Maps")
+        col.prop(context.scene, "flatten_maps")
+        if not context.scene.flatten_maps:
+            col.prop(context.scene, "reuse_maps", text="Reuse Maps")
         col.prop(context.scene, "reuse_mesh", text="Reuse Meshes")
+        col.prop(context.scene, "mesh_library_mode")
+        if not context.scene.flatten_maps:
+            col.prop(context.scene, "update_existing")
         col.prop(context.scene, "use_cube_as_fallback")
         col.prop(context.scene, "use_generic_shader")
         if not context.scene.use_generic_shader:
             col.prop(context.scene, "use_generic_shader_as_fallback")
+        if context.scene.use_generic_shader or context.scene.use_generic_shader_as_fallback:
+            col.prop(context.scene, "split_packed_channels")
+        col.prop(context.scene, "lazy_materials")
+        if context.scene.lazy_materials:
+            col.operator("umap.realize_materials", icon="MATERIAL")
 
         export_path_exists = os.path.exists(bpy.context.scene.exportPath)
         game_path_exists = os.path.exists(context.scene.Game_Path)
@@ -307,6 +278,154 @@ class VIEW3D_PT_BlenderUmapTextureMappings(BlenderUmapPanel):
                 col.prop(context.scene, f"{t}_{i}".lower())
 
 
+@register_class
+class VIEW3D_PT_BlenderUmapRegion(BlenderUmapPanel):
+    bl_label = f"Import Region"
+    bl_parent_id = "VIEW3D_PT_BlenderUmapMain"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context):
+        layout = self.layout
+        col = layout.column(align=True)
+        col.prop(context.scene, "region_mode")
+        if context.scene.region_mode == "NONE":
+            return
+
+        col.prop(context.scene, "region_units")
+        col.prop(context.scene, "region_center")
+        col.operator("umap.region_from_cursor", icon="PIVOT_CURSOR")
+        if context.scene.region_mode == "BOX":
+            col.prop(context.scene, "region_extent")
+        else:
+            col.prop(context.scene, "region_radius")
+
+
+@register_class
+class VIEW3D_PT_BlenderUmapLods(BlenderUmapPanel):
+    bl_label = f"Level of Detail"
+    bl_parent_id = "VIEW3D_PT_BlenderUmapMain"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context):
+        layout = self.layout
+        col = layout.column(align=True)
+        col.prop(context.scene, "use_lods")
+        if not context.scene.use_lods:
+            return
+
+        if context.scene.export_lods == 0:
+            col.label(text="Extra LODs must be exported", icon="ERROR")
+        col.prop(context.scene, "lod_focus")
+        col.operator("umap.lod_focus_from_cursor", icon="PIVOT_CURSOR")
+        col.prop(context.scene, "lod_distance")
+
+
+@register_class
+class VIEW3D_PT_BlenderUmapProxies(BlenderUmapPanel):
+    bl_label = f"Proxies"
+    bl_parent_id = "VIEW3D_PT_BlenderUmapMain"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context):
+        layout = self.layout
+        col = layout.column(align=True)
+        col.prop(context.scene, "use_proxies")
+        if context.scene.use_proxies:
+            col.prop(context.scene, "proxy_resolution")
+        col.separator()
+        col.operator("umap.swap_to_full", text="Full Resolution (Selected)", icon="MESH_DATA").in_region = False
+        col.operator("umap.swap_to_full", text="Full Resolution (Region)", icon="MESH_DATA").in_region = True
+
+
+@register_class
+class VIEW3D_PT_BlenderUmapTextureBudget(BlenderUmapPanel):
+    bl_label = f"Texture Budget"
+    bl_parent_id = "VIEW3D_PT_BlenderUmapMain"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context):
+        layout = self.layout
+        col = layout.column(align=True)
+        col.prop(context.scene, "use_texture_budget")
+        if not context.scene.use_texture_budget:
+            return
+
+        for slot in SLOTS:
+            col.prop(context.scene, f"max_size_{slot.lower()}")
+        col.prop(context.scene, "texture_memory_cap")
+
+
+@register_class
+class VIEW3D_PT_BlenderUmapMemory(BlenderUmapPanel):
+    bl_label = f"Memory Ceiling"
+    bl_parent_id = "VIEW3D_PT_BlenderUmapMain"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context):
+        layout = self.layout
+        col = layout.column(align=True)
+        col.prop(context.scene, "use_memory_ceiling")
+        if not context.scene.use_memory_ceiling:
+            return
+
+        col.prop(context.scene, "memory_ceiling")
+        col.prop(context.scene, "memory_degrade_to")
+        if context.scene.memory_degrade_to == "PROXY":
+            col.prop(context.scene, "memory_proxy_resolution")
+        col.prop(context.scene, "memory_image_size")
+
+
+@register_class
+class VIEW3D_PT_BlenderUmapLights(BlenderUmapPanel):
+    bl_label = f"Light Optimization"
+    bl_parent_id = "VIEW3D_PT_BlenderUmapMain"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context):
+        layout = self.layout
+        col = layout.column(align=True)
+        col.prop(context.scene, "optimize_lights")
+        col.prop(context.scene, "light_min_energy")
+        col.prop(context.scene, "light_min_radius")
+        col.prop(context.scene, "light_merge_distance")
+        col.separator()
+        col.operator("umap.optimize_lights", icon="LIGHT")
+
+
+@register_class
+class VIEW3D_PT_BlenderUmapAtlas(BlenderUmapPanel):
+    bl_label = f"Texture Atlas"
+    bl_parent_id = "VIEW3D_PT_BlenderUmapMain"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context):
+        layout = self.layout
+        col = layout.column(align=True)
+        col.prop(context.scene, "use_texture_atlas")
+        col.prop(context.scene, "atlas_max_size")
+        col.prop(context.scene, "atlas_size")
+        col.separator()
+        col.operator("umap.build_atlas", icon="TEXTURE")
+        col.operator("umap.remove_atlas", icon="TRASH")
+
+
+@register_class
+class VIEW3D_PT_BlenderUmapMerge(BlenderUmapPanel):
+    bl_label = f"Batch Merge"
+    bl_parent_id = "VIEW3D_PT_BlenderUmapMain"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context):
+        layout = self.layout
+        col = layout.column(align=True)
+        col.prop(context.scene, "merge_static")
+        col.prop(context.scene, "merge_cell_size")
+        col.prop(context.scene, "merge_min_objects")
+        col.separator()
+        col.operator("umap.merge_static", icon="MOD_BUILD")
+        col.operator("umap.select_merged_source", icon="RESTRICT_SELECT_OFF")
+
+
 @register_class
 class VIEW3D_PT_BlenderUmapAdvancedOptions(BlenderUmapPanel):
     bl_label = f"Advanced Options"
@@ -435,6 +554,204 @@ class VIEW_PT_UmapDumpConfig(bpy.types.Operator):
         Config().dump(context.scene.exportPath)
         return {"FINISHED"}
 
+@register_class
+class VIEW_PT_UmapRegionFromCursor(bpy.types.Operator):
+    """Center the import region on the 3D cursor"""
+
+    bl_idname = "umap.region_from_cursor"
+    bl_label = "Center on 3D Cursor"
+    bl_options = {"UNDO"}
+
+    def execute(self, context):
+        x, y, z = context.scene.cursor.location
+        if context.scene.region_units == "UNREAL":
+            context.scene.region_center = (x * 100, y * -100, z * 100)
+        else:
+            context.scene.region_center = (x, y, z)
+        return {"FINISHED"}
+
+@register_class
+class VIEW_PT_UmapLodFocusFromCursor(bpy.types.Operator):
+    """Use the 3D cursor as the LOD focus point"""
+
+    bl_idname = "umap.lod_focus_from_cursor"
+    bl_label = "Focus on 3D Cursor"
+    bl_options = {"UNDO"}
+
+    def execute(self, context):
+        context.scene.lod_focus = context.scene.cursor.location
+        return {"FINISHED"}
+
+@register_class
+class VIEW_PT_UmapSwapToFull(bpy.types.Operator):
+    """Replace proxy meshes with the full resolution meshes"""
+
+    bl_idname = "umap.swap_to_full"
+    bl_label = "Swap to Full Resolution"
+    bl_options = {"UNDO"}
+
+    in_region: BoolProperty(
+        name="In Region",
+        description="Swap the objects inside of the import region instead of the selected ones",
+        default=False,
+    )
+
+    def execute(self, context):
+        from .region import region_from_scene
+        from .proxy import swap_to_full
+        from .umap import get_importer
+
+        if self.in_region:
+            region = region_from_scene(context.scene)
+            if region is None:
+                self.report({"ERROR"}, "No import region set")
+                return {"CANCELLED"}
+            # map objects are only visible through collection instances, so test where they end up
+            depsgraph = context.evaluated_depsgraph_get()
+            objects = {inst.object.original for inst in depsgraph.object_instances
+                       if inst.is_instance and region.contains(inst.matrix_world.translation)}
+        else:
+            objects = set()
+            for ob in context.selected_objects:
+                if ob.instance_type == "COLLECTION" and ob.instance_collection:
+                    objects.update(ob.instance_collection.all_objects)
+                else:
+                    objects.add(ob)
+
+        swapped = swap_to_full(objects, get_importer())
+        self.report({"INFO"}, f"Swapped {swapped} objects to full resolution")
+        return {"FINISHED"}
+
+@register_class
+class VIEW_PT_UmapRealizeMaterials(bpy.types.Operator):
+    """Build the node trees and load the images of materials deferred by a lazy import"""
+
+    bl_idname = "umap.realize_materials"
+    bl_label = "Realize Materials"
+    bl_options = {"UNDO"}
+
+    visible_only: BoolProperty(
+        name="Visible Only",
+        description="Only realize materials of objects visible in the current scene",
+        default=True,
+    )
+
+    def execute(self, context):
+        from .umap import realize_materials
+        from .images import set_texture_budget, texture_budget_from_scene, reset_image_registry
+
+        if self.visible_only:
+            depsgraph = context.evaluated_depsgraph_get()
+            materials = [slot.material.original for inst in depsgraph.object_instances
+                         for slot in inst.object.material_slots if slot.material]
+        else:
+            materials = [m for m in bpy.data.materials if m.users > 0]
+
+        set_texture_budget(texture_budget_from_scene(context.scene))
+        reset_image_registry()
+        realized = realize_materials(materials)
+        self.report({"INFO"}, f"Realized {realized} materials")
+        return {"FINISHED"}
+
+@register_class
+class VIEW_PT_UmapOptimizeLights(bpy.types.Operator):
+    """Cull weak lights and merge nearby point lights of the same color"""
+
+    bl_idname = "umap.optimize_lights"
+    bl_label = "Optimize Lights"
+    bl_options = {"UNDO"}
+
+    def execute(self, context):
+        from .lights import optimize_lights_from_scene
+
+        report = optimize_lights_from_scene(context.scene)
+        for light in bpy.data.lights:
+            if light.users == 0:
+                bpy.data.lights.remove(light)
+        self.report({"INFO"}, str(report))
+        return {"FINISHED"}
+
+@register_class
+class VIEW_PT_UmapBuildAtlas(bpy.types.Operator):
+    """Pack the small textures of the imported materials into atlas images and remap the UVs using them"""
+
+    bl_idname = "umap.build_atlas"
+    bl_label = "Build Texture Atlas"
+    bl_options = {"UNDO"}
+
+    def execute(self, context):
+        from .atlas import build_atlas_from_scene
+
+        report = build_atlas_from_scene(context.scene)
+        self.report({"INFO"}, str(report))
+        return {"FINISHED"}
+
+@register_class
+class VIEW_PT_UmapRemoveAtlas(bpy.types.Operator):
+    """Give the atlased meshes their original materials and UVs back"""
+
+    bl_idname = "umap.remove_atlas"
+    bl_label = "Remove Texture Atlas"
+    bl_options = {"UNDO"}
+
+    def execute(self, context):
+        from .atlas import remove_atlas
+
+        self.report({"INFO"}, f"Restored {remove_atlas()} meshes")
+        return {"FINISHED"}
+
+@register_class
+class VIEW_PT_UmapMergeStatic(bpy.types.Operator):
+    """Merge the static meshes of the imported maps by spatial cell and material set"""
+
+    bl_idname = "umap.merge_static"
+    bl_label = "Merge Static Meshes"
+    bl_options = {"UNDO"}
+
+    def execute(self, context):
+        from .merge import merge_static_from_scene
+
+        report = merge_static_from_scene(context.scene)
+        self.report({"INFO"}, str(report))
+        return {"FINISHED"}
+
+@register_class
+class VIEW_PT_UmapSelectMergedSource(bpy.types.Operator):
+    """Select the faces of the actor the active face of a merged mesh came from"""
+
+    bl_idname = "umap.select_merged_source"
+    bl_label = "Select Source Actor"
+    bl_options = {"UNDO"}
+
+    @classmethod
+    def poll(cls, context):
+        ob = context.active_object
+        return context.mode == "EDIT_MESH" and ob is not None and "umap_merged_names" in ob
+
+    def execute(self, context):
+        from .merge import select_source
+
+        name = select_source(context.active_object)
+        if name is None:
+            self.report({"ERROR"}, "No active face")
+            return {"CANCELLED"}
+        self.report({"INFO"}, f"Source actor: {name}")
+        return {"FINISHED"}
+
+@persistent
+def realize_materials_on_render(scene, _depsgraph=None):
+    if not any("umap_material_info" in m for m in bpy.data.materials):
+        return  # nothing deferred, keep the importer unloaded
+
+    from .umap import realize_materials
+    from .images import set_texture_budget, texture_budget_from_scene, reset_image_registry
+
+    set_texture_budget(texture_budget_from_scene(scene))
+    reset_image_registry()
+    realized = realize_materials(m for m in bpy.data.materials if m.users > 0)
+    if realized > 0:
+        print(f"Realized {realized} deferred materials for rendering")
+
 @register_class
 class Fortnite(bpy.types.Operator):
     bl_idname = "umap.fillfortnitekeys"
@@ -447,6 +764,8 @@ class Fortnite(bpy.types.Operator):
         return True
 
     def execute(self, context):
+        from urllib.request import urlopen, Request
+
         headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 6.1) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/41.0.2228.0 Safari/537.3"
         }
@@ -521,6 +840,8 @@ class FortniteMappings(bpy.types.Operator):
         return True
 
     def dl_mappings(self, path):
+        from urllib.request import urlopen, Request
+
         ENDPOINT = "https://fortnitecentral.genxgames.gg/api/v1/mappings"
         headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/88.0.4324.150 Safari/537.36",
@@ -808,10 +1129,64 @@ def create_node_groups():
         # tex_shader.inputs[3].name = "Emission"
         # tex_shader.inputs[4].name = "Alpha"
 
+    # same as the texture shader, but packed textures come in already split into one image per channel
+    split_shader = bpy.data.node_groups.get("Texture Shader Split")
+
+    if not split_shader:
+        split_shader = bpy.data.node_groups.new(
+            name="Texture Shader Split", type="ShaderNodeTree"
+        )
+
+        g_in = split_shader.nodes.new("NodeGroupInput")
+        g_out = split_shader.nodes.new("NodeGroupOutput")
+        split_shader.outputs.new("NodeSocketShader", "Shader")
+        g_in.location = [-700, 0]
+        g_out.location = [350, 300]
+
+        principled_bsdf = split_shader.nodes.new(type="ShaderNodeBsdfPrincipled")
+        principled_bsdf.location = [50, 300]
+        split_shader.links.new(principled_bsdf.outputs[0], g_out.inputs[0])
+
+        # diffuse
+        split_shader.inputs.new("NodeSocketColor", "Diffuse")
+        split_shader.links.new(g_in.outputs[0], principled_bsdf.inputs["Base Color"])
+
+        # normal
+        norm_curve = split_shader.nodes.new("ShaderNodeRGBCurve")
+        norm_map = split_shader.nodes.new("ShaderNodeNormalMap")
+        norm_curve.location = [-500, -1]
+        norm_map.location = [-200, -1]
+        norm_curve.mapping.curves[1].points[0].location = [0, 1]
+        norm_curve.mapping.curves[1].points[1].location = [1, 0]
+
+        split_shader.inputs.new("NodeSocketColor", "Normal")
+        split_shader.links.new(g_in.outputs[1], norm_curve.inputs[1])
+        split_shader.links.new(norm_curve.outputs[0], norm_map.inputs[1])
+        split_shader.links.new(norm_map.outputs[0], principled_bsdf.inputs["Normal"])
+        split_shader.inputs[1].default_value = [0.5, 0.5, 1, 1]
+
+        # specular masks
+        for name, default in (("Specular", 0.5), ("Metallic", 0), ("Roughness", 0.5)):
+            split_shader.inputs.new("NodeSocketFloat", name)
+            split_shader.links.new(g_in.outputs[name], principled_bsdf.inputs[name])
+            split_shader.inputs[name].default_value = default
+
+        # emission
+        split_shader.inputs.new("NodeSocketColor", "Emission")
+        split_shader.links.new(g_in.outputs["Emission"], principled_bsdf.inputs["Emission"])
+        split_shader.inputs["Emission"].default_value = [0, 0, 0, 1]
+
+        # alpha
+        split_shader.inputs.new("NodeSocketFloat", "Alpha")
+        split_shader.links.new(g_in.outputs["Alpha"], principled_bsdf.inputs["Alpha"])
+        split_shader.inputs["Alpha"].default_value = 1
+
 def register():
     for cls in classes:
         bpy.utils.register_class(cls)
 
+    bpy.app.handlers.render_init.append(realize_materials_on_render)
+
     bpy.types.Scene.dpklist = CollectionProperty(type=ListItem)
     bpy.types.Scene.list_index = IntProperty(name="", default=0)
 
@@ -864,11 +1239,22 @@ def register():
 
     bpy.types.Scene.bExportToDDSWhenPossible = BoolProperty(
         name="Export DDS When Possible",
-        description="Export textures to .dds format",
+        description="Write DXT1/3/5 textures as they are to .dds instead of decoding them",
         default=False,
         subtype="NONE",
     )
 
+    bpy.types.Scene.texture_format = EnumProperty(
+        name="Texture Format",
+        description="File format of decoded textures",
+        items=(
+            ("PNG", "PNG", "Compressed PNG, smallest files"),
+            ("PNG_FAST", "PNG (Fast)", "PNG with the fastest compression, bigger files"),
+            ("TGA", "TGA", "Uncompressed TGA, fastest to write and to load"),
+        ),
+        default="PNG",
+    )
+
     bpy.types.Scene.bExportBuildingFoundations = BoolProperty(
         name="Export Building Foundations",
         description="You can turn off exporting sub-buildings in large POIs if you want to quickly port the base POI structures, by setting this to false",
@@ -897,6 +1283,21 @@ def register():
         min=0,
     )
 
+    bpy.types.Scene.ObjectCacheSizeMB = IntProperty(
+        name="Object Cache Size (MB)",
+        description="Limit the object loader cache by the size of the cached packages, or set to 0 to only limit the count",
+        default=0,
+        min=0,
+    )
+
+    bpy.types.Scene.export_lods = IntProperty(
+        name="Extra LODs",
+        description="Number of lower LODs to export next to LOD0 of every mesh",
+        default=0,
+        min=0,
+        max=7,
+    )
+
     bpy.types.Scene.reuse_maps = BoolProperty(
         name="Reuse Maps",
         description="Reuse already imported map rather then importing them again",
@@ -904,6 +1305,14 @@ def register():
         subtype="NONE",
     )
 
+    bpy.types.Scene.flatten_maps = BoolProperty(
+        name="Flatten Maps",
+        description="Import sub-levels into nested collections of the current scene with their transforms baked, "
+                    "instead of one scene and collection instance per map",
+        default=False,
+        subtype="NONE",
+    )
+
     bpy.types.Scene.reuse_mesh = BoolProperty(
         name="Reuse Meshes",
         description="Reuse already imported meshes rather then importing them again",
@@ -911,6 +1320,256 @@ def register():
         subtype="NONE",
     )
 
+    bpy.types.Scene.update_existing = BoolProperty(
+        name="Update Existing",
+        description="Only add, remove or update the actors that changed since the last import instead of importing the whole map again",
+        default=False,
+        subtype="NONE",
+    )
+
+    bpy.types.Scene.mesh_library_mode = EnumProperty(
+        name="Mesh Library",
+        description="Keep imported meshes in .blend files in the export folder and load them from there in later imports",
+        items=(
+            ("NONE", "Off", "Always import meshes from the psk files"),
+            ("LINK", "Link", "Link library meshes, they stay read-only and are shared with other files"),
+            ("APPEND", "Append", "Append library meshes as local, editable copies"),
+        ),
+        default="NONE",
+    )
+
+    bpy.types.Scene.region_mode = EnumProperty(
+        name="Region",
+        description="Only import the actors inside of this region",
+        items=(
+            ("NONE", "Everything", "Import the whole map"),
+            ("BOX", "Box", "Import actors inside of a box"),
+            ("SPHERE", "Radius", "Import actors within a radius around a point"),
+        ),
+        default="NONE",
+    )
+
+    bpy.types.Scene.region_units = EnumProperty(
+        name="Units",
+        description="Units of the region center and size",
+        items=(
+            ("UNREAL", "Unreal", "Unreal units (cm, game coordinates)"),
+            ("BLENDER", "Blender", "Blender units (m, scene coordinates)"),
+        ),
+        default="UNREAL",
+    )
+
+    bpy.types.Scene.region_center = FloatVectorProperty(
+        name="Center",
+        description="Center of the import region",
+        size=3,
+        default=(0, 0, 0),
+    )
+
+    bpy.types.Scene.region_extent = FloatVectorProperty(
+        name="Half Size",
+        description="Half size of the import box on each axis",
+        size=3,
+        default=(10000, 10000, 10000),
+        min=0,
+    )
+
+    bpy.types.Scene.region_radius = FloatProperty(
+        name="Radius",
+        description="Radius around the center to import",
+        default=10000,
+        min=0,
+    )
+
+    bpy.types.Scene.use_lods = BoolProperty(
+        name="Use LODs",
+        description="Import lower LODs for actors far away from the focus point",
+        default=False,
+        subtype="NONE",
+    )
+
+    bpy.types.Scene.lod_focus = FloatVectorProperty(
+        name="Focus Point",
+        description="Actors around this point are imported at full resolution",
+        size=3,
+        subtype="TRANSLATION",
+        default=(0, 0, 0),
+    )
+
+    bpy.types.Scene.lod_distance = FloatProperty(
+        name="LOD Distance",
+        description="Distance from the focus point after which the next LOD is used",
+        subtype="DISTANCE",
+        default=100,
+        min=0,
+    )
+
+    bpy.types.Scene.use_proxies = BoolProperty(
+        name="Import Proxies",
+        description="Import decimated proxies instead of the full meshes, they can be swapped back later",
+        default=False,
+        subtype="NONE",
+    )
+
+    bpy.types.Scene.proxy_resolution = IntProperty(
+        name="Proxy Resolution",
+        description="Number of vertex clusters along the longest side of each mesh",
+        default=16,
+        min=2,
+        max=256,
+    )
+
+    bpy.types.Scene.lazy_materials = BoolProperty(
+        name="Lazy Materials",
+        description="Only create placeholder materials on import, node trees and images are created when realized or before rendering",
+        default=False,
+        subtype="NONE",
+    )
+
+    bpy.types.Scene.split_packed_channels = BoolProperty(
+        name="Split Packed Channels",
+        description="Generic shader: split SpecularMasks and Mask textures into one image per channel instead of separating them in the node tree",
+        default=False,
+        subtype="NONE",
+    )
+
+    bpy.types.Scene.optimize_lights = BoolProperty(
+        name="Optimize After Import",
+        description="Cull and merge lights after importing",
+        default=False,
+        subtype="NONE",
+    )
+
+    bpy.types.Scene.light_min_energy = FloatProperty(
+        name="Min Energy",
+        description="Lights with less energy (W) are removed",
+        default=0.0,
+        min=0.0,
+    )
+
+    bpy.types.Scene.light_min_radius = FloatProperty(
+        name="Min Radius",
+        description="Lights whose attenuation radius is smaller than this are removed",
+        default=0.0,
+        min=0.0,
+        subtype="DISTANCE",
+    )
+
+    bpy.types.Scene.light_merge_distance = FloatProperty(
+        name="Merge Distance",
+        description="Point lights of the same color closer than this are merged into one stronger light, 0 to disable",
+        default=0.0,
+        min=0.0,
+        subtype="DISTANCE",
+    )
+
+    bpy.types.Scene.use_texture_budget = BoolProperty(
+        name="Use Texture Budget",
+        description="Downscale textures above the max size of their slot or once the memory cap is reached",
+        default=False,
+        subtype="NONE",
+    )
+
+    for slot in SLOTS:
+        setattr(bpy.types.Scene, f"max_size_{slot.lower()}", IntProperty(
+            name=f"Max {slot} Size",
+            description=f"Largest resolution of {slot.lower()} textures, bigger ones are downscaled (0 for no limit)",
+            default=2048 if slot in ("Diffuse", "Normal") else 1024,
+            min=0,
+        ))
+
+    bpy.types.Scene.texture_memory_cap = IntProperty(
+        name="Memory Cap (MB)",
+        description="Textures loaded after this much memory is used are downscaled further (0 for no limit)",
+        default=0,
+        min=0,
+    )
+
+    bpy.types.Scene.use_texture_atlas = BoolProperty(
+        name="Atlas After Import",
+        description="Pack small textures into shared atlas images after importing, materials whose UVs tile are left alone",
+        default=False,
+    )
+
+    bpy.types.Scene.atlas_max_size = IntProperty(
+        name="Max Texture Size",
+        description="Textures up to this size are packed into the atlas",
+        default=256,
+        min=16,
+        max=1024,
+    )
+
+    bpy.types.Scene.atlas_size = EnumProperty(
+        name="Atlas Size",
+        description="Size of the atlas pages",
+        items=[
+            ("1024", "1024", ""),
+            ("2048", "2048", ""),
+            ("4096", "4096", ""),
+        ],
+        default="2048",
+    )
+
+    bpy.types.Scene.merge_static = BoolProperty(
+        name="Merge After Import",
+        description="Merge the static meshes of the imported maps by spatial cell and material set after importing",
+        default=False,
+    )
+
+    bpy.types.Scene.merge_cell_size = FloatProperty(
+        name="Cell Size",
+        description="Static meshes in the same cell of this size with the same materials become one object",
+        default=50.0,
+        min=1.0,
+        subtype="DISTANCE",
+    )
+
+    bpy.types.Scene.merge_min_objects = IntProperty(
+        name="Min Objects",
+        description="Cells with fewer objects sharing a material set are left as they are",
+        default=2,
+        min=2,
+    )
+
+    bpy.types.Scene.use_memory_ceiling = BoolProperty(
+        name="Use Memory Ceiling",
+        description="Track the memory taken by imported meshes and images and degrade the rest of the import once the ceiling is reached",
+        default=False,
+    )
+
+    bpy.types.Scene.memory_ceiling = IntProperty(
+        name="Ceiling (MB)",
+        description="Meshes and images imported after this much memory is used are degraded, materials are deferred",
+        default=8192,
+        min=256,
+    )
+
+    bpy.types.Scene.memory_degrade_to = EnumProperty(
+        name="Degrade To",
+        description="What the meshes imported over the ceiling become",
+        items=[
+            ("PROXY", "Proxies", "Decimated proxy meshes, swappable to full resolution later"),
+            ("FALLBACK", "Fallback Mesh", "The fallback cube (or empty mesh)"),
+        ],
+        default="PROXY",
+    )
+
+    bpy.types.Scene.memory_proxy_resolution = IntProperty(
+        name="Proxy Resolution",
+        description="Grid cells along the longest side of the degraded proxy meshes",
+        default=16,
+        min=2,
+        max=256,
+    )
+
+    bpy.types.Scene.memory_image_size = IntProperty(
+        name="Degraded Image Size",
+        description="Images loaded over the ceiling are halved until they fit this size",
+        default=256,
+        min=16,
+        max=4096,
+    )
+
     bpy.types.Scene.use_cube_as_fallback = BoolProperty(
         name="Use Cube as Fallback Mesh",
         description="Use cube if mesh is not found",
@@ -953,6 +1612,9 @@ def unregister():
     for cls in classes:
         bpy.utils.unregister_class(cls)
 
+    if realize_materials_on_render in bpy.app.handlers.render_init:
+        bpy.app.handlers.render_init.remove(realize_materials_on_render)
+
     sc = bpy.types.Scene
     del sc.Game_Path
     del sc.aeskey
@@ -963,8 +1625,45 @@ def unregister():
     del sc.bExportHiddenObjects
     del sc.bdumpassets
     del sc.ObjectCacheSize
+    del sc.ObjectCacheSizeMB
+    del sc.texture_format
+    del sc.export_lods
     del sc.reuse_maps
+    del sc.flatten_maps
     del sc.reuse_mesh
+    del sc.update_existing
+    del sc.region_mode
+    del sc.region_units
+    del sc.region_center
+    del sc.region_extent
+    del sc.region_radius
+    del sc.use_lods
+    del sc.lod_focus
+    del sc.lod_distance
+    del sc.use_proxies
+    del sc.proxy_resolution
+    del sc.lazy_materials
+    del sc.mesh_library_mode
+    del sc.split_packed_channels
+    del sc.optimize_lights
+    del sc.light_min_energy
+    del sc.light_min_radius
+    del sc.light_merge_distance
+    del sc.use_texture_budget
+    for slot in SLOTS:
+        delattr(sc, f"max_size_{slot.lower()}")
+    del sc.texture_memory_cap
+    del sc.use_texture_atlas
+    del sc.atlas_max_size
+    del sc.atlas_size
+    del sc.merge_static
+    del sc.merge_cell_size
+    del sc.merge_min_objects
+    del sc.use_memory_ceiling
+    del sc.memory_ceiling
+    del sc.memory_degrade_to
+    del sc.memory_proxy_resolution
+    del sc.memory_image_size
     del sc.use_cube_as_fallback
     del sc.use_generic_shader
     del sc.use_generic_shader_as_fallback
@@ -0,0 +1,112 @@
+import os
+from typing import Dict, Optional, Set, Tuple
+
+import bpy
+
+from .images import read_image_size
+
+# approximate bytes Blender keeps per element of a built mesh
+BYTES_PER_VERTEX = 32  # position, normal, flags
+BYTES_PER_LOOP = 28  # vertex and edge index, custom normal
+BYTES_PER_LOOP_UV = 8  # per UV layer
+BYTES_PER_POLYGON = 40  # polygon and its share of the edges
+
+
+def estimate_mesh_bytes(num_vertices: int, num_loops: int, num_polygons: int, num_uv_layers: int = 1) -> int:
+    return (num_vertices * BYTES_PER_VERTEX + num_loops * (BYTES_PER_LOOP + num_uv_layers * BYTES_PER_LOOP_UV)
+            + num_polygons * BYTES_PER_POLYGON)
+
+
+def psk_mesh_bytes(psk_path: str) -> int:
+    """Memory the mesh of the psk will take, from the section headers without reading the geometry"""
+    from .psk.reader import read_psk_counts
+
+    counts = read_psk_counts(psk_path)
+    num_faces = counts.get(b"FACE0000", 0) or counts.get(b"FACE3200", 0)
+    num_uv_layers = 1 + sum(1 for name in counts if name.startswith(b"EXTRAUVS"))
+    return estimate_mesh_bytes(counts.get(b"PNTS0000", 0), num_faces * 3, num_faces, num_uv_layers)
+
+
+def mesh_bytes(mesh: bpy.types.Mesh) -> int:
+    return estimate_mesh_bytes(len(mesh.vertices), len(mesh.loops), len(mesh.polygons), len(mesh.uv_layers))
+
+
+def image_bytes(img: bpy.types.Image) -> int:
+    """Size of the 8 bit RGBA buffer of the image, from the file header when possible so it is not decoded"""
+    path = bpy.path.abspath(img.filepath)
+    size = read_image_size(path) if os.path.exists(path) else None
+    width, height = size or tuple(img.size)
+    return width * height * 4
+
+
+class MemoryBudget:
+    """
+    Running total of the memory taken by imported meshes and images. Once the ceiling is reached,
+    the remaining meshes are imported as proxies (or replaced by the fallback mesh), the remaining
+    images are loaded at most image_size large and the remaining materials are deferred, so the
+    import finishes instead of running out of memory.
+    """
+
+    def __init__(self, ceiling_mb: int, degrade_to: str = "PROXY", proxy_resolution: int = 16,
+                 image_size: int = 256) -> None:
+        self.ceiling = ceiling_mb * 1024 * 1024
+        self.degrade_to = degrade_to
+        self.proxy_resolution = proxy_resolution
+        self.image_size = image_size
+        self.mesh_bytes = 0
+        self.image_bytes = 0
+        self.degraded: Dict[str, Set[str]] = {}
+
+    @property
+    def used_bytes(self) -> int:
+        return self.mesh_bytes + self.image_bytes
+
+    @property
+    def exceeded(self) -> bool:
+        return self.used_bytes >= self.ceiling
+
+    def check_mesh(self, psk_path: str, is_proxy: bool) -> Optional[str]:
+        """None if the mesh fits, otherwise what to import instead: "PROXY" or "FALLBACK" """
+        if not os.path.exists(psk_path) or self.used_bytes + psk_mesh_bytes(psk_path) <= self.ceiling:
+            return None
+        return "FALLBACK" if is_proxy else self.degrade_to
+
+    def check_image(self, size: Optional[Tuple[int, int]]) -> Optional[Tuple[int, int]]:
+        """None if the image can be loaded as it is, otherwise the smaller size to load it at"""
+        if not self.exceeded or size is None:
+            return None
+        width, height = size
+        while max(width, height) > self.image_size and min(width, height) > 1:
+            width, height = width // 2, height // 2
+        return (width, height) if (width, height) != tuple(size) else None
+
+    def add_mesh(self, mesh: bpy.types.Mesh):
+        self.mesh_bytes += mesh_bytes(mesh)
+
+    def add_image(self, img: bpy.types.Image):
+        self.image_bytes += image_bytes(img)
+
+    def degrade(self, what: str, name: str):
+        self.degraded.setdefault(what, set()).add(name)
+
+    def report(self) -> str:
+        mb = 1024 * 1024
+        result = (f"{self.used_bytes / mb:.1f} of {self.ceiling / mb:.0f} MB "
+                  f"(meshes {self.mesh_bytes / mb:.1f} MB, images {self.image_bytes / mb:.1f} MB)")
+        for what, names in self.degraded.items():
+            result += f", {len(names)} {what}"
+        return result
+
+
+memory_budget: Optional[MemoryBudget] = None
+
+
+def set_memory_budget(budget: Optional[MemoryBudget]):
+    global memory_budget
+    memory_budget = budget
+
+
+def memory_budget_from_scene(sc: bpy.types.Scene) -> Optional[MemoryBudget]:
+    if not sc.use_memory_ceiling:
+        return None
+    return MemoryBudget(sc.memory_ceiling, sc.memory_degrade_to, sc.memory_proxy_resolution, sc.memory_image_size)
@@ -0,0 +1,213 @@
+from typing import Dict, List, Optional, Set, Tuple
+
+import bmesh
+import bpy
+import numpy as np
+
+
+class MergeReport:
+    def __init__(self) -> None:
+        self.num_objects = 0
+        self.num_merged = 0
+        self.num_meshes = 0
+
+    def __str__(self) -> str:
+        return (f"{self.num_objects} static objects: {self.num_merged} merged into {self.num_meshes} meshes, "
+                f"{self.num_objects - self.num_merged + self.num_meshes} left")
+
+
+def imported_map_collections() -> List[bpy.types.Collection]:
+    return [c for c in bpy.data.collections if "umap_source_hash" in c]
+
+
+def is_static(ob: bpy.types.Object) -> bool:
+    """Plain placed mesh: no parent (instanced components have one), children (lights), modifiers or shape keys"""
+    return (ob.type == "MESH" and ob.parent is None and len(ob.children) == 0 and len(ob.modifiers) == 0
+            and ob.data.shape_keys is None and len(ob.data.polygons) > 0)
+
+
+def mesh_arrays(ob: bpy.types.Object, num_uv_layers: int, color_names: List[str]) -> Dict[str, np.ndarray]:
+    """Geometry of the object's mesh transformed into its collection's space, missing color layers are white"""
+    mesh = ob.data
+    num_loops = len(mesh.loops)
+    num_polygons = len(mesh.polygons)
+
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
+    matrix = np.array(ob.matrix_basis, dtype=np.float32)
+    co = co.reshape(-1, 3) @ matrix[:3, :3].T + matrix[:3, 3]
+
+    loop_verts = np.empty(num_loops, dtype=np.int32)
+    mesh.loops.foreach_get("vertex_index", loop_verts)
+    loop_starts = np.empty(num_polygons, dtype=np.int32)
+    mesh.polygons.foreach_get("loop_start", loop_starts)
+    loop_totals = np.empty(num_polygons, dtype=np.int32)
+    mesh.polygons.foreach_get("loop_total", loop_totals)
+    material_indices = np.empty(num_polygons, dtype=np.int32)
+    mesh.polygons.foreach_get("material_index", material_indices)
+    smooth = np.empty(num_polygons, dtype=bool)
+    mesh.polygons.foreach_get("use_smooth", smooth)
+
+    uvs = []
+    for layer in mesh.uv_layers[:num_uv_layers]:
+        uv = np.empty(num_loops * 2, dtype=np.float32)
+        layer.data.foreach_get("uv", uv)
+        uvs.append(uv.reshape(-1, 2))
+
+    colors = []
+    for color_name in color_names:
+        color = np.ones(num_loops * 4, dtype=np.float32)
+        layer = mesh.vertex_colors.get(color_name)
+        if layer:
+            layer.data.foreach_get("color", color)
+        colors.append(color.reshape(-1, 4))
+
+    # split normals include the custom ones, they are moved with the inverse transpose so scaling keeps them right
+    mesh.calc_normals_split()
+    normals = np.empty(num_loops * 3, dtype=np.float32)
+    mesh.loops.foreach_get("normal", normals)
+    normals = normals.reshape(-1, 3) @ np.linalg.pinv(matrix[:3, :3])
+    normals /= np.maximum(np.linalg.norm(normals, axis=1, keepdims=True), 1e-8)
+
+    # mirrored placement flips the faces, reverse the loops of every polygon to keep them facing out
+    if np.linalg.det(matrix[:3, :3]) < 0:
+        polygon_of_loop = np.repeat(np.arange(num_polygons), loop_totals)
+        order = (2 * loop_starts[polygon_of_loop] + loop_totals[polygon_of_loop] - 1 - np.arange(num_loops))
+        loop_verts = loop_verts[order]
+        uvs = [uv[order] for uv in uvs]
+        colors = [color[order] for color in colors]
+        normals = normals[order]
+
+    return {"co": co, "loop_verts": loop_verts, "loop_starts": loop_starts, "loop_totals": loop_totals,
+            "material_indices": material_indices, "smooth": smooth, "uvs": uvs, "colors": colors, "normals": normals}
+
+
+def merge_objects(obs: List[bpy.types.Object], name: str, collection: bpy.types.Collection) -> bpy.types.Object:
+    """
+    One object with the geometry of all obs, which share their materials. The face attribute
+    umap_source_index and the umap_merged_names property map every face back to its actor, the
+    umap_merged_guids and umap_merged_hashes properties let Update Existing diff the actors.
+    """
+    num_uv_layers = min(len(ob.data.uv_layers) for ob in obs)
+    color_names = sorted({layer.name for ob in obs for layer in ob.data.vertex_colors})
+    parts = [mesh_arrays(ob, num_uv_layers, color_names) for ob in obs]
+
+    vertex_offsets = np.cumsum([0] + [len(p["co"]) for p in parts])[:-1]
+    loop_offsets = np.cumsum([0] + [len(p["loop_verts"]) for p in parts])[:-1]
+    co = np.concatenate([p["co"] for p in parts])
+    loop_verts = np.concatenate([p["loop_verts"] + offset for p, offset in zip(parts, vertex_offsets)])
+    loop_starts = np.concatenate([p["loop_starts"] + offset for p, offset in zip(parts, loop_offsets)])
+    loop_totals = np.concatenate([p["loop_totals"] for p in parts])
+    source_indices = np.concatenate([np.full(len(p["loop_totals"]), i, dtype=np.int32) for i, p in enumerate(parts)])
+
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(len(co))
+    mesh.vertices.foreach_set("co", co.ravel())
+    mesh.loops.add(len(loop_verts))
+    mesh.loops.foreach_set("vertex_index", loop_verts)
+    mesh.polygons.add(len(loop_starts))
+    mesh.polygons.foreach_set("loop_start", loop_starts)
+    mesh.polygons.foreach_set("loop_total", loop_totals)
+    mesh.polygons.foreach_set("material_index", np.concatenate([p["material_indices"] for p in parts]))
+    mesh.polygons.foreach_set("use_smooth", np.concatenate([p["smooth"] for p in parts]))
+    for i, layer_name in enumerate(layer.name for layer in obs[0].data.uv_layers[:num_uv_layers]):
+        mesh.uv_layers.new(name=layer_name).data.foreach_set("uv", np.concatenate([p["uvs"][i] for p in parts]).ravel())
+    for i, color_name in enumerate(color_names):
+        mesh.vertex_colors.new(name=color_name).data.foreach_set("color", np.concatenate([p["colors"][i] for p in parts]).ravel())
+    mesh.attributes.new("umap_source_index", "INT", "FACE").data.foreach_set("value", source_indices)
+    for material in obs[0].data.materials:
+        mesh.materials.append(material)
+    mesh.update(calc_edges=True)
+    mesh.use_auto_smooth = True
+    mesh.normals_split_custom_set(np.concatenate([p["normals"] for p in parts]))
+
+    merged = bpy.data.objects.new(name, mesh)
+    merged["umap_merged_names"] = [ob.name for ob in obs]
+    merged["umap_merged_guids"] = [ob.get("umap_guid", "") for ob in obs]
+    merged["umap_merged_hashes"] = [source_hash(ob) for ob in obs]
+    collection.objects.link(merged)
+    return merged
+
+
+def merge_static(collections: List[bpy.types.Collection], cell_size: float, min_objects: int = 2) -> MergeReport:
+    """
+    Merges the static meshes of every collection by spatial cell and material set, so thousands
+    of small props become a few objects. Update Existing keeps merged actors that did not change and
+    removes the faces of the ones that changed or were removed from their merged object.
+    """
+    report = MergeReport()
+    for collection in collections:
+        groups: Dict[Tuple, List[bpy.types.Object]] = {}
+        for ob in collection.objects:
+            if not is_static(ob):
+                continue
+            report.num_objects += 1
+            p = ob.matrix_basis.translation
+            cell = (int(p.x // cell_size), int(p.y // cell_size), int(p.z // cell_size))
+            materials = tuple(m.name if m else "" for m in ob.data.materials)
+            groups.setdefault((cell, materials), []).append(ob)
+
+        for (cell, _), obs in groups.items():
+            if len(obs) < min_objects:
+                continue
+            merge_objects(obs, f"{collection.name}_merged_{cell[0]}_{cell[1]}_{cell[2]}", collection)
+            for ob in obs:
+                bpy.data.objects.remove(ob)
+            report.num_merged += len(obs)
+            report.num_meshes += 1
+    return report
+
+
+def source_hash(ob: bpy.types.Object) -> str:
+    """Content and transform hash of an imported actor, as compared by Update Existing"""
+    return f"{ob.get('umap_hash', '')}:{ob.get('umap_transform_hash', '')}"
+
+
+def source_name(ob: bpy.types.Object, polygon_index: int) -> str:
+    """Name of the actor the face of a merged object came from"""
+    index = ob.data.attributes["umap_source_index"].data[polygon_index].value
+    return ob["umap_merged_names"][index]
+
+
+def select_source(ob: bpy.types.Object) -> Optional[str]:
+    """In edit mode, selects the faces of the actor the active face came from and returns its name"""
+    bm = bmesh.from_edit_mesh(ob.data)
+    layer = bm.faces.layers.int.get("umap_source_index")
+    active = bm.faces.active
+    if layer is None or active is None:
+        return None
+
+    index = active[layer]
+    for face in bm.faces:
+        face.select_set(False)
+    for face in bm.faces:
+        if face[layer] == index:
+            face.select_set(True)
+    bm.select_flush_mode()
+    bmesh.update_edit_mesh(ob.data)
+    return ob["umap_merged_names"][index]
+
+
+def remove_sources(ob: bpy.types.Object, source_indices: Set[int]):
+    """Deletes the faces of the actors from the merged object, and the object once none are left"""
+    mesh = ob.data
+    bm = bmesh.new()
+    bm.from_mesh(mesh)
+    layer = bm.faces.layers.int["umap_source_index"]
+    bmesh.ops.delete(bm, geom=[face for face in bm.faces if face[layer] in source_indices], context="FACES")
+    if len(bm.faces) == 0:
+        bm.free()
+        bpy.data.objects.remove(ob)
+        bpy.data.meshes.remove(mesh)
+        return
+
+    bm.to_mesh(mesh)
+    bm.free()
+    guids = list(ob["umap_merged_guids"])
+    for i in source_indices:
+        guids[i] = ""
+    ob["umap_merged_guids"] = guids
+
+
+def merge_static_from_scene(sc: bpy.types.Scene) -> MergeReport:
+    return merge_static(imported_map_collections(), sc.merge_cell_size, sc.merge_min_objects)
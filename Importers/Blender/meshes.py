@@ -0,0 +1,59 @@
+from typing import Dict, Optional
+
+import bpy
+
+
+class MeshRegistry:
+    """
+    Built meshes by mesh key for a whole import session, shared by every map, child map and instanced
+    component. Meshes are tagged with their key, so a long key cut short by Blender's name limit or
+    a renamed mesh is still found.
+    """
+
+    def __init__(self) -> None:
+        self.by_key: Dict[str, bpy.types.Mesh] = {}
+        self.num_reused = 0
+        self.num_built = 0
+        self.num_from_library = 0
+        for mesh in bpy.data.meshes:
+            self.by_key[mesh.get("umap_mesh_key", mesh.name)] = mesh
+
+    def find(self, key: str) -> Optional[bpy.types.Mesh]:
+        mesh = self.by_key.get(key)
+        if mesh:
+            self.num_reused += 1
+        return mesh
+
+    def add(self, key: str, mesh: bpy.types.Mesh):
+        self._register(key, mesh)
+        self.num_built += 1
+
+    def add_from_library(self, key: str, mesh: bpy.types.Mesh):
+        """A mesh linked or appended from the mesh library, which is not counted as built"""
+        self._register(key, mesh)
+        self.num_from_library += 1
+
+    def _register(self, key: str, mesh: bpy.types.Mesh):
+        if not mesh.library:  # linked meshes are read-only
+            mesh["umap_mesh_key"] = key
+        self.by_key[key] = mesh
+
+    def report(self) -> str:
+        return (f"{self.num_built} meshes built, {self.num_from_library} loaded from the mesh library, "
+                f"{self.num_reused} imports avoided by reusing them")
+
+
+mesh_registry: Optional[MeshRegistry] = None
+
+
+def get_mesh_registry() -> MeshRegistry:
+    global mesh_registry
+    if mesh_registry is None:
+        mesh_registry = MeshRegistry()
+    return mesh_registry
+
+
+def reset_mesh_registry():
+    """Must be called after meshes were removed, the registry would still point to them"""
+    global mesh_registry
+    mesh_registry = None
@@ -0,0 +1,97 @@
+import copy
+from typing import Optional
+
+import bpy
+from mathutils import Matrix
+
+from .texture import TextureMapping, textures_to_mapping
+from .region import Region, region_from_scene
+from .lod import LodSelector, lod_selector_from_scene
+
+
+class ImportOptions:
+    """Everything import_umap needs besides the map itself"""
+    reuse_maps: bool
+    reuse_meshes: bool
+    use_cube_as_fallback: bool
+    use_generic_shader: bool
+    use_generic_shader_as_fallback: bool
+    texture_mappings: TextureMapping
+    update_existing: bool
+    region: Optional[Region]
+    lods: Optional[LodSelector]
+    proxy_resolution: int
+    lazy_materials: bool
+    split_channels: bool
+    flatten: bool
+    matrix: Matrix
+
+    def __init__(self, reuse_maps: bool = True, reuse_meshes: bool = True, use_cube_as_fallback: bool = True,
+                 use_generic_shader: bool = True, use_generic_shader_as_fallback: bool = False,
+                 texture_mappings: Optional[TextureMapping] = None, update_existing: bool = False,
+                 region: Optional[Region] = None, lods: Optional[LodSelector] = None, proxy_resolution: int = 0,
+                 lazy_materials: bool = False, split_channels: bool = False, flatten: bool = False,
+                 matrix: Optional[Matrix] = None) -> None:
+        self.reuse_maps = reuse_maps
+        self.reuse_meshes = reuse_meshes
+        self.use_cube_as_fallback = use_cube_as_fallback
+        self.use_generic_shader = use_generic_shader
+        self.use_generic_shader_as_fallback = use_generic_shader_as_fallback
+        self.texture_mappings = texture_mappings or TextureMapping()
+        self.update_existing = update_existing
+        self.region = region
+        self.lods = lods
+        self.proxy_resolution = proxy_resolution
+        self.lazy_materials = lazy_materials
+        self.split_channels = split_channels
+        self.flatten = flatten
+        self.matrix = matrix or Matrix.Identity(4)  # placement of the map in the scene, baked into flattened maps
+
+    @property
+    def tex_shader(self) -> Optional[bpy.types.NodeTree]:
+        if not self.use_generic_shader and not self.use_generic_shader_as_fallback:
+            return None
+        return bpy.data.node_groups.get("Texture Shader")
+
+    def to_local(self, matrix: Matrix) -> "ImportOptions":
+        """Options for a child map placed with matrix"""
+        local = copy.copy(self)
+        local.region = self.region.to_local(matrix) if self.region else None
+        local.lods = self.lods.to_local(matrix) if self.lods else None
+        local.matrix = self.matrix @ matrix
+        return local
+
+    @classmethod
+    def from_scene(cls, sc: bpy.types.Scene) -> "ImportOptions":
+        return cls(
+            reuse_maps=sc.reuse_maps,
+            reuse_meshes=sc.reuse_mesh,
+            use_cube_as_fallback=sc.use_cube_as_fallback,
+            use_generic_shader=sc.use_generic_shader,
+            use_generic_shader_as_fallback=sc.use_generic_shader_as_fallback,
+            texture_mappings=textures_to_mapping(sc),
+            update_existing=sc.update_existing,
+            region=region_from_scene(sc),
+            lods=lod_selector_from_scene(sc),
+            proxy_resolution=sc.proxy_resolution if sc.use_proxies else 0,
+            lazy_materials=sc.lazy_materials,
+            split_channels=sc.split_packed_channels,
+            flatten=sc.flatten_maps,
+        )
+
+    @classmethod
+    def from_dict(cls, d: dict, texture_mappings: Optional[TextureMapping] = None) -> "ImportOptions":
+        """
+        Options from JSON, keys are the constructor arguments. Region and lods are given in Blender units:
+        {"region": {"center": [x, y, z], "extent": [x, y, z]}} or {"region": {"center": [...], "radius": r}},
+        {"lods": {"focus": [x, y, z], "distance": d, "max_lod": n}}
+        """
+        d = dict(d)
+        region = d.pop("region", None)
+        lods = d.pop("lods", None)
+        return cls(
+            texture_mappings=texture_mappings,
+            region=Region(region["center"], region.get("extent"), region.get("radius")) if region else None,
+            lods=LodSelector(lods["focus"], lods["distance"], lods["max_lod"]) if lods else None,
+            **d
+        )
@@ -3,13 +3,7 @@ from mathutils import Vector, Quaternion
 from math import cos, pi, radians, degrees, atan2, asin
 import mathutils
 
-def get_rgb_255(pv: dict) -> tuple:
-    return (
-        srgb2lin(pv["R"] / 255),
-        srgb2lin(pv["G"] / 255),
-        srgb2lin(pv["B"] / 255),
-        srgb2lin(pv["A"] / 255)
-    )
+from .colors import get_rgb_255, get_rgb_255_batch
 
 def get_light_type(object):
     if "Point" in object["Type"]:
@@ -100,92 +94,129 @@ def set_properties(byo: bpy.types.Object, object: dict, is_instanced: bool = Fal
             ]
 
 
-def create_light(object_data, lights_collection):
-    object_data['Properties']['RelativeRotation'] = object_data['RelativeRotation']
-
-    # Set variables
-    light_type = get_light_type(object_data)
-    light_name = object_data["Outer"]
-    light_props = object_data["Properties"]
+def resolve_light_settings(light_type: str, light_props: dict, color: tuple = None) -> tuple:
+    """Every datablock setting a light ends up with, lights with equal settings share one datablock"""
+    light_intensity = light_props.get("Intensity", 0)
+    candelas = "IntensityUnits" in light_props
+    cone_angle = light_props.get("OuterConeAngle", 44 if light_type == "SPOT" else 90)
+    inner_cone_angle = light_props.get("InnerConeAngle", 0)
 
-    light_intensity = 0
+    energy = None
     if "Intensity" in light_props:
-        light_intensity = light_props["Intensity"]
-    light_unit = "UNITLESS"
-    if "IntensityUnits" in light_props:
-        light_unit = "CANDELAS"
-    cone_angle = 44 if light_type == "SPOT" else 90
-    inner_cone_angle = 0
-    if "OuterConeAngle" in light_props:
-        cone_angle = light_props["OuterConeAngle"]
-    if "InnerConeAngle" in light_props:
-        inner_cone_angle = light_props["InnerConeAngle"]
-
-
-    light_data = bpy.data.lights.new(name=light_name, type=light_type)
-    light_object = bpy.data.objects.new(name=light_name, object_data=light_data)
-    lights_collection.objects.link(light_object)
-
-    light_object.data.use_custom_distance = True
-    light_object.data.cutoff_distance = 1000 * 0.01 # default value
-
+        if candelas:
+            energy = light_intensity * 683 / (4 * pi)
+        elif light_type == "AREA":
+            energy = (light_intensity*199)/683
+        else:
+            energy = (99.5*(1-cos(cone_angle/2)))*light_intensity
+
+    if color is None and "LightColor" in light_props:
+        color = get_rgb_255(light_props["LightColor"])[:-1]
+    soft_size = light_props["SourceRadius"] * 0.01 if "SourceRadius" in light_props else None
+    cast_shadows = light_props.get("CastShadows")
+    cutoff_distance = light_props.get("AttenuationRadius", 1000) * 0.01
+
+    spot = None
     if light_type == "SPOT":
-        light_object.data.spot_size = radians(cone_angle)
-        light_object.data.spot_blend = 1.0 - (radians(inner_cone_angle) / radians(cone_angle))
-
-
-    for prop_name, prop_value in light_props.items():
-        if "Intensity" == prop_name:
-            if light_type == "POINT":
-                if light_unit == "CANDELAS":
-                    light_object.data.energy = (light_intensity * 683 / (4 * pi))
-                else:
-                    light_object.data.energy = ((99.5*(1-cos(cone_angle/2)))*light_intensity)
-            if light_type == "AREA":
-                if light_unit == "CANDELAS":
-                    light_object.data.energy = (light_intensity * 683 / (4 * pi))
-                else:
-                    light_object.data.energy = (light_intensity*199)/683
-            if light_type == "SPOT":
-                if light_unit == "CANDELAS":
-                    light_object.data.energy = (light_intensity * 683 / (4 * pi))
-                else:
-                    light_object.data.energy = ((99.5*(1-cos(cone_angle/2)))*light_intensity)
-
-        if "LightColor" == prop_name:
-            light_object.data.color = get_rgb_255(prop_value)[:-1]
-        if "SourceRadius" == prop_name:
-            # if light_type == "SPOT":
-            #     light_object.data.shadow_soft_size = prop_value / 0.01
-            # else:
-            light_object.data.shadow_soft_size = prop_value * 0.01
-        if "CastShadows" == prop_name:
-            light_object.data.use_shadow = prop_value
-            if hasattr(light_object.data, "cycles"):
-                light_object.data.cycles.cast_shadow = prop_value
-
-        if "AttenuationRadius" == prop_name:
-            light_object.data.use_custom_distance = True
-            light_object.data.cutoff_distance = prop_value * 0.01
-
-        if light_type == "AREA":
-            light_object.data.shape = 'RECTANGLE'
-            if "SourceWidth" == prop_name:
-                light_object.data.size = prop_value * 0.01
-            if "SourceHeight" == prop_name:
-                light_object.data.size_y = prop_value * 0.01
-
-    set_properties(byo=light_object, object=light_props)
-
-    return light_object
-
-def srgb2lin(s):
-    if s <= 0.0404482362771082:
-        lin = s / 12.92
-    else:
-        lin = pow(((s + 0.055) / 1.055), 2.4)
-    return lin
+        spot = (radians(cone_angle), 1.0 - (radians(inner_cone_angle) / radians(cone_angle)))
+
+    area = None
+    if light_type == "AREA" and len(light_props) > 0:
+        area = (
+            light_props["SourceWidth"] * 0.01 if "SourceWidth" in light_props else None,
+            light_props["SourceHeight"] * 0.01 if "SourceHeight" in light_props else None
+        )
+
+    return light_type, energy, color, soft_size, cast_shadows, cutoff_distance, spot, area
+
+
+light_data_cache = None
+
+
+def reset_light_cache():
+    """Must be called after lights were removed, the cache would still point to them"""
+    global light_data_cache
+    light_data_cache = None
+
+
+def get_light_data(name: str, settings: tuple) -> bpy.types.Light:
+    global light_data_cache
+    if light_data_cache is None:
+        light_data_cache = {light["umap_light_key"]: light for light in bpy.data.lights if "umap_light_key" in light}
+
+    key = repr(settings)
+    light_data = light_data_cache.get(key)
+    if light_data:
+        return light_data
+
+    light_type, energy, color, soft_size, cast_shadows, cutoff_distance, spot, area = settings
+    light_data = bpy.data.lights.new(name=name, type=light_type)
+    light_data.use_custom_distance = True
+    light_data.cutoff_distance = cutoff_distance
+
+    if spot:
+        light_data.spot_size, light_data.spot_blend = spot
+    if energy is not None:
+        light_data.energy = energy
+    if color is not None:
+        light_data.color = color
+    if soft_size is not None:
+        light_data.shadow_soft_size = soft_size
+    if cast_shadows is not None:
+        light_data.use_shadow = cast_shadows
+        if hasattr(light_data, "cycles"):
+            light_data.cycles.cast_shadow = cast_shadows
+    if area:
+        light_data.shape = 'RECTANGLE'
+        if area[0] is not None:
+            light_data.size = area[0]
+        if area[1] is not None:
+            light_data.size_y = area[1]
+
+    light_data["umap_light_key"] = key
+    light_data_cache[key] = light_data
+    return light_data
+
+
+def map_light_colors(lights: list) -> list:
+    """Linear colors of every light of every light entry of a map, converted in one batch"""
+    colors = iter(get_rgb_255_batch(object_data["Properties"].get("LightColor")
+                                     for entry in lights for object_data in entry["Props"]))
+    return [[next(colors) for _ in entry["Props"]] for entry in lights]
+
+
+def resolve_lights(lights_props: list, colors: list) -> list:
+    """
+    Name, light datablock and transform of every light of a light entry, resolved once so
+    every placement of the same entry only creates the objects. colors are the entry's from map_light_colors.
+    """
+    resolved = []
+    for object_data, color in zip(lights_props, colors):
+        light_type = get_light_type(object_data)
+        light_props = object_data["Properties"]
+        settings = resolve_light_settings(light_type, light_props, color[:-1] if color else None)
+        light_data = get_light_data(object_data["Outer"], settings)
+
+        resolved.append((object_data["Outer"], light_data, light_matrix(light_props, object_data["RelativeRotation"])))
+    return resolved
+
+
+def light_matrix(light_props: dict, rotation: dict) -> mathutils.Matrix:
+    """Same transform set_properties gives a light object"""
+    location = light_props.get("RelativeLocation", {"X": 0, "Y": 0, "Z": 0})
+    scale = light_props.get("RelativeScale3D", {"X": 1, "Y": 1, "Z": 1})
+    return mathutils.Matrix.LocRotScale(
+        Vector((location["X"] * 0.01, location["Y"] * -0.01, location["Z"] * 0.01)),
+        game_to_blender_rotations(rotation["Roll"], rotation["Pitch"], rotation["Yaw"]),
+        Vector((scale["X"], scale["Y"], scale["Z"]))
+    )
+
 
-def hex_to_rgb(hex_): # ARGB
-    hex_ = "ff" + hex_ if len(hex_) == 6 else hex_
-    return tuple(int(hex_[i:i+2], 16)/255 for i in (2, 4, 6, 0))
+def create_lights(resolved_lights: list, lights_collection) -> list:
+    light_objects = []
+    for light_name, light_data, matrix in resolved_lights:
+        light_object = bpy.data.objects.new(name=light_name, object_data=light_data)
+        light_object.matrix_basis = matrix
+        lights_collection.objects.link(light_object)
+        light_objects.append(light_object)
+    return light_objects
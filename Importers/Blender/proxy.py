@@ -0,0 +1,132 @@
+import os
+from typing import Callable, Dict, Iterable, Optional
+
+import bpy
+import numpy as np
+
+from .images import atomic_path
+from .meshes import get_mesh_registry
+
+
+def cluster_decimate(points: np.ndarray, tri_points: np.ndarray, resolution: int):
+    """
+    Vertex clustering: points are snapped to a grid with `resolution` cells along the longest side
+    and every cell collapses into the mean of its points. Returns the vertices, the triangles that
+    survived the collapse and the mask of those triangles in tri_points.
+    """
+    bmin = points.min(axis=0)
+    cell_size = max(float((points.max(axis=0) - bmin).max()) / resolution, 1e-6)
+    coords = np.floor((points - bmin) / cell_size).astype(np.int64)
+    dims = coords.max(axis=0) + 1
+    cell_ids = (coords[:, 0] * dims[1] + coords[:, 1]) * dims[2] + coords[:, 2]
+    _, point_cluster = np.unique(cell_ids, return_inverse=True)
+
+    counts = np.bincount(point_cluster)
+    verts = np.stack([np.bincount(point_cluster, weights=points[:, k]) for k in range(3)], axis=1) / counts[:, None]
+
+    tris = point_cluster[tri_points]
+    keep = (tris[:, 0] != tris[:, 1]) & (tris[:, 1] != tris[:, 2]) & (tris[:, 0] != tris[:, 2])
+
+    # drop clusters only used by collapsed triangles
+    used, tris = np.unique(tris[keep], return_inverse=True)
+    return verts[used].astype(np.float32), tris.reshape(-1, 3), keep
+
+
+def build_proxy(full_mesh_path: str, resolution: int) -> Dict[str, np.ndarray]:
+    from .psk.reader import read_psk_arrays
+
+    psk = read_psk_arrays(full_mesh_path)
+    points = np.stack([psk["points"]["x"], psk["points"]["y"], psk["points"]["z"]], axis=1) * 0.01
+    wedges = psk["wedges"]
+    faces = psk["faces"]
+    if len(faces) == 0:
+        raise ValueError(f"{full_mesh_path} has no faces")
+    face_wedges = faces["wedge_indices"][:, ::-1]  # same winding as the psk importer
+
+    verts, tris, keep = cluster_decimate(points, wedges["point_index"].astype(np.int64)[face_wedges], resolution)
+    uvs = np.stack([wedges["u"], 1.0 - wedges["v"]], axis=-1)[face_wedges]
+    return {
+        "verts": verts,
+        "tris": tris.astype(np.int32),
+        "uvs": uvs[keep].astype(np.float32),
+        "material_indices": faces["material_index"][keep].astype(np.int32),
+        "material_names": np.array([m.decode("utf-8") for m in psk["materials"]["name"]]),
+    }
+
+
+def load_proxy(full_mesh_path: str, resolution: int) -> Dict[str, np.ndarray]:
+    """Decimated geometry of the mesh, cached next to it as .proxy<resolution>.npz"""
+    cache_path = f"{full_mesh_path}.proxy{resolution}.npz"
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(full_mesh_path):
+        with np.load(cache_path) as cached:
+            return dict(cached)
+
+    proxy = build_proxy(full_mesh_path, resolution)
+    with atomic_path(cache_path) as tmp_path, open(tmp_path, "wb") as f:
+        np.savez(f, **proxy)
+    return proxy
+
+
+def import_proxy(full_mesh_path: str, context: bpy.types.Context, resolution: int) -> Optional[bpy.types.Object]:
+    """Works like the psk importers: links the new object to the active collection and makes it active"""
+    if not os.path.exists(full_mesh_path):
+        return None
+    try:
+        proxy = load_proxy(full_mesh_path, resolution)
+    except Exception as e:
+        print(f"[Proxy] Failed to build proxy of {full_mesh_path}: {e}")
+        return None
+
+    name = os.path.splitext(os.path.basename(full_mesh_path))[0]
+    mesh = bpy.data.meshes.new(name + ".md")
+    mesh.from_pydata(proxy["verts"].tolist(), [], proxy["tris"].tolist())
+    mesh.polygons.foreach_set("material_index", proxy["material_indices"])
+    mesh.uv_layers.new(name="UV_SINGLE").data.foreach_set("uv", proxy["uvs"].ravel())
+    # placeholders shared by every proxy, import_material replaces them with the real materials
+    for material_name in proxy["material_names"]:
+        material_name = str(material_name)
+        mesh.materials.append(bpy.data.materials.get(material_name) or bpy.data.materials.new(material_name))
+    mesh.update()
+
+    mesh["umap_full_mesh"] = full_mesh_path
+    ob = bpy.data.objects.new(name + ".mo", mesh)
+    context.collection.objects.link(ob)
+
+    if bpy.ops.object.select_all.poll(): bpy.ops.object.select_all(action='DESELECT')
+    ob.select_set(True)
+    context.view_layer.objects.active = ob
+
+    print(f"[Proxy] {full_mesh_path}: {len(proxy['tris'])} triangles")
+    return ob
+
+
+def swap_to_full(objects: Iterable[bpy.types.Object],
+                 importer: Callable[[str, bpy.types.Context], bpy.types.Object]) -> int:
+    """Replaces proxy meshes of the given objects with the full resolution mesh, in place"""
+    registry = get_mesh_registry()
+    swapped = 0
+    for ob in objects:
+        if ob.type != "MESH" or "umap_full_mesh" not in ob.data:
+            continue
+        proxy_mesh = ob.data
+        key = proxy_mesh.get("umap_mesh_key", proxy_mesh.name)
+        full_key = key[:-len("_proxy")] if key.endswith("_proxy") else key + "_full"
+        full_mesh = registry.find(full_key)
+
+        if full_mesh is None:
+            if not importer(proxy_mesh["umap_full_mesh"], bpy.context):
+                print("WARNING: Failed to import", proxy_mesh["umap_full_mesh"])
+                continue
+            imported = bpy.context.active_object
+            full_mesh = imported.data
+            full_mesh.name = full_key
+            full_mesh.polygons.foreach_set("use_smooth", [True] * len(full_mesh.polygons))
+            for i, material in enumerate(proxy_mesh.materials):
+                if i < len(full_mesh.materials):
+                    full_mesh.materials[i] = material
+            bpy.data.objects.remove(imported)
+            registry.add(full_key, full_mesh)
+
+        ob.data = full_mesh
+        swapped += 1
+    return swapped
@@ -3,7 +3,7 @@ import ctypes
 import os
 import sys
 from math import inf
-from typing import Optional, List
+from typing import Dict, Optional, List
 
 import bmesh
 import bpy
@@ -12,7 +12,7 @@ from bpy.props import BoolProperty, EnumProperty, FloatProperty, StringProperty
 from bpy.types import Operator, PropertyGroup, VertexGroup
 from bpy_extras.io_utils import ImportHelper
 from mathutils import Quaternion, Vector, Matrix
-from .utils import PskImportOptions, rgb_to_srgb
+from .utils import PskImportOptions, rgb_to_srgb_array
 
 from .psk import *
 
@@ -61,6 +61,44 @@ def read_psk(path: str) -> Psk:
                 print(f'Unrecognized section "{section.name} at position {fp.tell()}"')
     return psk
 
+def read_psk_arrays(path: str) -> Dict[str, np.ndarray]:
+    """Reads only the geometry sections, as NumPy structured arrays"""
+    arrays = {}
+    with open(path, 'rb') as fp:
+        while fp.read(1):
+            fp.seek(-1, 1)
+            section = Section.from_buffer_copy(fp.read(ctypes.sizeof(Section)))
+            length = section.data_size * section.data_count
+            if section.name == b'PNTS0000':
+                arrays['points'] = np.frombuffer(fp.read(length), dtype=np.dtype(Vector3))
+            elif section.name == b'VTXW0000':
+                if section.data_size == ctypes.sizeof(Psk.Wedge16):
+                    arrays['wedges'] = np.frombuffer(fp.read(length), dtype=np.dtype(Psk.Wedge16))
+                elif section.data_size == ctypes.sizeof(Psk.Wedge32):
+                    arrays['wedges'] = np.frombuffer(fp.read(length), dtype=np.dtype(Psk.Wedge32))
+                else:
+                    raise RuntimeError('Unrecognized wedge format')
+            elif section.name == b'FACE0000':
+                arrays['faces'] = np.frombuffer(fp.read(length), dtype=np.dtype(Psk.Face))
+            elif section.name == b'FACE3200':
+                arrays['faces'] = np.frombuffer(fp.read(length), dtype=np.dtype(Psk.Face32))
+            elif section.name == b'MATT0000':
+                arrays['materials'] = np.frombuffer(fp.read(length), dtype=np.dtype(Psk.Material))
+            else:
+                fp.seek(length, 1)
+    return arrays
+
+def read_psk_counts(path: str) -> Dict[bytes, int]:
+    """Element count of every section, read from the section headers only"""
+    counts = {}
+    with open(path, 'rb') as fp:
+        while fp.read(1):
+            fp.seek(-1, 1)
+            section = Section.from_buffer_copy(fp.read(ctypes.sizeof(Section)))
+            counts[section.name] = section.data_count
+            fp.seek(section.data_size * section.data_count, 1)
+    return counts
+
 def import_psk(psk: Psk, context, options: PskImportOptions) -> Tuple[List[str], bpy.types.Object]:
     warnings = []
 
@@ -145,8 +183,7 @@ def import_psk(psk: Psk, context, options: PskImportOptions) -> Tuple[List[str],
                 vertex_colors[point_index] = psk_vertex_color
 
         if options.vertex_color_space == 'SRGBA':
-            for i in range(vertex_colors.shape[0]):
-                vertex_colors[i, :3] = tuple(map(lambda x: rgb_to_srgb(x), vertex_colors[i, :3]))
+            vertex_colors[:, :3] = rgb_to_srgb_array(vertex_colors[:, :3])
 
         for loop_index, loop in enumerate(mesh_data.loops):
             vertex_color = vertex_colors[loop.vertex_index]
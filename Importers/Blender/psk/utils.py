@@ -1,3 +1,4 @@
+import numpy as np
 
 
 class PskImportOptions(object):
@@ -15,4 +16,9 @@ def rgb_to_srgb(c):
     if c > 0.0031308:
         return 1.055 * (pow(c, (1.0 / 2.4))) - 0.055
     else:
-        return 12.92 * c
\ No newline at end of file
+        return 12.92 * c
+
+
+def rgb_to_srgb_array(c: np.ndarray) -> np.ndarray:
+    """rgb_to_srgb over a whole array"""
+    return np.where(c > 0.0031308, 1.055 * np.power(np.maximum(c, 0.0031308), 1.0 / 2.4) - 0.055, 12.92 * c)
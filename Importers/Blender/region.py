@@ -0,0 +1,146 @@
+from math import radians
+from typing import Dict, List, Optional, Set, Tuple
+
+import bpy
+from mathutils import Euler, Matrix, Vector
+
+Vec3 = Tuple[float, float, float]
+
+
+def to_blender_location(location) -> Vector:
+    return Vector((location[0] * 0.01, location[1] * -0.01, location[2] * 0.01))
+
+
+def placement_matrix(location, rotation, scale) -> Matrix:
+    """Same transform the importer applies to an object placed from a component"""
+    return Matrix.LocRotScale(
+        to_blender_location(location),
+        Euler((radians(rotation[2]), radians(-rotation[0]), radians(-rotation[1])), 'XYZ'),
+        Vector(scale)
+    )
+
+
+class SpatialGrid:
+    """Buckets points into uniform cells so a box query only tests the points around it"""
+
+    def __init__(self, points: List[Optional[Vector]], cell_size: float = 100.0) -> None:
+        self.cell_size = cell_size
+        self.points = points
+        self.cells: Dict[Tuple[int, int, int], List[int]] = {}
+        for i, p in enumerate(points):
+            if p is not None:
+                self.cells.setdefault(self._cell(p), []).append(i)
+
+    def _cell(self, p) -> Tuple[int, int, int]:
+        return int(p[0] // self.cell_size), int(p[1] // self.cell_size), int(p[2] // self.cell_size)
+
+    def query(self, bmin: Vector, bmax: Vector) -> List[int]:
+        lo, hi = self._cell(bmin), self._cell(bmax)
+        num_cells = (hi[0] - lo[0] + 1) * (hi[1] - lo[1] + 1) * (hi[2] - lo[2] + 1)
+
+        # region is bigger than the populated area, walking the occupied cells is cheaper
+        if num_cells > len(self.cells):
+            cells = [ids for cell, ids in self.cells.items() if all(lo[k] <= cell[k] <= hi[k] for k in range(3))]
+        else:
+            cells = [self.cells.get((x, y, z), ())
+                     for x in range(lo[0], hi[0] + 1)
+                     for y in range(lo[1], hi[1] + 1)
+                     for z in range(lo[2], hi[2] + 1)]
+        return [i for ids in cells for i in ids]
+
+
+class Region:
+    """Box or sphere in Blender units, components placed outside of it are not imported"""
+
+    def __init__(self, center: Vec3, extent: Optional[Vec3] = None, radius: Optional[float] = None) -> None:
+        self.center = Vector(center)
+        self.extent = Vector(extent) if extent is not None else None
+        self.radius = radius
+
+    def __repr__(self) -> str:
+        if self.extent is not None:
+            return f"Region(center={tuple(self.center)}, extent={tuple(self.extent)})"
+        return f"Region(center={tuple(self.center)}, radius={self.radius})"
+
+    @property
+    def bounds(self) -> Tuple[Vector, Vector]:
+        half = self.extent if self.extent is not None else Vector((self.radius,) * 3)
+        return self.center - half, self.center + half
+
+    def contains(self, p: Vector) -> bool:
+        if self.extent is not None:
+            return all(abs(p[k] - self.center[k]) <= self.extent[k] for k in range(3))
+        return (p - self.center).length <= self.radius
+
+    def intersects(self, bmin: Vec3, bmax: Vec3) -> bool:
+        closest = Vector([min(max(self.center[k], bmin[k]), bmax[k]) for k in range(3)])
+        return self.contains(closest)
+
+    def to_local(self, matrix: Matrix) -> "Region":
+        """Region in the space of a child placed with matrix, grown to stay axis aligned"""
+        inv = matrix.inverted_safe()
+        if self.extent is not None:
+            bmin, bmax = self.bounds
+            corners = [inv @ Vector((x, y, z)) for x in (bmin.x, bmax.x) for y in (bmin.y, bmax.y) for z in (bmin.z, bmax.z)]
+            lo = Vector([min(c[k] for c in corners) for k in range(3)])
+            hi = Vector([max(c[k] for c in corners) for k in range(3)])
+            return Region((lo + hi) / 2, (hi - lo) / 2)
+        return Region(inv @ self.center, radius=self.radius * max(abs(s) for s in inv.to_scale()))
+
+    def cull(self, comps: list) -> Set[int]:
+        """Indices of the components to keep, sub-levels and instanced components are tested later"""
+        kept = set()
+        points = []
+        for i, comp in enumerate(comps):
+            if comp[8] or (len(comp) > 10 and comp[10]):
+                kept.add(i)
+                points.append(None)
+            else:
+                points.append(to_blender_location(comp[5] or [0, 0, 0]))
+
+        grid = SpatialGrid(points)
+        for i in grid.query(*self.bounds):
+            if self.contains(points[i]):
+                kept.add(i)
+        return kept
+
+    def cull_instances(self, instances: list) -> list:
+        return [it for it in instances if self.contains(to_blender_location(it[0]))]
+
+
+def map_bounds(comps: list) -> Optional[Tuple[List[float], List[float]]]:
+    """
+    Box around the components and their instances, None when it is unknown: without components or
+    with sub-levels, whose content is only known once they are imported themselves
+    """
+    points = []
+    for comp in comps:
+        if comp[8]:
+            return None
+        location = comp[5] or [0, 0, 0]
+        instances = comp[10] if len(comp) > 10 else None
+        if instances:
+            matrix = placement_matrix(location, comp[6] or [0, 0, 0], comp[7] or [1, 1, 1])
+            points.extend(matrix @ to_blender_location(it[0]) for it in instances)
+        elif comp[5]:
+            points.append(to_blender_location(location))
+    if len(points) == 0:
+        return None
+    return [min(p[k] for p in points) for k in range(3)], [max(p[k] for p in points) for k in range(3)]
+
+
+def region_from_scene(sc: bpy.types.Scene) -> Optional[Region]:
+    if sc.region_mode == "NONE":
+        return None
+
+    center = Vector(sc.region_center)
+    extent = Vector(sc.region_extent)
+    radius = sc.region_radius
+    if sc.region_units == "UNREAL":
+        center = to_blender_location(center)
+        extent = extent * 0.01
+        radius = radius * 0.01
+
+    if sc.region_mode == "BOX":
+        return Region(center, extent=extent)
+    return Region(center, radius=radius)
@@ -21,6 +21,10 @@ class Textures:
             "MaskTexture": self.Mask
         }
 
+    @classmethod
+    def from_dict(cls, d: dict) -> "Textures":
+        return cls(d["Diffuse"], d["Normal"], d["Specular"], d["Emission"], d["MaskTexture"])
+
 
 class TextureMapping:
     UV1: Textures
@@ -66,6 +70,21 @@ class TextureMapping:
             "UV4": self.UV4.to_dict()
         }
 
+    @classmethod
+    def from_dict(cls, d: dict) -> "TextureMapping":
+        mapping = cls()
+        for uv in ("UV1", "UV2", "UV3", "UV4"):
+            setattr(mapping, uv, Textures.from_dict(d[uv]))
+        return mapping
+
+def texture_slot(param_name: str, mapping: TextureMapping) -> str:
+    """Slot (Diffuse, Normal, ...) a texture parameter is mapped to, Diffuse if it isn't mapped"""
+    for textures in (mapping.UV1, mapping.UV2, mapping.UV3, mapping.UV4):
+        for slot in ("Diffuse", "Normal", "Specular", "Emission", "Mask"):
+            if param_name in getattr(textures, slot):
+                return slot
+    return "Diffuse"
+
 def textures_to_mapping(context: bpy.context) -> TextureMapping:
     temp_map = TextureMapping()
     for i in range(1, 5):  # 4UVs
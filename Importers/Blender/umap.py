@@ -2,15 +2,23 @@
 BlenderUmap v0.4.1
 (C) amrsatrio. All rights reserved.
 """
-from typing import Callable
+from typing import Callable, Optional
 import bpy
+import hashlib
 import json
 import os
 import time
+from contextlib import contextmanager
 from math import *
 
-from .texture import TextureMapping, Textures
+from .texture import TextureMapping, Textures, texture_slot
+from . import images, library, meshes, memory
+from .colors import vector_params_to_rgba
 from .piana import *
+from .region import map_bounds, placement_matrix
+from .lod import lod_mesh_path
+from .options import ImportOptions
+from .proxy import import_proxy
 
 
 def get_importer() -> Callable[[str, bpy.types.Context], bpy.types.Object]:
@@ -22,157 +30,333 @@ def get_importer() -> Callable[[str, bpy.types.Context], bpy.types.Object]:
         return pskimport
 
 # ---------- END INPUTS, DO NOT MODIFY ANYTHING BELOW UNLESS YOU NEED TO ----------
-def import_umap(processed_map_path: str,
-                into_collection: bpy.types.Collection, data_dir: str, reuse_maps: bool,
-                reuse_meshes: bool, use_cube_as_fallback: bool, use_generic_shader: bool,
-                use_generic_shader_as_fallback: bool,
-                tex_shader, texture_mappings: TextureMapping) -> bpy.types.Object:
+def import_umap(processed_map_path: str, into_collection: bpy.types.Collection, data_dir: str,
+                options: ImportOptions) -> Optional[bpy.types.Object]:
+    region = options.region
+    lods = options.lods
+    proxy_resolution = options.proxy_resolution
+    flatten = options.flatten
+    update_existing = options.update_existing and not flatten  # flattened placements share no collection to diff
+
     map_name = processed_map_path[processed_map_path.rindex("/") + 1:]
     map_collection = bpy.data.collections.get(map_name)
 
-    if reuse_maps and map_collection:
+    if options.reuse_maps and map_collection and not update_existing and not flatten:
+        if region and "umap_bounds" in map_collection:
+            b = map_collection["umap_bounds"]
+            if not region.intersects(b[:3], b[3:]):
+                return None
         return place_map(map_collection, into_collection)
 
-    importer = get_importer()
-
-    map_collection = bpy.data.collections.new(map_name)
-    map_collection_inst = place_map(map_collection, into_collection)
-    map_scene = bpy.data.scenes.get(map_collection.name) or bpy.data.scenes.new(map_collection.name)
-    map_scene.collection.children.link(map_collection)
-    map_layer_collection = map_scene.view_layers[0].layer_collection.children[map_collection.name]
+    comps_path = os.path.join(data_dir, "jsons" + processed_map_path + ".processed.json")
+    lights_path = os.path.join(data_dir, "jsons" + processed_map_path + ".lights.processed.json")
+    source_hash = content_hash(file_hash(comps_path, lights_path), repr(region), repr(lods), proxy_resolution)
 
-    with open(os.path.join(data_dir, "jsons" + processed_map_path + ".processed.json")) as file:
+    with open(comps_path) as file:
         comps = json.loads(file.read())
 
+    bounds = map_bounds(comps)
+    if region and bounds and not region.intersects(*bounds):
+        print(f"Skipping {map_name}, outside of the import region")
+        return None
+
+    # nothing changed since the last import of this map
+    if update_existing and map_collection and map_collection.get("umap_source_hash") == source_hash:
+        return place_map(map_collection, into_collection)
+
+    importer = get_importer()
+
+    # guid -> objects created for that component by the previous import
+    existing_obs = {}
+    # guid -> batch merged object holding the component and its index in it
+    merged_sources = {}
+    if update_existing and map_collection and "umap_source_hash" in map_collection:
+        for ob in map_collection.objects:
+            if ob.parent is None and "umap_guid" in ob:
+                existing_obs.setdefault(ob["umap_guid"], []).append(ob)
+            for i, merged_guid in enumerate(ob.get("umap_merged_guids", [])):
+                if merged_guid:
+                    merged_sources[merged_guid] = (ob, i)
+    else:
+        map_collection = bpy.data.collections.new(map_name)
+    if flatten:
+        # every placement gets its own collection in the current scene, no map scene to evaluate
+        into_collection.children.link(map_collection)
+        map_collection["umap_flattened"] = True
+        map_collection_inst = None
+        map_scene = bpy.context.scene
+        map_layer_collection = find_layer_collection(bpy.context.view_layer.layer_collection, map_collection)
+    else:
+        map_collection_inst = place_map(map_collection, into_collection)
+        map_scene = bpy.data.scenes.get(map_collection.name) or bpy.data.scenes.new(map_collection.name)
+        if map_scene.collection.children.get(map_collection.name) is None:
+            map_scene.collection.children.link(map_collection)
+        map_layer_collection = map_scene.view_layers[0].layer_collection.children[map_collection.name]
+
     blights_exist = False
-    if os.path.exists(os.path.join(data_dir, "jsons" + processed_map_path + ".lights.processed.json")):
-        with open(os.path.join(data_dir, "jsons" + processed_map_path + ".lights.processed.json")) as file:
+    if os.path.exists(lights_path):
+        with open(lights_path) as file:
             lights = json.loads(file.read())
+        light_colors = map_light_colors(lights)
         blights_exist = True
 
-    for comp_i, comp in enumerate(comps):
-        # guid = comp[0]
-        name = comp[1]
-        mesh_path = comp[2]
-        mats = comp[3]
-        texture_data = comp[4]
-        location = comp[5] or [0, 0, 0]
-        rotation = comp[6] or [0, 0, 0]
-        scale = comp[7] or [1, 1, 1]
-        child_comps = comp[8]
-        light_index = comp[9] if blights_exist else 0
-        instanceData = comp[10] if len(comp) > 10 else []    # list of Transforms
-
-        # if name is bigger than 50 (58 is blender limit) than hash it and use it as name
-        if len(name) > 50:
-            name = name[:40] + f"_{abs(string_hash_code(name)):08x}"
-
-        print("\nActor %d of %d: %s" % (comp_i + 1, len(comps), name))
-
-        def apply_ob_props(ob: bpy.types.Object, new_name: str = name) -> bpy.types.Object:
-            ob.name = new_name
-            ob.location = [location[0] * 0.01, location[1] * -0.01, location[2] * 0.01]
-            ob.rotation_mode = 'XYZ'
-            ob.rotation_euler = [radians(rotation[2]), radians(-rotation[0]), radians(-rotation[1])]
-            ob.scale = scale
-            return ob
-
-        def new_object(data: bpy.types.Mesh = None):
-            ob = apply_ob_props(bpy.data.objects.new(name, data or bpy.data.meshes["__fallback" if use_cube_as_fallback else "__empty"]), name)
-            bpy.context.collection.objects.link(ob)
-            bpy.context.view_layer.objects.active = ob
-
-            if light_index > 0: # greater than zero
-                for light in lights[light_index-1]["Props"]:
-                    l = create_light(light, map_collection)
-                    l.parent = ob
-
-        if light_index < 0:
-            for light in lights[abs(light_index)-1]["Props"]:
-                create_light(light, map_collection)
-            continue
-
-        if child_comps and len(child_comps) > 0:
-            for i, child_comp in enumerate(child_comps):
-                apply_ob_props(
-                    import_umap(child_comp, map_collection, data_dir, reuse_maps, reuse_meshes, use_cube_as_fallback, use_generic_shader, use_generic_shader_as_fallback, tex_shader, texture_mappings),
-                    name if i == 0 else ("%s_%d" % (name, i)))
-
-            continue
-
-        bpy.context.window.scene = map_scene
-        bpy.context.view_layer.active_layer_collection = map_layer_collection
-
-        if not mesh_path:
-            print("WARNING: No mesh, defaulting to fallback mesh")
-            new_object()
-            continue
-
-        if mesh_path.startswith("/"):
-            mesh_path = mesh_path[1:]
-
-        key = os.path.basename(mesh_path)
-        td_suffix = ""
-
-        if mats and len(mats) > 0:
-            key += f"_{abs(string_hash_code(';'.join(mats.keys()))):08x}"
-        if texture_data and len(texture_data) > 0:
-            td_suffix = f"_{abs(string_hash_code(';'.join([list(it.values())[0] if it else '' for it in texture_data]))):08x}"
-            key += td_suffix
-
-        existing_mesh = bpy.data.meshes.get(key) if reuse_meshes else None
-
-        if instanceData and len(instanceData) > 0:
-            pass
-            # imported_object = new_object(bpy.data.meshes["__empty"]) # group-parent
-        elif existing_mesh:
-            new_object(existing_mesh)
-            continue
-
-        full_mesh_path = os.path.join(data_dir, mesh_path)
-        if os.path.exists(full_mesh_path + ".psk"):
-            full_mesh_path += ".psk"
-        elif os.path.exists(full_mesh_path + ".pskx"):
-            full_mesh_path += ".pskx"
-
-        if imported := importer(full_mesh_path, bpy.context):
-            imported = bpy.context.active_object
-            apply_ob_props(imported)
-            imported.data.name = key
-            bpy.ops.object.shade_smooth()
-
-            if light_index > 0:
-                for light in lights[light_index-1]["Props"]:
-                    l = create_light(light, map_collection)
-                    l.parent = imported
-
-            for m_idx, (m_path, m_textures) in enumerate(mats.items()):
-                if m_textures:
-                    import_material(imported, m_idx, m_path, td_suffix, m_textures, use_generic_shader, use_generic_shader_as_fallback, tex_shader, data_dir, texture_mappings)
-
-            if instanceData and len(instanceData) > 0: # remove the mesh
-                bpy.ops.object.delete()
-        else:
-            print("WARNING: Mesh not imported, defaulting to fallback mesh:", full_mesh_path)
-            new_object()
-
-        if instanceData and len(instanceData) > 0:
-            parent_ob =  bpy.data.objects.new(name, bpy.data.meshes["__empty"])
-            parent_ob.name = name + "_parent"
-            apply_ob_props(parent_ob)
-            bpy.context.collection.objects.link(parent_ob)
-
-            for i, instance in enumerate(instanceData):
-                ob = bpy.data.objects.new(name, bpy.data.meshes.get(key))
-                ob.name = name + "_" + str(i)
-                bpy.context.collection.objects.link(ob)
-                bpy.context.view_layer.objects.active = ob
-                ob.location = [instance[0][0] * 0.01, instance[0][1] * -0.01, instance[0][2] * 0.01]
+    resolved_lights = {}
+
+    def get_resolved_lights(light_index: int) -> list:
+        light_index = abs(light_index) - 1
+        if light_index not in resolved_lights:
+            resolved_lights[light_index] = resolve_lights(lights[light_index]["Props"], light_colors[light_index])
+        return resolved_lights[light_index]
+
+    kept_comps = region.cull(comps) if region else None
+    if kept_comps is not None:
+        print(f"Import region: keeping {len(kept_comps)} of {len(comps)} actors in {map_name}")
+
+    num_unchanged = num_updated = num_added = 0
+    stale_merged = {}  # merged object -> indices of its changed actors
+
+    with scene_context(map_scene, map_layer_collection):
+        for comp_i, comp in enumerate(comps):
+            guid = comp[0]
+            name = comp[1]
+            mesh_path = comp[2]
+            mats = comp[3]
+            texture_data = comp[4]
+            location = comp[5] or [0, 0, 0]
+            rotation = comp[6] or [0, 0, 0]
+            scale = comp[7] or [1, 1, 1]
+            child_comps = comp[8]
+            light_index = comp[9] if blights_exist else 0
+            instanceData = comp[10] if len(comp) > 10 else []    # list of Transforms
+
+            if kept_comps is not None and comp_i not in kept_comps:
+                continue
+
+            if region and instanceData:
+                instanceData = region.to_local(placement_matrix(location, rotation, scale)).cull_instances(instanceData)
+                if len(instanceData) == 0:
+                    continue
+
+            # if name is bigger than 50 (58 is blender limit) than hash it and use it as name
+            if len(name) > 50:
+                name = name[:40] + f"_{abs(string_hash_code(name)):08x}"
+
+            print("\nActor %d of %d: %s" % (comp_i + 1, len(comps), name))
+
+            def apply_ob_props(ob: bpy.types.Object, new_name: str = name) -> bpy.types.Object:
+                ob.name = new_name
+                ob.location = [location[0] * 0.01, location[1] * -0.01, location[2] * 0.01]
                 ob.rotation_mode = 'XYZ'
-                ob.rotation_euler = [radians(instance[1][2]), radians(-instance[1][0]), radians(-instance[1][1])]
-                ob.scale = instance[2]
-                ob.parent = parent_ob
+                ob.rotation_euler = [radians(rotation[2]), radians(-rotation[0]), radians(-rotation[1])]
+                ob.scale = scale
+                return ob
+
+            lod = 0
+            if lods and mesh_path:
+                if instanceData:  # closest instance decides, instances share one mesh
+                    lod = lods.to_local(placement_matrix(location, rotation, scale)).select(it[0] for it in instanceData)
+                else:
+                    lod = lods.select([location])
+
+            comp_hash = content_hash(mesh_path, mats, texture_data, instanceData,
+                                     lights[abs(light_index) - 1] if light_index else None, lod, proxy_resolution)
+            transform_hash = content_hash(location, rotation, scale)
+
+            def tag(ob: bpy.types.Object) -> bpy.types.Object:
+                if guid:
+                    ob["umap_guid"] = guid
+                    ob["umap_hash"] = comp_hash
+                    ob["umap_transform_hash"] = transform_hash
+                return ob
+
+            merged_source = merged_sources.pop(guid, None) if guid else None
+            if merged_source:
+                merged_ob, source_index = merged_source
+                if merged_ob["umap_merged_hashes"][source_index] == f"{comp_hash}:{transform_hash}":
+                    num_unchanged += 1
+                    continue
+                # a merged mesh cannot be updated in place, the actor leaves it and is imported on its own
+                stale_merged.setdefault(merged_ob, set()).add(source_index)
+
+            previous_obs = existing_obs.pop(guid, None) if guid else None
+            if previous_obs:
+                # child maps are diffed on their own, so their instances are always placed again
+                if not child_comps and all(ob.get("umap_hash") == comp_hash for ob in previous_obs):
+                    if light_index >= 0 and any(ob.get("umap_transform_hash") != transform_hash for ob in previous_obs):
+                        for ob in previous_obs:
+                            tag(apply_ob_props(ob, ob.name))
+                        num_updated += 1
+                    else:
+                        num_unchanged += 1
+                    continue
 
+                for ob in previous_obs:
+                    remove_object_tree(ob)
+                num_updated += 1
+            elif merged_source:
+                num_updated += 1
+            else:
+                num_added += 1
+
+            def new_object(data: bpy.types.Mesh = None):
+                ob = apply_ob_props(bpy.data.objects.new(name, data or bpy.data.meshes["__fallback" if options.use_cube_as_fallback else "__empty"]), name)
+                bpy.context.collection.objects.link(ob)
+                bpy.context.view_layer.objects.active = ob
+                tag(ob)
+
+                if light_index > 0: # greater than zero
+                    for l in create_lights(get_resolved_lights(light_index), map_collection):
+                        l.parent = ob
+                return ob
+
+            if light_index < 0:
+                for l in create_lights(get_resolved_lights(light_index), map_collection):
+                    tag(l)
+                continue
+
+            if child_comps and len(child_comps) > 0:
+                child_options = options.to_local(placement_matrix(location, rotation, scale))
+                for i, child_comp in enumerate(child_comps):
+                    child_inst = import_umap(child_comp, map_collection, data_dir, child_options)
+                    if child_inst:
+                        tag(apply_ob_props(child_inst, name if i == 0 else ("%s_%d" % (name, i))))
+
+                continue
+
+            if not mesh_path:
+                print("WARNING: No mesh, defaulting to fallback mesh")
+                new_object()
+                continue
+
+            if mesh_path.startswith("/"):
+                mesh_path = mesh_path[1:]
+
+            key = os.path.basename(mesh_path)
+            td_suffix = ""
+
+            if mats and len(mats) > 0:
+                key += f"_{abs(string_hash_code(';'.join(mats.keys()))):08x}"
+            if texture_data and len(texture_data) > 0:
+                td_suffix = f"_{abs(string_hash_code(';'.join([list(it.values())[0] if it else '' for it in texture_data]))):08x}"
+                key += td_suffix
+
+            full_mesh_path = os.path.join(data_dir, mesh_path)
+            if lod > 0:
+                lod = lods.resolve(full_mesh_path, lod)
+            if lod > 0:
+                key += f"_LOD{lod}"
+            if proxy_resolution > 0:
+                key += "_proxy"
+
+            mesh_registry = meshes.get_mesh_registry()
+            mesh = mesh_registry.find(key) if options.reuse_meshes else None
+            full_mesh_path = lod_mesh_path(full_mesh_path, lod) or full_mesh_path
+            use_library = library.mesh_library is not None and proxy_resolution == 0
+
+            if mesh is None and use_library:
+                mesh = library.mesh_library.get(key, full_mesh_path)
+                if mesh:
+                    mesh_registry.add_from_library(key, mesh)
+
+            # over the memory ceiling, the mesh is degraded instead of imported in full
+            budget = memory.memory_budget
+            mesh_proxy_resolution = proxy_resolution
+            if mesh is None and budget:
+                degraded = budget.check_mesh(full_mesh_path, proxy_resolution > 0)
+                if degraded == "PROXY":
+                    budget.degrade("meshes imported as proxies", key)
+                    key += "_proxy"
+                    mesh_proxy_resolution = budget.proxy_resolution
+                    mesh = mesh_registry.find(key) if options.reuse_meshes else None
+                elif degraded == "FALLBACK":
+                    budget.degrade("meshes replaced by the fallback mesh", key)
+                    mesh = bpy.data.meshes["__fallback" if options.use_cube_as_fallback else "__empty"]
+
+            if mesh is None:
+                if mesh_proxy_resolution > 0:
+                    imported = import_proxy(full_mesh_path, bpy.context, mesh_proxy_resolution)
+                else:
+                    imported = importer(full_mesh_path, bpy.context)
+
+                if imported:
+                    imported = bpy.context.active_object
+                    apply_ob_props(imported)
+                    imported.data.name = key
+                    bpy.ops.object.shade_smooth()
+                    tag(imported)
+
+                    if light_index > 0:
+                        for l in create_lights(get_resolved_lights(light_index), map_collection):
+                            l.parent = imported
+
+                    lazy_materials = options.lazy_materials or (budget is not None and budget.exceeded)
+                    for m_idx, (m_path, m_textures) in enumerate(mats.items()):
+                        if m_textures:
+                            if lazy_materials and not options.lazy_materials:
+                                budget.degrade("materials deferred", m_path)
+                            import_material(imported, m_idx, m_path, td_suffix, m_textures, options.use_generic_shader,
+                                            options.use_generic_shader_as_fallback, options.tex_shader, data_dir,
+                                            options.texture_mappings, lazy_materials, options.split_channels)
+
+                    mesh = imported.data
+                    mesh_registry.add(key, mesh)
+                    if budget:
+                        budget.add_mesh(mesh)
+                    if use_library and mesh_proxy_resolution == 0 and not lazy_materials:
+                        library.mesh_library.add(key, mesh)
+
+                    if instanceData and len(instanceData) > 0: # remove the mesh
+                        bpy.ops.object.delete()
+                else:
+                    print("WARNING: Mesh not imported, defaulting to fallback mesh:", full_mesh_path)
+                    new_object()
+            elif not instanceData:
+                new_object(mesh)
+                continue
+
+            if instanceData and len(instanceData) > 0:
+                parent_ob =  bpy.data.objects.new(name, bpy.data.meshes["__empty"])
+                parent_ob.name = name + "_parent"
+                apply_ob_props(parent_ob)
+                bpy.context.collection.objects.link(parent_ob)
+                tag(parent_ob)
+
+                for i, instance in enumerate(instanceData):
+                    ob = bpy.data.objects.new(name, mesh)
+                    ob.name = name + "_" + str(i)
+                    bpy.context.collection.objects.link(ob)
+                    bpy.context.view_layer.objects.active = ob
+                    ob.location = [instance[0][0] * 0.01, instance[0][1] * -0.01, instance[0][2] * 0.01]
+                    ob.rotation_mode = 'XYZ'
+                    ob.rotation_euler = [radians(instance[1][2]), radians(-instance[1][0]), radians(-instance[1][1])]
+                    ob.scale = instance[2]
+                    ob.parent = parent_ob
+
+    if flatten:
+        # objects were placed relative to the map, bake the placement of the map into them
+        for ob in map_collection.objects:
+            if ob.parent is None:
+                ob.matrix_basis = options.matrix @ ob.matrix_basis
+
+    if update_existing:
+        # whatever is left was removed from the map
+        num_removed = len(existing_obs) + len(merged_sources)
+        for obs in existing_obs.values():
+            for ob in obs:
+                remove_object_tree(ob)
+        for merged_ob, source_index in merged_sources.values():
+            stale_merged.setdefault(merged_ob, set()).add(source_index)
+        if stale_merged:
+            from .merge import remove_sources
+            for merged_ob, source_indices in stale_merged.items():
+                remove_sources(merged_ob, source_indices)
+        print(f"Updated {map_name}: {num_added} added, {num_updated} updated, {num_removed} removed, {num_unchanged} unchanged")
+
+    map_collection["umap_source_hash"] = source_hash
+    if bounds:
+        map_collection["umap_bounds"] = [*bounds[0], *bounds[1]]
+    elif "umap_bounds" in map_collection:
+        del map_collection["umap_bounds"]
     return map_collection_inst
 
 def import_material(ob: bpy.types.Object,
@@ -182,7 +366,8 @@ def import_material(ob: bpy.types.Object,
                     material_info: dict,
                     use_generic_shader: bool,
                     use_generic_shader_as_fallback: bool,
-                    tex_shader, data_dir, texture_mappings: TextureMapping) -> bpy.types.Material:
+                    tex_shader, data_dir, texture_mappings: TextureMapping,
+                    lazy: bool = False, split_channels: bool = False) -> bpy.types.Material:
     # .mat is required to prevent conflicts with empty ones imported by PSK/PSA plugin
     m_name = os.path.basename(path + ".mat" + suffix)
     m = bpy.data.materials.get(m_name)
@@ -193,137 +378,23 @@ def import_material(ob: bpy.types.Object,
         # TODO this is used for BuildTextureData stuff
 
         m = bpy.data.materials.new(name=m_name)
-        m.use_nodes = True
-        tree = m.node_tree
-
-        for node in tree.nodes:
-            tree.nodes.remove(node)
-
-        m.use_backface_culling = False
-        # m.blend_method = "OPAQUE"
-        m.blend_method = "CLIP"
-
-        shader_name = material_info["ShaderName"]
-
-        if use_generic_shader or (use_generic_shader_as_fallback and not bpy.data.node_groups.get(shader_name, False)):
-            def GetAnyValueOrDefault(keys, dicts, default=None):
-                for key in keys:
-                    if key in dicts:
-                        return dicts[key]
-                return default
-
-            def group(textures_params: dict, texture_mapping: Textures, location, tex_shader):
-                sh = tree.nodes.new("ShaderNodeGroup")
-                sh.location = location
-                sh.node_tree = tex_shader
-                sub_textures = [None]*5 # base_textures[sub_tex_idx] if sub_tex_idx < len(base_textures) and base_textures[sub_tex_idx] and len(base_textures[sub_tex_idx]) > 0 else base_textures[0]
-
-                # Texture Shader Inputs:
-                # 0: Diffuse
-                # 1: Normal
-                # 2: Specular
-                # 3: Emission
-                # 4: Alpha
-                # TODO: Clean this up we don't need sub_textures
-                if diffuse := GetAnyValueOrDefault(texture_mapping.Diffuse, textures_params):
-                    sub_textures[0] = diffuse
-
-                if normal := GetAnyValueOrDefault(texture_mapping.Normal, textures_params):
-                    sub_textures[1] = normal
-
-                if specular := GetAnyValueOrDefault(texture_mapping.Specular, textures_params):
-                    sub_textures[2] = specular
-
-                if emission := GetAnyValueOrDefault(texture_mapping.Emission, textures_params):
-                    sub_textures[3] = emission
-
-                if alpha := GetAnyValueOrDefault(texture_mapping.Mask, textures_params):
-                    sub_textures[4] = alpha
-
-                for tex_index, sub_tex in enumerate(sub_textures):
-                    if sub_tex:
-                        img = get_or_load_img(sub_tex, data_dir) if not sub_tex.endswith("/T_EmissiveColorChart") else None
-
-                        if img:
-                            d_tex = tree.nodes.new("ShaderNodeTexImage")
-                            d_tex.hide = True
-                            d_tex.location = [location[0] - 320, location[1] - tex_index * 40]
-
-                            if tex_index != 0:  # other than diffuse
-                                img.colorspace_settings.name = "Non-Color"
-
-                            d_tex.image = img
-                            tree.links.new(d_tex.outputs[0], sh.inputs[tex_index])
-
-                            if tex_index == 4:  # change mat blend method if there's an alpha mask texture
-                                m.blend_method = 'CLIP'
-                return sh
-
-            mat_out = tree.nodes.new("ShaderNodeOutputMaterial")
-            mat_out.location = [300, 300]
-
-            if ob.data.uv_layers.get("EXTRAUVS0"): # has multiple UVs use layered mat
-                uvm_ng = tree.nodes.new("ShaderNodeGroup")
-                uvm_ng.location = [100, 300]
-                uvm_ng.node_tree = bpy.data.node_groups["UV Shader Mix"]
-                uv_map = tree.nodes.new("ShaderNodeUVMap")
-                uv_map.location = [-100, 700]
-                uv_map.uv_map = "EXTRAUVS0"
-                tree.links.new(uv_map.outputs[0], uvm_ng.inputs[0])
-                tree.links.new(group(material_info["TextureParams"], texture_mappings.UV1, [-100, 300], tex_shader).outputs[0], uvm_ng.inputs[1])
-                tree.links.new(group(material_info["TextureParams"], texture_mappings.UV2, [-100, 100], tex_shader).outputs[0], uvm_ng.inputs[2])
-                tree.links.new(group(material_info["TextureParams"], texture_mappings.UV3, [-100, -100], tex_shader).outputs[0], uvm_ng.inputs[3])
-                tree.links.new(group(material_info["TextureParams"], texture_mappings.UV4, [-100, -300], tex_shader).outputs[0], uvm_ng.inputs[4])
-                tree.links.new(uvm_ng.outputs[0], mat_out.inputs[0])
-            else:
-                tree.links.new(group(material_info["TextureParams"], texture_mappings.UV1, [-100, 300], tex_shader).outputs[0], mat_out.inputs[0])
+        layered = ob.data.uv_layers.get("EXTRAUVS0") is not None
+
+        if lazy:
+            # placeholder, node tree and images are created by realize_material once the material is needed
+            m["umap_material_info"] = json.dumps(material_info)
+            m["umap_material_options"] = json.dumps({
+                "layered": layered,
+                "use_generic_shader": use_generic_shader,
+                "use_generic_shader_as_fallback": use_generic_shader_as_fallback,
+                "data_dir": data_dir,
+                "texture_mappings": texture_mappings.to_dict(),
+                "split_channels": split_channels,
+            })
+            print("Material deferred")
         else:
-            shader_node_group = create_node_group(shader_name, material_info.get("TextureParams", []), material_info.get("ScalerParams", []), material_info.get("VectorParams", []))
-
-            # spawn the shader into material and connect it to output
-            shader_node = tree.nodes.new("ShaderNodeGroup")
-            shader_node.node_tree = shader_node_group
-            shader_node.location = 0, 0
-            shader_node.name = shader_name
-
-            output_node = tree.nodes.new("ShaderNodeOutputMaterial")
-            output_node.location = 300, 0
-            tree.links.new(shader_node.outputs[0], output_node.inputs[0])
-
-            offset = 0
-            for input_name, tex_path in material_info["TextureParams"].items():
-                if input_name not in shader_node.inputs: # too big name
-                    continue
-                tex = get_or_load_img(tex_path, data_dir)
-                if tex:
-                    tex_node = tree.nodes.new("ShaderNodeTexImage")
-                    tex_node.image = tex
-                    tex_node.location = -300, offset
-                    tex_node.hide = True
-                    tree.links.new(tex_node.outputs[0], shader_node.inputs[input_name])
-
-                    if tex.depth == 32 and input_name+"_Alpha" in shader_node.inputs: # if we have alpha channel, connect it to alpha input
-                        tree.links.new(tex_node.outputs[1], shader_node.inputs[input_name+"_Alpha"])
-                        if input_name+"_HasValue" in shader_node.inputs:
-                            shader_node.inputs[input_name+"_HasValue"].default_value = 1
-                    elif input_name+"_Alpha" in shader_node.inputs:
-                        shader_node.inputs[input_name+"_Alpha"].default_value = 1
-                        if input_name+"_HasValue" in shader_node.inputs:
-                            shader_node.inputs[input_name+"_HasValue"].default_value = 0
-                    offset -= 40
-
-            for input_name, value in material_info["ScalerParams"].items():
-                if input_name not in shader_node.inputs or shader_node.inputs[input_name].bl_idname != "NodeSocketFloat":
-                    continue
-                shader_node.inputs[input_name].default_value = value
-
-            # VectorParams (Color)
-            for input_name, value in material_info["VectorParams"].items():
-                if input_name not in shader_node.inputs or shader_node.inputs[input_name].bl_idname != "NodeSocketColor":
-                    continue
-                shader_node.inputs[input_name].default_value = hex_to_rgb(value)
-
-        print("Material imported")
+            build_material(m, material_info, layered, use_generic_shader, use_generic_shader_as_fallback, tex_shader, data_dir, texture_mappings, split_channels)
+            print("Material imported")
 
     found_index = find_mat_index(ob.data.materials, m.name[:-4])  # remove .mat
     if found_index is None:
@@ -334,6 +405,185 @@ def import_material(ob: bpy.types.Object,
 
     return m
 
+# generic shader input index -> (channels, inputs of "Texture Shader Split" they go to)
+SPLIT_INPUTS = {
+    2: ("RGB", ("Specular", "Metallic", "Roughness")),
+    4: ("R", ("Alpha",)),
+}
+
+def build_material(m: bpy.types.Material,
+                   material_info: dict,
+                   layered: bool,
+                   use_generic_shader: bool,
+                   use_generic_shader_as_fallback: bool,
+                   tex_shader, data_dir, texture_mappings: TextureMapping,
+                   split_channels: bool = False):
+    m.use_nodes = True
+    tree = m.node_tree
+
+    for node in tree.nodes:
+        tree.nodes.remove(node)
+
+    m.use_backface_culling = False
+    # m.blend_method = "OPAQUE"
+    m.blend_method = "CLIP"
+
+    shader_name = material_info["ShaderName"]
+
+    if use_generic_shader or (use_generic_shader_as_fallback and not bpy.data.node_groups.get(shader_name, False)):
+        # packed specular/mask channels are split into separate images and wired straight to the BSDF
+        split_shader = bpy.data.node_groups.get("Texture Shader Split") if split_channels else None
+        if split_shader:
+            tex_shader = split_shader
+
+        def GetAnyValueOrDefault(keys, dicts, default=None):
+            for key in keys:
+                if key in dicts:
+                    return dicts[key]
+            return default
+
+        def group(textures_params: dict, texture_mapping: Textures, location, tex_shader):
+            sh = tree.nodes.new("ShaderNodeGroup")
+            sh.location = location
+            sh.node_tree = tex_shader
+            sub_textures = [None]*5 # base_textures[sub_tex_idx] if sub_tex_idx < len(base_textures) and base_textures[sub_tex_idx] and len(base_textures[sub_tex_idx]) > 0 else base_textures[0]
+
+            # Texture Shader Inputs:
+            # 0: Diffuse
+            # 1: Normal
+            # 2: Specular
+            # 3: Emission
+            # 4: Alpha
+            # TODO: Clean this up we don't need sub_textures
+            if diffuse := GetAnyValueOrDefault(texture_mapping.Diffuse, textures_params):
+                sub_textures[0] = diffuse
+
+            if normal := GetAnyValueOrDefault(texture_mapping.Normal, textures_params):
+                sub_textures[1] = normal
+
+            if specular := GetAnyValueOrDefault(texture_mapping.Specular, textures_params):
+                sub_textures[2] = specular
+
+            if emission := GetAnyValueOrDefault(texture_mapping.Emission, textures_params):
+                sub_textures[3] = emission
+
+            if alpha := GetAnyValueOrDefault(texture_mapping.Mask, textures_params):
+                sub_textures[4] = alpha
+
+            for tex_index, sub_tex in enumerate(sub_textures):
+                if sub_tex:
+                    colorspace = "Non-Color" if tex_index != 0 else None  # other than diffuse
+                    img = get_or_load_img(sub_tex, data_dir, images.SLOTS[tex_index], colorspace) if not sub_tex.endswith("/T_EmissiveColorChart") else None
+
+                    if img:
+                        if split_shader and tex_index in SPLIT_INPUTS:
+                            channels, input_names = SPLIT_INPUTS[tex_index]
+                            for c_idx, (c_img, input_name) in enumerate(zip(images.split_channels(img, channels), input_names)):
+                                c_tex = tree.nodes.new("ShaderNodeTexImage")
+                                c_tex.hide = True
+                                c_tex.location = [location[0] - 320, location[1] - (tex_index + c_idx) * 40]
+                                c_tex.image = c_img
+                                tree.links.new(c_tex.outputs[0], sh.inputs[input_name])
+                        else:
+                            d_tex = tree.nodes.new("ShaderNodeTexImage")
+                            d_tex.hide = True
+                            d_tex.location = [location[0] - 320, location[1] - tex_index * 40]
+                            d_tex.image = img
+                            tree.links.new(d_tex.outputs[0], sh.inputs[tex_index])
+
+                        if tex_index == 4:  # change mat blend method if there's an alpha mask texture
+                            m.blend_method = 'CLIP'
+            return sh
+
+        mat_out = tree.nodes.new("ShaderNodeOutputMaterial")
+        mat_out.location = [300, 300]
+
+        if layered: # has multiple UVs use layered mat
+            uvm_ng = tree.nodes.new("ShaderNodeGroup")
+            uvm_ng.location = [100, 300]
+            uvm_ng.node_tree = bpy.data.node_groups["UV Shader Mix"]
+            uv_map = tree.nodes.new("ShaderNodeUVMap")
+            uv_map.location = [-100, 700]
+            uv_map.uv_map = "EXTRAUVS0"
+            tree.links.new(uv_map.outputs[0], uvm_ng.inputs[0])
+            tree.links.new(group(material_info["TextureParams"], texture_mappings.UV1, [-100, 300], tex_shader).outputs[0], uvm_ng.inputs[1])
+            tree.links.new(group(material_info["TextureParams"], texture_mappings.UV2, [-100, 100], tex_shader).outputs[0], uvm_ng.inputs[2])
+            tree.links.new(group(material_info["TextureParams"], texture_mappings.UV3, [-100, -100], tex_shader).outputs[0], uvm_ng.inputs[3])
+            tree.links.new(group(material_info["TextureParams"], texture_mappings.UV4, [-100, -300], tex_shader).outputs[0], uvm_ng.inputs[4])
+            tree.links.new(uvm_ng.outputs[0], mat_out.inputs[0])
+        else:
+            tree.links.new(group(material_info["TextureParams"], texture_mappings.UV1, [-100, 300], tex_shader).outputs[0], mat_out.inputs[0])
+    else:
+        shader_node_group = create_node_group(shader_name, material_info.get("TextureParams", []), material_info.get("ScalerParams", []), material_info.get("VectorParams", []))
+
+        # spawn the shader into material and connect it to output
+        shader_node = tree.nodes.new("ShaderNodeGroup")
+        shader_node.node_tree = shader_node_group
+        shader_node.location = 0, 0
+        shader_node.name = shader_name
+
+        output_node = tree.nodes.new("ShaderNodeOutputMaterial")
+        output_node.location = 300, 0
+        tree.links.new(shader_node.outputs[0], output_node.inputs[0])
+
+        offset = 0
+        for input_name, tex_path in material_info["TextureParams"].items():
+            if input_name not in shader_node.inputs: # too big name
+                continue
+            tex = get_or_load_img(tex_path, data_dir, texture_slot(input_name, texture_mappings))
+            if tex:
+                tex_node = tree.nodes.new("ShaderNodeTexImage")
+                tex_node.image = tex
+                tex_node.location = -300, offset
+                tex_node.hide = True
+                tree.links.new(tex_node.outputs[0], shader_node.inputs[input_name])
+
+                if tex.depth == 32 and input_name+"_Alpha" in shader_node.inputs: # if we have alpha channel, connect it to alpha input
+                    tree.links.new(tex_node.outputs[1], shader_node.inputs[input_name+"_Alpha"])
+                    if input_name+"_HasValue" in shader_node.inputs:
+                        shader_node.inputs[input_name+"_HasValue"].default_value = 1
+                elif input_name+"_Alpha" in shader_node.inputs:
+                    shader_node.inputs[input_name+"_Alpha"].default_value = 1
+                    if input_name+"_HasValue" in shader_node.inputs:
+                        shader_node.inputs[input_name+"_HasValue"].default_value = 0
+                offset -= 40
+
+        for input_name, value in material_info["ScalerParams"].items():
+            if input_name not in shader_node.inputs or shader_node.inputs[input_name].bl_idname != "NodeSocketFloat":
+                continue
+            shader_node.inputs[input_name].default_value = value
+
+        # VectorParams (Color)
+        for input_name, value in vector_params_to_rgba(material_info["VectorParams"]).items():
+            if input_name not in shader_node.inputs or shader_node.inputs[input_name].bl_idname != "NodeSocketColor":
+                continue
+            shader_node.inputs[input_name].default_value = value
+
+
+def realize_material(m: bpy.types.Material) -> bool:
+    """Builds the node tree of a material deferred by a lazy import"""
+    if "umap_material_info" not in m or m.library:  # linked materials are read-only
+        return False
+
+    material_info = json.loads(m["umap_material_info"])
+    options = json.loads(m["umap_material_options"])
+    build_material(m, material_info, options["layered"], options["use_generic_shader"],
+                   options["use_generic_shader_as_fallback"], bpy.data.node_groups.get("Texture Shader"),
+                   options["data_dir"], TextureMapping.from_dict(options["texture_mappings"]),
+                   options.get("split_channels", False))
+    del m["umap_material_info"]
+    del m["umap_material_options"]
+    return True
+
+
+def realize_materials(materials) -> int:
+    realized = 0
+    for m in set(materials):
+        if m is not None and realize_material(m):
+            realized += 1
+    return realized
+
+
 def create_node_group(name, texture_inputs, scaler_inputs, vector_inputs):
         group = bpy.data.node_groups.get(name)
         if group is None:
@@ -372,32 +622,163 @@ def place_map(collection: bpy.types.Collection, into_collection: bpy.types.Colle
     into_collection.objects.link(c_inst)
     return c_inst
 
-def get_or_load_img(img_path: str, data_dir: str) -> bpy.types.Image:
+def get_or_load_img(img_path: str, data_dir: str, slot: str = "Diffuse", colorspace: Optional[str] = None) -> bpy.types.Image:
+    """
+    The image of the texture, shared by every material using the same file in the same colorspace.
+    Without a colorspace the one Blender picks when loading is kept.
+    """
     name = os.path.basename(img_path)
-    existing = bpy.data.images.get(name)
+    # one image per colorspace, setting it on a shared image would change it for every other user
+    asset_path = f"{img_path}:{colorspace}" if colorspace else img_path
+    registry = images.get_image_registry()
+    existing = registry.by_asset.get(asset_path)
 
     if existing:
         return existing
 
     img_path = os.path.join(data_dir, img_path[1:])
 
-    if os.path.exists(img_path + ".tga"):
-        img_path += ".tga"
-    elif os.path.exists(img_path + ".png"):
-        img_path += ".png"
-    elif os.path.exists(img_path + ".dds"):
-        img_path += ".dds"
+    # the exporter keeps one format per texture, removing the others
+    for ext in images.TEXTURE_EXTENSIONS:
+        if os.path.exists(img_path + ext):
+            img_path += ext
+            break
 
     if os.path.exists(img_path):
-        loaded = bpy.data.images.load(filepath=img_path)
+        digest = images.file_digest(img_path)
+        if colorspace:
+            digest += f":{colorspace}"
+        existing = registry.find(asset_path, digest)
+        if existing:
+            return existing
+
+        # over the memory ceiling, the image is loaded smaller instead of in full
+        budget = memory.memory_budget
+        degraded_size = budget.check_image(images.read_image_size(img_path)) if budget else None
+        if degraded_size:
+            budget.degrade("images downscaled", asset_path)
+            loaded = images.load_downscaled(img_path, degraded_size)
+        elif images.texture_budget:
+            loaded = images.texture_budget.load(img_path, slot)
+        else:
+            loaded = bpy.data.images.load(filepath=img_path)
         loaded.name = name
         loaded.alpha_mode = 'CHANNEL_PACKED'
+        if colorspace:
+            loaded.colorspace_settings.name = colorspace
+        registry.add(loaded, asset_path, digest)
+        if memory.memory_budget:
+            memory.memory_budget.add_image(loaded)
         return loaded
     else:
         print("WARNING: " + img_path + " not found")
         return None
 
 
+@contextmanager
+def scene_context(scene: bpy.types.Scene, layer_collection: bpy.types.LayerCollection):
+    """
+    Makes the scene and its layer collection the ones importers and operators work in. Background
+    Blender has no window to switch the scene of, there the context is overridden instead.
+    """
+    window = bpy.context.window
+    if window is None:
+        with bpy.context.temp_override(scene=scene, view_layer=scene.view_layers[0], collection=layer_collection.collection):
+            yield
+        return
+
+    previous_scene = window.scene
+    previous_layer_collection = bpy.context.view_layer.active_layer_collection
+    window.scene = scene
+    bpy.context.view_layer.active_layer_collection = layer_collection
+    try:
+        yield
+    finally:
+        window.scene = previous_scene
+        bpy.context.view_layer.active_layer_collection = previous_layer_collection
+
+
+def append_shader_node_groups(data_dir: str):
+    """Appends the node groups of every .blend in the shader folder of the export"""
+    shader_folder = os.path.join(data_dir, "shader")
+    if not os.path.exists(shader_folder):
+        return
+    for shaderfile in os.listdir(shader_folder):
+        if shaderfile.endswith(".blend"):
+            print("Appending node groups from " + shaderfile)
+            with bpy.data.libraries.load(os.path.join(shader_folder, shaderfile)) as (data_from, data_to):
+                data_to.node_groups = data_from.node_groups
+
+
+def prepare_import_collection(scene: bpy.types.Scene) -> bpy.types.Collection:
+    """The "Imported" collection of the scene, emptied of previously placed and flattened maps"""
+    import_collection = bpy.data.collections.get("Imported")
+    if import_collection:
+        for ob in list(import_collection.objects):
+            bpy.data.objects.remove(ob)
+        for child in list(import_collection.children):
+            if "umap_flattened" in child:
+                remove_flattened(child)
+    else:
+        import_collection = bpy.data.collections.new("Imported")
+    if scene.collection.children.get(import_collection.name) is None:
+        scene.collection.children.link(import_collection)
+    return import_collection
+
+
+def ensure_fallback_meshes():
+    """Cube for missing meshes and the empty mesh for parents, still in use by previously imported maps when updating"""
+    if not bpy.data.meshes.get("__fallback"):
+        import bmesh
+        bm = bmesh.new()
+        bmesh.ops.create_cube(bm, size=2)
+        fallback_cube_mesh = bpy.data.meshes.new("__fallback")
+        bm.to_mesh(fallback_cube_mesh)
+        bm.free()
+    if not bpy.data.meshes.get("__empty"):
+        bpy.data.meshes.new("__empty")
+
+
+def find_layer_collection(layer_collection: bpy.types.LayerCollection,
+                          collection: bpy.types.Collection) -> Optional[bpy.types.LayerCollection]:
+    if layer_collection.collection == collection:
+        return layer_collection
+    for child in layer_collection.children:
+        found = find_layer_collection(child, collection)
+        if found:
+            return found
+    return None
+
+
+def remove_flattened(collection: bpy.types.Collection):
+    """Removes a flattened map with its objects and the flattened maps nested in it"""
+    for child in list(collection.children):
+        if "umap_flattened" in child:
+            remove_flattened(child)
+    for ob in list(collection.objects):
+        bpy.data.objects.remove(ob)
+    bpy.data.collections.remove(collection)
+
+
+def remove_object_tree(ob: bpy.types.Object):
+    for child in ob.children:
+        remove_object_tree(child)
+    bpy.data.objects.remove(ob)
+
+
+def content_hash(*parts) -> str:
+    return hashlib.md5(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+def file_hash(*paths: str) -> str:
+    md5 = hashlib.md5()
+    for path in paths:
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                md5.update(f.read())
+    return md5.hexdigest()
+
+
 def cleanup():
     for block in bpy.data.meshes:
         if block.users == 0:
@@ -415,6 +796,14 @@ def cleanup():
         if block.users == 0:
             bpy.data.images.remove(block)
 
+    for block in bpy.data.lights:
+        if block.users == 0:
+            bpy.data.lights.remove(block)
+
+    images.reset_image_registry()
+    meshes.reset_mesh_registry()
+    reset_light_cache()
+
 
 def string_hash_code(s: str) -> int:
     h = 0
@@ -425,60 +814,21 @@ def string_hash_code(s: str) -> int:
 if __name__ == "__main__":
     data_dir = r"C:\Users\satri\Documents\AppProjects\BlenderUmap\run"
 
-    reuse_maps = True
-    reuse_meshes = True
-    use_cube_as_fallback = True
-    use_generic_shader = True
-    use_generic_shader_as_fallback = False
-
     start = int(time.time() * 1000.0)
 
-    uvm = bpy.data.node_groups.get("UV Shader Mix")
-    tex_shader = bpy.data.node_groups.get("Texture Shader")
-
-    if not uvm or not tex_shader:
+    if not bpy.data.node_groups.get("UV Shader Mix") or not bpy.data.node_groups.get("Texture Shader"):
         with bpy.data.libraries.load(os.path.join(data_dir, "deps.blend")) as (data_from, data_to):
             data_to.node_groups = data_from.node_groups
 
-        uvm = bpy.data.node_groups.get("UV Shader Mix")
-        tex_shader = bpy.data.node_groups.get("Texture Shader")
-
-    # make sure we're on main scene to deal with the fallback objects
     main_scene = bpy.data.scenes.get("Scene") or bpy.data.scenes.new("Scene")
-    bpy.context.window.scene = main_scene
-
-    # prepare collection for imports
-    import_collection = bpy.data.collections.get("Imported")
-
-    if import_collection:
-        bpy.ops.object.select_all(action='DESELECT')
-
-        for obj in import_collection.objects:
-            obj.select_set(True)
-
-        bpy.ops.object.delete()
-    else:
-        import_collection = bpy.data.collections.new("Imported")
-        main_scene.collection.children.link(import_collection)
-
+    import_collection = prepare_import_collection(main_scene)
     cleanup()
-
-    # setup fallback cube mesh
-    bpy.ops.mesh.primitive_cube_add(size=2)
-    fallback_cube = bpy.context.active_object
-    fallback_cube_mesh = fallback_cube.data
-    fallback_cube_mesh.name = "__fallback"
-    bpy.data.objects.remove(fallback_cube)
-
-    # 2. empty mesh
-    empty_mesh = bpy.data.meshes.get("__empty", bpy.data.meshes.new("__empty"))
+    ensure_fallback_meshes()
 
     # do it!
     with open(os.path.join(data_dir, "processed.json")) as file:
-        import_umap(json.loads(file.read()), import_collection, data_dir, reuse_maps, reuse_meshes, use_cube_as_fallback, use_generic_shader, use_generic_shader_as_fallback, tex_shader, TextureMapping())
+        import_umap(json.loads(file.read()), import_collection, data_dir, ImportOptions())
 
-    # go back to main scene
-    bpy.context.window.scene = main_scene
     cleanup()
 
     print("All done in " + str(int((time.time() * 1000.0) - start)) + "ms")
@@ -0,0 +1,17 @@
+"""
+The addon is imported as the BlenderUmap package without running its __init__, which registers the UI.
+Tests of modules that need bpy are skipped outside of Blender, run all of them with Blender's Python
+(with pytest installed into it):
+
+    blender -b --python-expr "import sys, pytest; sys.exit(pytest.main(['Importers/tests']))"
+"""
+import os
+import sys
+import types
+
+ADDON_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Blender")
+
+if "BlenderUmap" not in sys.modules:
+    package = types.ModuleType("BlenderUmap")
+    package.__path__ = [ADDON_DIR]
+    sys.modules["BlenderUmap"] = package
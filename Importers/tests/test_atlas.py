@@ -0,0 +1,27 @@
+import pytest
+
+pytest.importorskip("bpy")
+
+from BlenderUmap.atlas import pack
+
+
+def overlaps(a, b, padding: int) -> bool:
+    return (a[0] == b[0] and a[1] - padding < b[1] + b[3] + padding and b[1] - padding < a[1] + a[3] + padding
+            and a[2] - padding < b[2] + b[4] + padding and b[2] - padding < a[2] + a[4] + padding)
+
+
+def test_pack_keeps_padded_rects_apart_and_inside():
+    sizes = [(64, 64), (128, 32), (32, 128), (100, 60), (16, 16), (200, 8), (64, 64), (8, 200)]
+    rects = pack(sizes, 256, 2)
+    for rect, (w, h) in zip(rects, sizes):
+        assert rect[3:] == (w, h)
+        assert rect[1] >= 2 and rect[2] >= 2 and rect[1] + w + 2 <= 256 and rect[2] + h + 2 <= 256
+    for i, a in enumerate(rects):
+        for b in rects[i + 1:]:
+            assert not overlaps(a, b, 2)
+
+
+def test_pack_opens_a_new_page_when_full():
+    rects = pack([(120, 120)] * 5, 256, 4)
+    assert [rect[0] for rect in rects] == [0, 0, 0, 0, 1]
+    assert rects[4][1:3] == (4, 4)
@@ -0,0 +1,29 @@
+import pytest
+
+from BlenderUmap.colors import SRGB_TO_LINEAR, get_rgb_255, get_rgb_255_batch, hex_to_rgb, srgb2lin, vector_params_to_rgba
+
+
+def test_srgb_to_linear_table():
+    assert len(SRGB_TO_LINEAR) == 256
+    assert SRGB_TO_LINEAR[0] == 0.0
+    assert SRGB_TO_LINEAR[255] == pytest.approx(1.0)
+    assert SRGB_TO_LINEAR[128] == pytest.approx(0.2158605)
+    assert all(a < b for a, b in zip(SRGB_TO_LINEAR, SRGB_TO_LINEAR[1:]))
+    assert all(SRGB_TO_LINEAR[i] == srgb2lin(i / 255) for i in range(256))
+
+
+def test_get_rgb_255():
+    assert get_rgb_255({"R": 255, "G": 128, "B": 0, "A": 255}) == (
+        SRGB_TO_LINEAR[255], SRGB_TO_LINEAR[128], 0.0, SRGB_TO_LINEAR[255]
+    )
+
+
+def test_get_rgb_255_batch_keeps_missing_colors():
+    pv = {"R": 10, "G": 20, "B": 30, "A": 255}
+    assert get_rgb_255_batch([pv, None, {}, pv]) == [get_rgb_255(pv), None, None, get_rgb_255(pv)]
+
+
+def test_hex_to_rgb():
+    assert hex_to_rgb("80ff0040") == pytest.approx((1.0, 0.0, 64 / 255, 128 / 255))
+    assert hex_to_rgb("ff0040") == pytest.approx((1.0, 0.0, 64 / 255, 1.0))
+    assert vector_params_to_rgba({"Tint": "ff0040"}) == {"Tint": hex_to_rgb("ffff0040")}
@@ -0,0 +1,103 @@
+import hashlib
+import os
+import struct
+import zlib
+
+import pytest
+
+pytest.importorskip("bpy")
+
+from BlenderUmap.images import TextureBudget, atomic_path, file_digest, read_image_size, write_gray_png
+
+
+def write(path, data: bytes) -> str:
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def test_read_image_size(tmp_path):
+    png = write(tmp_path / "a.png", b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + struct.pack(">II", 512, 256))
+    assert read_image_size(png) == (512, 256)
+
+    dds = write(tmp_path / "a.dds", b"DDS " + struct.pack("<III", 124, 0, 128) + struct.pack("<I", 1024) + bytes(4))
+    assert read_image_size(dds) == (1024, 128)
+
+    tga = write(tmp_path / "a.tga", bytes(12) + struct.pack("<HH", 64, 32) + bytes(8))
+    assert read_image_size(tga) == (64, 32)
+
+    assert read_image_size(write(tmp_path / "a.bmp", b"BM" + bytes(30))) is None
+
+
+def test_target_size_per_slot():
+    budget = TextureBudget({"Diffuse": 1024, "Normal": 0})
+    assert budget.target_size("Diffuse", 4096, 2048) == (1024, 512)
+    assert budget.target_size("Diffuse", 512, 512) == (512, 512)
+    assert budget.target_size("Normal", 4096, 4096) == (4096, 4096)
+    assert budget.target_size("Mask", 4096, 4096) == (4096, 4096)
+
+
+def test_target_size_memory_cap():
+    budget = TextureBudget({}, memory_cap_mb=1)
+    assert budget.target_size("Diffuse", 256, 256) == (256, 256)
+    budget.used_bytes = 1024 * 1024 - 64 * 64 * 4
+    assert budget.target_size("Diffuse", 1024, 1024) == (64, 64)
+    budget.used_bytes = 1024 * 1024
+    assert budget.target_size("Diffuse", 1024, 1024) == (64, 64)
+
+
+def test_file_digest_sidecar(tmp_path):
+    path = write(tmp_path / "a.tga", b"first")
+    assert file_digest(path) == hashlib.sha1(b"first").hexdigest()
+    with open(path + ".sha1") as f:
+        assert f.read() == hashlib.sha1(b"first").hexdigest()
+
+    # an up to date sidecar is trusted without reading the file
+    with open(path + ".sha1", "w") as f:
+        f.write("cached")
+    assert file_digest(path) == "cached"
+
+    # a file newer than its sidecar is hashed again
+    write(tmp_path / "a.tga", b"second")
+    sidecar_mtime = os.path.getmtime(path + ".sha1")
+    os.utime(path, (sidecar_mtime + 10, sidecar_mtime + 10))
+    assert file_digest(path) == hashlib.sha1(b"second").hexdigest()
+
+
+def test_atomic_path(tmp_path):
+    path = str(tmp_path / "a.png")
+    with atomic_path(path) as tmp:
+        assert tmp != path
+        write(tmp, b"done")
+    with open(path, "rb") as f:
+        assert f.read() == b"done"
+
+    # a failed write leaves neither the temporary file nor a changed target behind
+    with pytest.raises(RuntimeError):
+        with atomic_path(path) as tmp:
+            write(tmp, b"partial")
+            raise RuntimeError
+    assert os.listdir(tmp_path) == ["a.png"]
+    with open(path, "rb") as f:
+        assert f.read() == b"done"
+
+
+def test_write_gray_png(tmp_path):
+    path = str(tmp_path / "a.R.png")
+    rows = [bytes([0, 64, 128]), bytes([255, 1, 2])]
+    write_gray_png(path, rows)
+    assert read_image_size(path) == (3, 2)
+
+    with open(path, "rb") as f:
+        data = f.read()
+    chunks = {}
+    pos = 8
+    while pos < len(data):
+        length, tag = struct.unpack(">I4s", data[pos:pos + 8])
+        body = data[pos + 8:pos + 8 + length]
+        assert struct.unpack(">I", data[pos + 8 + length:pos + 12 + length])[0] == zlib.crc32(tag + body)
+        chunks[tag] = body
+        pos += 12 + length
+    assert list(chunks) == [b"IHDR", b"IDAT", b"IEND"]
+    assert chunks[b"IHDR"][8:10] == bytes([8, 0])  # 8 bit grayscale
+    assert zlib.decompress(chunks[b"IDAT"]) == b"\x00" + rows[0] + b"\x00" + rows[1]
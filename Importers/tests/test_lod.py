@@ -0,0 +1,25 @@
+import pytest
+
+pytest.importorskip("bpy")
+
+from BlenderUmap.lod import lod_mesh_path
+
+
+def touch(path: str):
+    open(path, "wb").close()
+
+
+def test_lod_mesh_path(tmp_path):
+    base = str(tmp_path / "SM_Rock")
+    touch(base + ".pskx")
+    touch(base + "_LOD1.psk")
+    assert lod_mesh_path(base, 0) == base + ".pskx"
+    assert lod_mesh_path(base, 1) == base + "_LOD1.psk"
+    assert lod_mesh_path(base, 2) is None
+
+
+def test_lod_mesh_path_prefers_psk(tmp_path):
+    base = str(tmp_path / "SK_Hero")
+    touch(base + ".psk")
+    touch(base + ".pskx")
+    assert lod_mesh_path(base, 0) == base + ".psk"
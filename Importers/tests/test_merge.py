@@ -0,0 +1,79 @@
+import pytest
+
+bpy = pytest.importorskip("bpy")
+
+import numpy as np
+
+from BlenderUmap.merge import is_static, merge_objects, remove_sources, source_name
+
+
+def quad(name: str, location, scale=(1, 1, 1), color=None) -> bpy.types.Object:
+    mesh = bpy.data.meshes.new(name)
+    mesh.from_pydata([(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0)], [], [(0, 1, 2, 3)])
+    mesh.uv_layers.new(name="UVMap")
+    if color:
+        mesh.vertex_colors.new(name="Col").data.foreach_set("color", color * 4)
+    ob = bpy.data.objects.new(name, mesh)
+    ob.location = location
+    ob.scale = scale
+    ob["umap_guid"] = name + "_guid"
+    ob["umap_hash"] = name + "_hash"
+    ob["umap_transform_hash"] = name + "_transform"
+    return ob
+
+
+@pytest.fixture
+def collection():
+    collection = bpy.data.collections.new("test_merge")
+    yield collection
+    for ob in list(collection.objects):
+        mesh = ob.data
+        bpy.data.objects.remove(ob)
+        bpy.data.meshes.remove(mesh)
+    bpy.data.collections.remove(collection)
+
+
+def test_merge_objects(collection):
+    a = quad("A", (0, 0, 0), color=[1.0, 0.0, 0.0, 1.0])
+    b = quad("B", (10, 0, 0), scale=(-1, 1, 1))
+    assert is_static(a) and is_static(b)
+
+    merged = merge_objects([a, b], "Merged", collection)
+    mesh = merged.data
+    assert len(mesh.vertices) == 8 and len(mesh.polygons) == 2
+    assert list(merged["umap_merged_names"]) == ["A", "B"]
+    assert list(merged["umap_merged_guids"]) == ["A_guid", "B_guid"]
+    assert list(merged["umap_merged_hashes"]) == ["A_hash:A_transform", "B_hash:B_transform"]
+    assert [source_name(merged, i) for i in range(2)] == ["A", "B"]
+
+    co = np.array([v.co[:] for v in mesh.vertices])
+    np.testing.assert_allclose(co[4:, 0], [10, 9, 9, 10], atol=1e-6)
+    # the mirrored quad still faces up
+    assert mesh.polygons[0].normal.z > 0 and mesh.polygons[1].normal.z > 0
+
+    # the object without the color layer is white
+    colors = np.array([c.color[:] for c in mesh.vertex_colors["Col"].data])
+    np.testing.assert_allclose(colors[:4], [[1, 0, 0, 1]] * 4)
+    np.testing.assert_allclose(colors[4:], [[1, 1, 1, 1]] * 4)
+
+    for ob in (a, b):
+        mesh = ob.data
+        bpy.data.objects.remove(ob)
+        bpy.data.meshes.remove(mesh)
+
+
+def test_remove_sources(collection):
+    obs = [quad("A", (0, 0, 0)), quad("B", (10, 0, 0))]
+    merged = merge_objects(obs, "Merged", collection)
+    for ob in obs:
+        mesh = ob.data
+        bpy.data.objects.remove(ob)
+        bpy.data.meshes.remove(mesh)
+
+    remove_sources(merged, {0})
+    assert len(merged.data.polygons) == 1
+    assert source_name(merged, 0) == "B"
+    assert list(merged["umap_merged_guids"]) == ["", "B_guid"]
+
+    remove_sources(merged, {1})
+    assert "Merged" not in bpy.data.objects
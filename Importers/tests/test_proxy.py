@@ -0,0 +1,41 @@
+import pytest
+
+pytest.importorskip("bpy")
+
+import numpy as np
+
+from BlenderUmap.proxy import cluster_decimate
+
+
+def grid(n: int):
+    """n x n quads on the XY plane split into triangles"""
+    xs, ys = np.meshgrid(np.arange(n + 1, dtype=np.float64), np.arange(n + 1, dtype=np.float64), indexing="ij")
+    points = np.stack([xs.ravel(), ys.ravel(), np.zeros(xs.size)], axis=1)
+    tris = []
+    for i in range(n):
+        for j in range(n):
+            a, b, c, d = i * (n + 1) + j, (i + 1) * (n + 1) + j, (i + 1) * (n + 1) + j + 1, i * (n + 1) + j + 1
+            tris += [(a, b, c), (a, c, d)]
+    return points, np.array(tris, dtype=np.int64)
+
+
+def test_fine_resolution_keeps_every_triangle():
+    points, tri_points = grid(4)
+    verts, tris, keep = cluster_decimate(points, tri_points, 16)
+    assert keep.all()
+    assert len(verts) == len(points)
+    np.testing.assert_allclose(verts[tris], points[tri_points])
+
+
+def test_coarse_resolution_collapses_triangles():
+    points, tri_points = grid(8)
+    verts, tris, keep = cluster_decimate(points, tri_points, 2)
+    assert verts.dtype == np.float32
+    assert 0 < keep.sum() < len(tri_points)
+    assert len(tris) == keep.sum()
+    assert len(verts) < len(points)
+    # every vertex is referenced and no triangle is degenerate
+    assert set(np.unique(tris)) == set(range(len(verts)))
+    assert (tris[:, 0] != tris[:, 1]).all() and (tris[:, 1] != tris[:, 2]).all() and (tris[:, 0] != tris[:, 2]).all()
+    # cluster means stay inside the source bounds
+    assert (verts.min(axis=0) >= points.min(axis=0)).all() and (verts.max(axis=0) <= points.max(axis=0)).all()
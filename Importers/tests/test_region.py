@@ -0,0 +1,42 @@
+import pytest
+
+pytest.importorskip("bpy")
+
+from mathutils import Vector
+
+from BlenderUmap.region import Region, SpatialGrid, map_bounds
+
+
+def comp(location, children=None, instances=None):
+    return ["guid", "name", None, None, None, location, [0, 0, 0], [1, 1, 1], children or [], 0, instances or []]
+
+
+def test_box_contains():
+    region = Region((0, 0, 0), extent=(1, 2, 3))
+    assert region.contains(Vector((1, -2, 3)))
+    assert not region.contains(Vector((1.01, 0, 0)))
+
+
+def test_sphere_contains():
+    region = Region((1, 1, 1), radius=2)
+    assert region.contains(Vector((1, 1, 3)))
+    assert not region.contains(Vector((3, 3, 1)))
+
+
+def test_grid_query_returns_points_of_the_touched_cells():
+    points = [Vector((0.5, 0.5, 0.5)), Vector((150, 0, 0)), None, Vector((-50, -50, -50))]
+    grid = SpatialGrid(points, cell_size=100)
+    assert set(grid.query(Vector((0, 0, 0)), Vector((10, 10, 10)))) == {0}
+    # more cells than occupied ones, walks the occupied cells instead
+    assert set(grid.query(Vector((-100, -100, -100)), Vector((200, 1, 1)))) == {0, 1, 3}
+
+
+def test_map_bounds_include_placed_instances():
+    bmin, bmax = map_bounds([comp([0, 0, 0]), comp([100, 0, 0], instances=[[[0, 0, 1000], [0, 0, 0], [1, 1, 1]]])])
+    assert bmin == pytest.approx([0, 0, 0])
+    assert bmax == pytest.approx([1, 0, 10])
+
+
+def test_map_bounds_unknown_with_sub_levels_or_without_components():
+    assert map_bounds([comp([0, 0, 0]), comp([100, 0, 0], children=["/Game/Maps/Child"])]) is None
+    assert map_bounds([]) is None